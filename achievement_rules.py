@@ -0,0 +1,84 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+from sqlalchemy import func, literal, select
+from sqlalchemy.orm import Session
+from models import Achievement, PersonalRecord, Streak, User, UserStats
+
+# What an achievement counts. Each counter is one scalar subquery, so the
+# cost of a check depends on how many counters the catalog uses, not on
+# how many achievements it defines.
+CURRENT_STREAK = "current_streak"
+COMPLETED_WORKOUTS = "completed_workouts"
+TOTAL_PERSONAL_RECORDS = "total_personal_records"
+PERSONAL_RECORDS_30_DAYS = "personal_records_30_days"
+
+COUNTERS: Dict[str, Callable] = {
+    CURRENT_STREAK: lambda user_id, now: select(Streak.current_streak).where(
+        Streak.user_id == user_id
+    ).scalar_subquery(),
+    COMPLETED_WORKOUTS: lambda user_id, now: select(UserStats.completed_workouts).where(
+        UserStats.user_id == user_id
+    ).scalar_subquery(),
+    TOTAL_PERSONAL_RECORDS: lambda user_id, now: select(func.count()).where(
+        PersonalRecord.user_id == user_id
+    ).scalar_subquery(),
+    PERSONAL_RECORDS_30_DAYS: lambda user_id, now: select(func.count()).where(
+        PersonalRecord.user_id == user_id,
+        PersonalRecord.achieved_at >= now - timedelta(days=30)
+    ).scalar_subquery(),
+}
+
+class AchievementRule(NamedTuple):
+    achievement_type: str
+    threshold: int
+    definition: Dict
+
+class RuleEngine:
+    """An achievement catalog compiled into per-counter threshold lists.
+
+    A check reads every counter the catalog uses together with the user's
+    unlocked achievements in a single query, then walks each counter's
+    rules in threshold order, stopping at the first one not yet reached.
+    """
+
+    def __init__(self, catalog: Dict[str, List[Dict]]):
+        rules = defaultdict(list)
+        for achievement_type, definitions in catalog.items():
+            for definition in definitions:
+                counter = definition["counter"]
+                if counter not in COUNTERS:
+                    raise ValueError(f"Achievement {definition['name']!r} uses unknown counter {counter!r}")
+                rules[counter].append(AchievementRule(achievement_type, definition["threshold"], definition))
+        self.rules: Dict[str, List[AchievementRule]] = {
+            counter: sorted(counter_rules, key=lambda rule: rule.threshold)
+            for counter, counter_rules in rules.items()
+        }
+        self._thresholds = {
+            counter: [rule.threshold for rule in counter_rules] for counter, counter_rules in self.rules.items()
+        }
+
+    def load(self, db: Session, user_id: int, now: datetime):
+        """(counter values, unlocked achievement names) for the user, in one query"""
+        counters = list(self.rules)
+        rows = db.execute(
+            select(
+                *(func.coalesce(COUNTERS[counter](user_id, now), 0).label(counter) for counter in counters),
+                Achievement.name
+            ).select_from(User).outerjoin(
+                Achievement, Achievement.user_id == User.id
+            ).where(User.id == literal(user_id))
+        ).all()
+        if not rows:
+            return dict.fromkeys(counters, 0), set()
+        values = {counter: rows[0][i] for i, counter in enumerate(counters)}
+        return values, {row[-1] for row in rows if row[-1] is not None}
+
+    def earned(self, values: Dict[str, int], unlocked: set) -> List[AchievementRule]:
+        """Rules whose threshold the counters reach and that are not yet unlocked"""
+        earned = []
+        for counter, counter_rules in self.rules.items():
+            reached = bisect_right(self._thresholds[counter], values.get(counter) or 0)
+            earned.extend(rule for rule in counter_rules[:reached] if rule.definition["name"] not in unlocked)
+        return earned
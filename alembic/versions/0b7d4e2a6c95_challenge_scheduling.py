@@ -0,0 +1,45 @@
+"""Scheduled challenge periods and archiving
+
+Revision ID: 0b7d4e2a6c95
+Revises: f5c17b3e92d4
+Create Date: 2026-10-19 16:30:12.845120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7d4e2a6c95'
+down_revision: Union[str, None] = 'f5c17b3e92d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created these through create_all
+    inspector = sa.inspect(op.get_bind())
+    columns = [c['name'] for c in inspector.get_columns('challenges')]
+    indexes = [i['name'] for i in inspector.get_indexes('challenges')]
+
+    if 'period_key' not in columns:
+        op.add_column('challenges', sa.Column('period_key', sa.String(), nullable=True))
+    if 'archived_at' not in columns:
+        op.add_column('challenges', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    if 'ix_challenges_challenge_type_period_key_name' not in indexes:
+        op.create_index(
+            'ix_challenges_challenge_type_period_key_name', 'challenges',
+            ['challenge_type', 'period_key', 'name'], unique=True
+        )
+    if 'ix_challenges_archived_at_end_date' not in indexes:
+        op.create_index('ix_challenges_archived_at_end_date', 'challenges', ['archived_at', 'end_date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_challenges_archived_at_end_date', table_name='challenges')
+    op.drop_index('ix_challenges_challenge_type_period_key_name', table_name='challenges')
+    with op.batch_alter_table('challenges') as batch_op:
+        batch_op.drop_column('archived_at')
+        batch_op.drop_column('period_key')
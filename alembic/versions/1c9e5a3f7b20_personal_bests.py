@@ -0,0 +1,70 @@
+"""Personal bests for incremental PR detection
+
+Revision ID: 1c9e5a3f7b20
+Revises: 0b7d4e2a6c95
+Create Date: 2026-10-19 17:12:48.390277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c9e5a3f7b20'
+down_revision: Union[str, None] = '0b7d4e2a6c95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created these through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'personal_bests' not in inspector.get_table_names():
+        op.create_table(
+            'personal_bests',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('exercise_key', sa.String(), primary_key=True),
+            sa.Column('record_type', sa.String(), primary_key=True),
+            sa.Column('value', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    if 'ix_personal_records_user_id_achieved_at' not in [i['name'] for i in inspector.get_indexes('personal_records')]:
+        op.create_index('ix_personal_records_user_id_achieved_at', 'personal_records', ['user_id', 'achieved_at'])
+
+    # Seed from history so existing lifters are compared with what they have already done
+    op.execute("""
+        INSERT INTO personal_bests (user_id, exercise_key, record_type, value, updated_at)
+        SELECT user_id, exercise_key, record_type, MAX(value), CURRENT_TIMESTAMP
+        FROM (
+            SELECT w.user_id, LOWER(TRIM(l.exercise_name)) AS exercise_key, 'weight' AS record_type, l.weight_used AS value
+            FROM exercise_logs l JOIN workouts w ON w.id = l.workout_id
+            WHERE w.completed = true AND l.weight_used > 0
+            UNION ALL
+            SELECT w.user_id, LOWER(TRIM(l.exercise_name)), 'reps', l.reps_completed
+            FROM exercise_logs l JOIN workouts w ON w.id = l.workout_id
+            WHERE w.completed = true AND l.reps_completed > 0
+            UNION ALL
+            SELECT w.user_id, LOWER(TRIM(l.exercise_name)), 'duration', l.duration
+            FROM exercise_logs l JOIN workouts w ON w.id = l.workout_id
+            WHERE w.completed = true AND l.duration > 0
+            UNION ALL
+            SELECT user_id, LOWER(TRIM(exercise_name)), record_type, value
+            FROM personal_records
+            WHERE value > 0
+        ) history
+        WHERE exercise_key <> ''
+          AND NOT EXISTS (
+              SELECT 1 FROM personal_bests b
+              WHERE b.user_id = history.user_id
+                AND b.exercise_key = history.exercise_key
+                AND b.record_type = history.record_type
+          )
+        GROUP BY user_id, exercise_key, record_type
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_personal_records_user_id_achieved_at', table_name='personal_records')
+    op.drop_table('personal_bests')
@@ -0,0 +1,48 @@
+"""User timezones and streak expiry
+
+Revision ID: 2f8a6d1e4c37
+Revises: 1c9e5a3f7b20
+Create Date: 2026-10-19 18:05:21.614903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8a6d1e4c37'
+down_revision: Union[str, None] = '1c9e5a3f7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created these through create_all
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'timezone' not in [c['name'] for c in inspector.get_columns('users')]:
+        op.add_column('users', sa.Column('timezone', sa.String(), nullable=True, server_default='UTC'))
+    if 'expires_at' not in [c['name'] for c in inspector.get_columns('streaks')]:
+        op.add_column('streaks', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    if 'ix_streaks_expires_at' not in [i['name'] for i in inspector.get_indexes('streaks')]:
+        op.create_index('ix_streaks_expires_at', 'streaks', ['expires_at'])
+
+    # Existing users are on UTC, so a streak breaks two UTC midnights after its last workout
+    if bind.dialect.name == 'postgresql':
+        expiry = "date_trunc('day', last_workout_date) + interval '2 days'"
+    else:
+        expiry = "datetime(date(last_workout_date), '+2 days')"
+    op.execute(f"""
+        UPDATE streaks SET expires_at = {expiry}
+        WHERE expires_at IS NULL AND last_workout_date IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_streaks_expires_at', table_name='streaks')
+    with op.batch_alter_table('streaks') as batch_op:
+        batch_op.drop_column('expires_at')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('timezone')
@@ -0,0 +1,52 @@
+"""Per-user progress stats
+
+Revision ID: 3a5d8c2e1f94
+Revises: 2f8a6d1e4c37
+Create Date: 2026-10-20 10:04:37.218455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a5d8c2e1f94'
+down_revision: Union[str, None] = '2f8a6d1e4c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'user_stats' not in inspector.get_table_names():
+        op.create_table(
+            'user_stats',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('total_workouts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('completed_workouts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('last_completion_date', sa.DateTime(), nullable=True),
+            sa.Column('friend_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+
+    # Every existing user gets counters from their workout history and friends
+    op.execute("""
+        INSERT INTO user_stats (user_id, total_workouts, completed_workouts, last_completion_date, friend_count, updated_at)
+        SELECT users.id,
+               COUNT(workouts.id),
+               COALESCE(SUM(CASE WHEN workouts.completed = true THEN 1 ELSE 0 END), 0),
+               MAX(workouts.completion_date),
+               (SELECT COUNT(*) FROM friend_edges WHERE friend_edges.user_id = users.id),
+               CURRENT_TIMESTAMP
+        FROM users
+        LEFT JOIN workouts ON workouts.user_id = users.id
+        WHERE NOT EXISTS (SELECT 1 FROM user_stats s WHERE s.user_id = users.id)
+        GROUP BY users.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
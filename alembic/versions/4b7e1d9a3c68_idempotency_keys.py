@@ -0,0 +1,35 @@
+"""Idempotency keys for retried writes
+
+Revision ID: 4b7e1d9a3c68
+Revises: 3a5d8c2e1f94
+Create Date: 2026-10-20 10:21:09.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e1d9a3c68'
+down_revision: Union[str, None] = '3a5d8c2e1f94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'idempotency_keys' not in inspector.get_table_names():
+        op.create_table(
+            'idempotency_keys',
+            sa.Column('key', sa.String(), primary_key=True),
+            sa.Column('scope', sa.String(), primary_key=True),
+            sa.Column('response', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('idempotency_keys')
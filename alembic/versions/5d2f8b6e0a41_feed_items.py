@@ -0,0 +1,49 @@
+"""Friend-feed inboxes (fan-out on write)
+
+Revision ID: 5d2f8b6e0a41
+Revises: 4b7e1d9a3c68
+Create Date: 2026-10-20 11:02:47.318506
+
+Existing highlights are not copied into the new inboxes unless asked for
+with `alembic -x backfill_feeds=true upgrade head`; otherwise run
+`python manage_db.py rebuild_feeds` afterwards.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8b6e0a41'
+down_revision: Union[str, None] = '4b7e1d9a3c68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'feed_items' not in inspector.get_table_names():
+        op.create_table(
+            'feed_items',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('highlight_id', sa.Integer(), sa.ForeignKey('workout_highlights.id'), primary_key=True),
+            sa.Column('author_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index(
+            'ix_feed_items_user_id_created_at_highlight_id',
+            'feed_items', ['user_id', 'created_at', 'highlight_id']
+        )
+
+    if context.get_x_argument(as_dictionary=True).get('backfill_feeds', '').lower() in ('1', 'true', 'yes'):
+        # Same rules as the live fan-out (high-degree authors stay pull-based)
+        from sqlalchemy.orm import Session
+        from feed import FeedManager
+        FeedManager(Session(bind=op.get_bind())).rebuild()
+
+
+def downgrade() -> None:
+    op.drop_index('ix_feed_items_user_id_created_at_highlight_id', table_name='feed_items')
+    op.drop_table('feed_items')
@@ -0,0 +1,37 @@
+"""Keyset feed indexes
+
+Revision ID: 5e28c4b9d7a1
+Revises: a7d3e91f0c52
+Create Date: 2026-10-19 11:03:17.482915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e28c4b9d7a1'
+down_revision: Union[str, None] = 'a7d3e91f0c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Feeds page on (created_at, id); with id in the index the cursor
+    # predicate and the ORDER BY are both served by one range scan
+    op.create_index(
+        'ix_workout_highlights_user_id_created_at_id', 'workout_highlights', ['user_id', 'created_at', 'id']
+    )
+    op.drop_index('ix_workout_highlights_user_id_created_at', table_name='workout_highlights')
+    op.create_index(
+        'ix_gym_spotted_gym_location_created_at_id', 'gym_spotted', ['gym_location', 'created_at', 'id']
+    )
+    op.drop_index('ix_gym_spotted_gym_location_created_at', table_name='gym_spotted')
+
+
+def downgrade() -> None:
+    op.create_index('ix_gym_spotted_gym_location_created_at', 'gym_spotted', ['gym_location', 'created_at'])
+    op.drop_index('ix_gym_spotted_gym_location_created_at_id', table_name='gym_spotted')
+    op.create_index('ix_workout_highlights_user_id_created_at', 'workout_highlights', ['user_id', 'created_at'])
+    op.drop_index('ix_workout_highlights_user_id_created_at_id', table_name='workout_highlights')
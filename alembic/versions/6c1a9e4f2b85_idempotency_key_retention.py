@@ -0,0 +1,29 @@
+"""Index idempotency keys by age for the retention purge
+
+Revision ID: 6c1a9e4f2b85
+Revises: 5d2f8b6e0a41
+Create Date: 2026-10-21 09:14:52.308417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1a9e4f2b85'
+down_revision: Union[str, None] = '5d2f8b6e0a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_idempotency_keys_created_at' not in [i['name'] for i in inspector.get_indexes('idempotency_keys')]:
+        op.create_index('ix_idempotency_keys_created_at', 'idempotency_keys', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_keys_created_at', table_name='idempotency_keys')
@@ -0,0 +1,60 @@
+"""Add hot-path indexes
+
+Revision ID: a7d3e91f0c52
+Revises: bc4c25925ee4
+Create Date: 2026-10-19 09:12:41.310274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e91f0c52'
+down_revision: Union[str, None] = 'bc4c25925ee4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The unique indexes below encode what the code already assumes (one streak
+    # per user, one participation per user and challenge). Drop duplicates left
+    # by earlier races first, keeping the oldest row, which is the one the
+    # `.first()` lookups have been reading and updating.
+    op.execute(
+        "DELETE FROM streaks WHERE id NOT IN "
+        "(SELECT MIN(id) FROM streaks GROUP BY user_id)"
+    )
+    op.execute(
+        "DELETE FROM challenge_participants WHERE id NOT IN "
+        "(SELECT MIN(id) FROM challenge_participants GROUP BY challenge_id, user_id)"
+    )
+
+    op.create_index('ix_workouts_user_id_created_at', 'workouts', ['user_id', 'created_at'])
+    op.create_index('ix_exercise_logs_workout_id', 'exercise_logs', ['workout_id'])
+    op.create_index('ix_achievements_user_id_name', 'achievements', ['user_id', 'name'])
+    op.create_index('ix_streaks_user_id', 'streaks', ['user_id'], unique=True)
+    op.create_index('ix_challenges_end_date', 'challenges', ['end_date'])
+    op.create_index(
+        'ix_challenge_participants_challenge_id_user_id', 'challenge_participants',
+        ['challenge_id', 'user_id'], unique=True
+    )
+    op.create_index('ix_workout_highlights_user_id_created_at', 'workout_highlights', ['user_id', 'created_at'])
+    op.create_index('ix_friendships_user_id_friend_id_status', 'friendships', ['user_id', 'friend_id', 'status'])
+    # Friend lookups match either side of the pair
+    op.create_index('ix_friendships_friend_id_status', 'friendships', ['friend_id', 'status'])
+    op.create_index('ix_gym_spotted_gym_location_created_at', 'gym_spotted', ['gym_location', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_gym_spotted_gym_location_created_at', table_name='gym_spotted')
+    op.drop_index('ix_friendships_friend_id_status', table_name='friendships')
+    op.drop_index('ix_friendships_user_id_friend_id_status', table_name='friendships')
+    op.drop_index('ix_workout_highlights_user_id_created_at', table_name='workout_highlights')
+    op.drop_index('ix_challenge_participants_challenge_id_user_id', table_name='challenge_participants')
+    op.drop_index('ix_challenges_end_date', table_name='challenges')
+    op.drop_index('ix_streaks_user_id', table_name='streaks')
+    op.drop_index('ix_achievements_user_id_name', table_name='achievements')
+    op.drop_index('ix_exercise_logs_workout_id', table_name='exercise_logs')
+    op.drop_index('ix_workouts_user_id_created_at', table_name='workouts')
@@ -0,0 +1,67 @@
+"""Symmetric friend edges and friend counts
+
+Revision ID: c41f7a2e9b83
+Revises: 5e28c4b9d7a1
+Create Date: 2026-10-19 13:26:05.918342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a2e9b83'
+down_revision: Union[str, None] = '5e28c4b9d7a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created these through create_all
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'friend_edges' not in tables:
+        op.create_table(
+            'friend_edges',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('friend_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+
+    # One edge per direction for every accepted friendship, whichever way it was requested
+    op.execute("""
+        INSERT INTO friend_edges (user_id, friend_id, created_at)
+        SELECT pairs.user_id, pairs.friend_id, MIN(pairs.created_at)
+        FROM (
+            SELECT user_id, friend_id, created_at FROM friendships WHERE status = 'accepted'
+            UNION ALL
+            SELECT friend_id, user_id, created_at FROM friendships WHERE status = 'accepted'
+        ) pairs
+        WHERE pairs.user_id IS NOT NULL AND pairs.friend_id IS NOT NULL
+          AND pairs.user_id <> pairs.friend_id
+          AND NOT EXISTS (
+              SELECT 1 FROM friend_edges e
+              WHERE e.user_id = pairs.user_id AND e.friend_id = pairs.friend_id
+          )
+        GROUP BY pairs.user_id, pairs.friend_id
+    """)
+
+    if 'user_stats' in tables:
+        if 'friend_count' not in [c['name'] for c in inspector.get_columns('user_stats')]:
+            op.add_column('user_stats', sa.Column('friend_count', sa.Integer(), nullable=False, server_default='0'))
+        op.execute("""
+            UPDATE user_stats SET friend_count = (
+                SELECT COUNT(*) FROM friend_edges WHERE friend_edges.user_id = user_stats.user_id
+            )
+        """)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if 'user_stats' in inspector.get_table_names():
+        with op.batch_alter_table('user_stats') as batch_op:
+            batch_op.drop_column('friend_count')
+    op.drop_table('friend_edges')
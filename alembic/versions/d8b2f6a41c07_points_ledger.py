@@ -0,0 +1,60 @@
+"""Points ledger with opening balances
+
+Revision ID: d8b2f6a41c07
+Revises: c41f7a2e9b83
+Create Date: 2026-10-19 14:02:37.551906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b2f6a41c07'
+down_revision: Union[str, None] = 'c41f7a2e9b83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'points_ledger' not in inspector.get_table_names():
+        op.create_table(
+            'points_ledger',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('points', sa.Integer(), nullable=False),
+            sa.Column('source', sa.String(), nullable=False),
+            sa.Column('source_id', sa.Integer(), nullable=True),
+            sa.Column('rolled_up', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_points_ledger_user_id_rolled_up', 'points_ledger', ['user_id', 'rolled_up'])
+        op.create_index('ix_points_ledger_rolled_up_id', 'points_ledger', ['rolled_up', 'id'])
+
+    # Existing totals become already-folded opening entries, so that
+    # users.total_points stays equal to the sum of each user's ledger
+    op.execute("""
+        INSERT INTO points_ledger (user_id, points, source, rolled_up, created_at)
+        SELECT users.id, users.total_points, 'opening_balance', true, CURRENT_TIMESTAMP
+        FROM users
+        WHERE COALESCE(users.total_points, 0) <> 0
+          AND NOT EXISTS (
+              SELECT 1 FROM points_ledger l
+              WHERE l.user_id = users.id AND l.source = 'opening_balance'
+          )
+    """)
+
+
+def downgrade() -> None:
+    # Fold anything still pending so no awarded points are lost with the table
+    op.execute("""
+        UPDATE users SET total_points = COALESCE(total_points, 0) + (
+            SELECT COALESCE(SUM(points), 0) FROM points_ledger
+            WHERE points_ledger.user_id = users.id AND points_ledger.rolled_up = false
+        )
+    """)
+    op.drop_table('points_ledger')
@@ -0,0 +1,53 @@
+"""Challenge standings: participant updated_at and final results
+
+Revision ID: e93a0c5d7f12
+Revises: d8b2f6a41c07
+Create Date: 2026-10-19 15:11:48.207615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93a0c5d7f12'
+down_revision: Union[str, None] = 'd8b2f6a41c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app may already have created these through create_all
+    inspector = sa.inspect(op.get_bind())
+
+    if 'updated_at' not in [c['name'] for c in inspector.get_columns('challenge_participants')]:
+        op.add_column('challenge_participants', sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute("UPDATE challenge_participants SET updated_at = joined_at")
+    if 'ix_challenge_participants_challenge_id_updated_at' not in [
+        i['name'] for i in inspector.get_indexes('challenge_participants')
+    ]:
+        op.create_index(
+            'ix_challenge_participants_challenge_id_updated_at', 'challenge_participants',
+            ['challenge_id', 'updated_at']
+        )
+
+    if 'challenge_results' not in inspector.get_table_names():
+        op.create_table(
+            'challenge_results',
+            sa.Column('challenge_id', sa.Integer(), sa.ForeignKey('challenges.id'), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('rank', sa.Integer(), nullable=False),
+            sa.Column('value', sa.Integer(), nullable=False),
+            sa.Column('completed', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('recorded_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_challenge_results_challenge_id_rank', 'challenge_results', ['challenge_id', 'rank'])
+
+
+def downgrade() -> None:
+    op.drop_table('challenge_results')
+    op.drop_index('ix_challenge_participants_challenge_id_updated_at', table_name='challenge_participants')
+    with op.batch_alter_table('challenge_participants') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,46 @@
+"""Challenge metrics for automatic progress
+
+Revision ID: f5c17b3e92d4
+Revises: e93a0c5d7f12
+Create Date: 2026-10-19 15:48:20.663190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c17b3e92d4'
+down_revision: Union[str, None] = 'e93a0c5d7f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Challenges created from the built-in templates, by name
+TEMPLATE_METRICS = {
+    'Push Day Energy': 'pushup_reps',
+    'Cardio? More like Car-YES-o': 'cardio_minutes',
+    'Gains Week Challenge': 'personal_records',
+    'Consistency Check': 'workouts',
+}
+
+
+def upgrade() -> None:
+    # The app may already have created this through create_all
+    inspector = sa.inspect(op.get_bind())
+    if 'metric' not in [c['name'] for c in inspector.get_columns('challenges')]:
+        op.add_column('challenges', sa.Column('metric', sa.String(), nullable=True))
+
+    challenges = sa.table('challenges', sa.column('name', sa.String()), sa.column('metric', sa.String()))
+    for name, metric in TEMPLATE_METRICS.items():
+        op.execute(
+            challenges.update()
+            .where(challenges.c.name == name, challenges.c.metric.is_(None))
+            .values(metric=metric)
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('challenges') as batch_op:
+        batch_op.drop_column('metric')
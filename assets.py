@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+from fastapi.staticfiles import StaticFiles
+from starlette.requests import Request
+from starlette.responses import Response
+from metrics import record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Generated at runtime, so never fingerprinted
+UNFINGERPRINTED_DIRS = ("audio",)
+
+class AssetManifest:
+    """Content hashes for files under the static directory"""
+
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.hashes: Dict[str, str] = {}
+        self.refresh()
+
+    def refresh(self):
+        hashes = {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if os.path.relpath(os.path.join(root, d), self.directory) not in UNFINGERPRINTED_DIRS]
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    hashes[relative] = hashlib.sha256(f.read()).hexdigest()[:12]
+        self.hashes = hashes
+
+    def url(self, path: str) -> str:
+        """Fingerprinted URL for a static file, e.g. /static/styles.css?v=3f2a9c1d0b7e"""
+        path = path.lstrip("/")
+        digest = self.hashes.get(path)
+        url = f"{self.url_prefix}/{path}"
+        return f"{url}?v={digest}" if digest else url
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles that marks fingerprinted requests immutable and makes the rest revalidate"""
+
+    def __init__(self, *args, manifest: AssetManifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        relative = self.get_path(scope).replace(os.sep, "/")
+        version = Request(scope).query_params.get("v")
+        if version and version == self.manifest.hashes.get(relative):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return response
+
+class RenderedPage:
+    """A rendered page with its precompressed bodies"""
+
+    def __init__(self, body: str):
+        self.identity = body.encode("utf-8")
+        self.etag = hashlib.sha256(self.identity).hexdigest()[:16]
+        self.gzip = gzip.compress(self.identity, compresslevel=9)
+        self.brotli = brotli.compress(self.identity) if brotli else None
+
+    def encoded(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """Pick the smallest body the client accepts"""
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        if self.brotli is not None and "br" in accepted:
+            return self.brotli, "br"
+        if "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.identity, None
+
+class PageCache:
+    """Renders each template variant once and serves it from memory"""
+
+    def __init__(self, templates):
+        self.templates = templates
+        self.pages: Dict[Tuple, RenderedPage] = {}
+
+    def get(self, template_name: str, **context) -> RenderedPage:
+        key = (template_name,) + tuple(sorted(context.items()))
+        page = self.pages.get(key)
+        record_cache("page", page is not None)
+        if page is None:
+            body = self.templates.get_template(template_name).render(**context)
+            page = self.pages[key] = RenderedPage(body)
+        return page
+
+    def clear(self):
+        self.pages.clear()
+
+    def response(self, request: Request, template_name: str, **context) -> Response:
+        """Serve a cached variant, honouring Accept-Encoding and If-None-Match"""
+        page = self.get(template_name, **context)
+        body, encoding = page.encoded(request.headers.get("accept-encoding", ""))
+        etag = f'"{page.etag}-{encoding or "identity"}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type="text/html", headers=headers)
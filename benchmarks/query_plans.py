@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Query-plan benchmark for the hot-path indexes.
+
+Builds a scratch database with the app's schema minus the hot-path indexes,
+fills it with --rows workouts (plus proportional data in the other tables),
+then times each hot query and prints its plan before and after creating the
+indexes declared in models.py.
+
+    python benchmarks/query_plans.py --rows 1000000
+    python benchmarks/query_plans.py --url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from models import Base
+
+CHUNK_SIZE = 50000
+GYMS = [f"Gym {i}" for i in range(200)]
+
+# (label, statement, parameters) mirroring the queries the endpoints run
+HOT_QUERIES = [
+    ("pending workout plan",
+     "SELECT id FROM workouts WHERE user_id = :user_id AND completed IS NOT true "
+     "ORDER BY created_at DESC LIMIT 1", {}),
+    ("recent workouts",
+     "SELECT id FROM workouts WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 5", {}),
+    ("exercise logs for workout",
+     "SELECT id FROM exercise_logs WHERE workout_id = :workout_id", {}),
+    ("achievement unlocked check",
+     "SELECT id FROM achievements WHERE user_id = :user_id AND name = 'Beast Mode Activated 🔥' LIMIT 1", {}),
+    ("user streak",
+     "SELECT id FROM streaks WHERE user_id = :user_id LIMIT 1", {}),
+    ("active challenges",
+     "SELECT id FROM challenges WHERE end_date > :now", {}),
+    ("challenge participation",
+     "SELECT id FROM challenge_participants WHERE user_id = :user_id AND challenge_id = :challenge_id LIMIT 1", {}),
+    ("accepted friends",
+     "SELECT user_id, friend_id FROM friendships "
+     "WHERE (user_id = :user_id OR friend_id = :user_id) AND status = 'accepted'", {}),
+    ("friend feed page",
+     "SELECT id FROM workout_highlights WHERE user_id IN (:user_id, :friend_a, :friend_b) "
+     "ORDER BY created_at DESC, id DESC LIMIT 10", {}),
+    ("gym feed page",
+     "SELECT id FROM gym_spotted WHERE gym_location = :gym ORDER BY created_at DESC, id DESC LIMIT 10", {}),
+    ("gym feed deep page (offset)",
+     "SELECT id FROM gym_spotted WHERE gym_location = :gym "
+     "ORDER BY created_at DESC, id DESC LIMIT 10 OFFSET 2000", {}),
+    ("gym feed deep page (keyset)",
+     "SELECT id FROM gym_spotted WHERE gym_location = :gym AND (created_at, id) < (:cursor_at, :cursor_id) "
+     "ORDER BY created_at DESC, id DESC LIMIT 10", {}),
+]
+
+def hot_path_indexes():
+    return [index for table in Base.metadata.sorted_tables for index in table.indexes
+            if not all(column.primary_key for column in index.columns)]
+
+def _insert(conn, table_name: str, rows):
+    table = Base.metadata.tables[table_name]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            conn.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+
+def populate(engine, rows: int):
+    """Fill the schema with skewed but realistic data; returns the user count"""
+    users = max(rows // 100, 10)
+    challenges = 1000
+    start = datetime.utcnow() - timedelta(days=365)
+
+    def moment():
+        return start + timedelta(seconds=random.randint(0, 365 * 86400))
+
+    with engine.begin() as conn:
+        _insert(conn, "users", ({"id": i, "name": f"user{i}", "total_points": 0, "level": 1} for i in range(1, users + 1)))
+        _insert(conn, "workouts", ({
+            "id": i, "user_id": random.randint(1, users), "completed": random.random() < 0.8, "created_at": moment()
+        } for i in range(1, rows + 1)))
+        _insert(conn, "exercise_logs", ({
+            "workout_id": random.randint(1, rows), "exercise_name": "Push-ups", "sets_completed": 3, "reps_completed": 12
+        } for _ in range(rows)))
+        _insert(conn, "achievements", ({
+            "user_id": random.randint(1, users), "name": f"Achievement {random.randint(1, 20)}", "unlocked_at": moment()
+        } for _ in range(rows // 10)))
+        _insert(conn, "streaks", ({"user_id": i, "current_streak": 0, "longest_streak": 0} for i in range(1, users + 1)))
+        _insert(conn, "challenges", ({
+            "id": i, "name": f"Challenge {i}", "start_date": moment(), "end_date": moment()
+        } for i in range(1, challenges + 1)))
+        _insert(conn, "challenge_participants", ({
+            "challenge_id": c, "user_id": u, "current_value": 0
+        } for c, u in random.sample([(c, u) for c in range(1, challenges + 1) for u in range(1, 101)], min(rows // 10, challenges * 100))))
+        _insert(conn, "friendships", ({
+            "user_id": random.randint(1, users), "friend_id": random.randint(1, users),
+            "status": "accepted" if random.random() < 0.9 else "pending", "created_at": moment()
+        } for _ in range(users * 20)))
+        _insert(conn, "workout_highlights", ({
+            "user_id": random.randint(1, users), "title": "New PR", "likes": 0, "created_at": moment()
+        } for _ in range(rows // 2)))
+        _insert(conn, "gym_spotted", ({
+            "spotter_id": random.randint(1, users), "spotted_id": random.randint(1, users),
+            "gym_location": random.choice(GYMS), "message": "💪", "created_at": moment()
+        } for _ in range(rows // 2)))
+    return users
+
+def explain(conn, statement: str, params: dict) -> str:
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {statement}"), params).fetchall()
+        return "; ".join(row[-1] for row in rows)
+    rows = conn.execute(text(f"EXPLAIN {statement}"), params).fetchall()
+    return "; ".join(row[0].strip() for row in rows)
+
+def measure(engine, users: int, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for label, statement, extra in HOT_QUERIES:
+            timings = []
+            for _ in range(repeat):
+                params = {
+                    "user_id": random.randint(1, users),
+                    "friend_a": random.randint(1, users),
+                    "friend_b": random.randint(1, users),
+                    "workout_id": random.randint(1, users * 100),
+                    "challenge_id": random.randint(1, 1000),
+                    "gym": random.choice(GYMS),
+                    "now": datetime.utcnow(),
+                    # Roughly 2000 rows into a gym's feed
+                    "cursor_at": datetime.utcnow() - timedelta(days=292),
+                    "cursor_id": 2 ** 62,
+                    **extra
+                }
+                started = time.perf_counter()
+                conn.execute(text(statement), params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (statistics.median(timings), explain(conn, statement, params))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Before/after benchmark for the hot-path indexes')
+    parser.add_argument('--url', help='Scratch database URL (default: a temporary SQLite file)')
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of workouts to generate')
+    parser.add_argument('--repeat', type=int, default=20, help='Executions per query')
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'index_benchmark.db')}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    indexes = hot_path_indexes()
+    for index in indexes:
+        index.drop(engine)
+
+    print(f"⏳ Generating {args.rows} workouts in {engine.url.render_as_string(hide_password=True)}...")
+    started = time.perf_counter()
+    users = populate(engine, args.rows)
+    print(f"✅ Generated data in {time.perf_counter() - started:.1f}s")
+
+    before = measure(engine, users, args.repeat)
+    started = time.perf_counter()
+    for index in indexes:
+        index.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"✅ Built {len(indexes)} indexes in {time.perf_counter() - started:.1f}s")
+    after = measure(engine, users, args.repeat)
+
+    print(f"\n{'query':<30} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    print("-" * 62)
+    for label, _, _ in HOT_QUERIES:
+        before_ms, after_ms = before[label][0], after[label][0]
+        print(f"{label:<30} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / max(after_ms, 1e-6):>8.1f}x")
+    print("\n📝 Query plans")
+    for label, _, _ in HOT_QUERIES:
+        print(f"\n🔹 {label}\n  before: {before[label][1]}\n  after:  {after[label][1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Mixed read/write throughput on SQLite: default settings vs the WAL profile.
+
+Each worker thread loops for --duration seconds, mostly reading a user's
+gamification data and sometimes completing a workout (insert + logs + points
+update + commit). The default profile is the engine database.py used before
+the WAL profile existed.
+
+    python benchmarks/sqlite_concurrency.py --threads 16 --write-ratio 0.2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import RoutingSession, create_sqlite_engines
+from models import Base, User, Workout, ExerciseLog, Streak, Achievement
+
+USERS = 1000
+
+def default_sessionmaker(url: str):
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_pre_ping=True, pool_recycle=300)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def wal_sessionmaker(url: str):
+    engine, read_engine = create_sqlite_engines(url)
+    return engine, sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, read_bind=read_engine)
+
+def seed(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": i, "name": f"user{i}", "total_points": 0} for i in range(1, USERS + 1)])
+        conn.execute(Streak.__table__.insert(), [{"user_id": i, "current_streak": 1, "longest_streak": 1} for i in range(1, USERS + 1)])
+        conn.execute(Achievement.__table__.insert(), [
+            {"user_id": random.randint(1, USERS), "name": f"Achievement {i % 20}"} for i in range(USERS * 5)
+        ])
+
+def read_op(db, user_id: int):
+    db.query(User).filter(User.id == user_id).first()
+    db.query(Streak).filter(Streak.user_id == user_id).first()
+    db.query(Achievement).filter(Achievement.user_id == user_id).all()
+    db.rollback()
+
+def write_op(db, user_id: int):
+    workout = Workout(user_id=user_id, exercises=[], completed=True, completion_date=datetime.utcnow())
+    db.add(workout)
+    db.flush()
+    db.add_all([
+        ExerciseLog(workout_id=workout.id, exercise_name="Push-ups", sets_completed=3, reps_completed=12)
+        for _ in range(3)
+    ])
+    db.query(User).filter(User.id == user_id).update({User.total_points: User.total_points + 100})
+    db.commit()
+
+def run(factory, threads: int, duration: float, write_ratio: float) -> dict:
+    totals = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        while time.monotonic() < deadline:
+            db = factory()
+            is_write = random.random() < write_ratio
+            try:
+                if is_write:
+                    write_op(db, random.randint(1, USERS))
+                    counts["writes"] += 1
+                else:
+                    read_op(db, random.randint(1, USERS))
+                    counts["reads"] += 1
+            except OperationalError:
+                # "database is locked"
+                db.rollback()
+                counts["errors"] += 1
+            finally:
+                db.close()
+        with lock:
+            for key, value in counts.items():
+                totals[key] += value
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite mixed read/write throughput benchmark')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that write')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    for name, build in (("default", default_sessionmaker), ("wal", wal_sessionmaker)):
+        url = f"sqlite:///{os.path.join(directory, f'{name}.db')}"
+        engine, factory = build(url)
+        seed(engine)
+        print(f"⏳ Running {name} profile: {args.threads} threads for {args.duration}s...")
+        results[name] = run(factory, args.threads, args.duration, args.write_ratio)
+
+    print(f"\n{'profile':<10} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+    print("-" * 42)
+    for name, totals in results.items():
+        print(
+            f"{name:<10} {totals['reads'] / args.duration:>10.1f} "
+            f"{totals['writes'] / args.duration:>10.1f} {totals['errors']:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
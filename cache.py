@@ -0,0 +1,341 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# How long a get_or_set caller waits for another worker that is already computing the value
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+# How long a worker trusts its copy of a namespace's generation before re-reading it (seconds)
+GENERATION_REFRESH_INTERVAL = 1.0
+
+_MISSING = object()
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+class CacheBackend:
+    """Minimal string key/value store the Cache front end is built on"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent; returns whether it was set"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU cache; fine for a single worker"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_entry(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _set_entry(self, key: str, value: str, ttl: Optional[float]):
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._get_entry(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._set_entry(key, value, ttl)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get_entry(key):
+                return False
+            self._set_entry(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._get_entry(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._set_entry(key, str(value), None)
+            return value
+
+class SQLiteCache(CacheBackend):
+    """Cache in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None)
+            )
+            # Occasionally sweep expired rows so the file does not grow without bound
+            if random.random() < 0.01:
+                self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                """
+                INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+                WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?
+                """,
+                (key, value, now + ttl if ttl else None, now)
+            ).rowcount > 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO cache (key, value, expires_at) VALUES (?, '1', NULL)
+                    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+                    """,
+                    (key,)
+                )
+                value = int(self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+                self._conn.execute("COMMIT")
+                return value
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+class RedisCache(CacheBackend):
+    """Network cache for deployments spanning hosts.
+
+    Pass `client` to use any redis-py compatible object, e.g. a local
+    fakeredis instance in tests.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(self.client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+def create_backend(url: Optional[str] = None) -> CacheBackend:
+    """Build a backend from CACHE_URL: memory://, sqlite:///path/to/cache.db or redis://host:port/db"""
+    url = url or os.getenv("CACHE_URL", "memory://")
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCache(url)
+    if not url.startswith("memory://"):
+        logger.warning(f"⚠️ Unknown CACHE_URL scheme, using in-memory cache: {url}")
+    return MemoryCache()
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def set_backend(backend: CacheBackend):
+    """Swap the process-wide backend, e.g. for tests"""
+    global _backend
+    _backend = backend
+    for cache in _caches.values():
+        cache._generation = None
+
+class Cache:
+    """JSON values in a namespace of the shared backend.
+
+    Keys are prefixed with the namespace and its generation, so invalidate()
+    drops the whole namespace by bumping the generation; old entries simply
+    age out through their TTL. Each worker keeps the generation it last read
+    for GENERATION_REFRESH_INTERVAL, so lookups cost one backend read and an
+    invalidation elsewhere is seen within that interval.
+    """
+
+    def __init__(self, namespace: str, default_ttl: Optional[float] = None, backend: Optional[CacheBackend] = None):
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self._backend = backend
+        self._generation: Optional[str] = None
+        self._generation_read = 0.0
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend or get_backend()
+
+    def _current_generation(self) -> str:
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_read >= GENERATION_REFRESH_INTERVAL:
+            self._generation = self.backend.get(f"{self.namespace}:generation") or "0"
+            self._generation_read = now
+        return self._generation
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{self._current_generation()}:{key}"
+
+    def _load(self, full_key: str):
+        raw = self.backend.get(full_key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._load(self._key(key))
+        record_cache(self.namespace, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.backend.set(self._key(key), json.dumps(value), ttl or self.default_ttl)
+
+    def delete(self, key: str):
+        self.backend.delete(self._key(key))
+
+    def invalidate(self):
+        """Drop every entry in the namespace"""
+        self._generation = str(self.backend.incr(f"{self.namespace}:generation"))
+        self._generation_read = time.monotonic()
+
+    def _begin(self, key: str):
+        full_key = self._key(key)
+        value = self._load(full_key)
+        record_cache(self.namespace, value is not _MISSING)
+        if value is not _MISSING:
+            return full_key, value, False
+        return full_key, value, self.backend.add(f"{full_key}:lock", "1", LOCK_TIMEOUT)
+
+    def _store(self, full_key: str, value: Any, ttl: Optional[float]):
+        self.backend.set(full_key, json.dumps(value), ttl or self.default_ttl)
+
+    def get_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value, computing it once across workers on a miss.
+
+        Called on an event loop thread it never waits for another worker's
+        computation (that would stall every request on the loop); it
+        computes the value itself instead. Async code should prefer
+        aget_or_set.
+        """
+        full_key, value, locked = self._begin(key)
+        if value is not _MISSING:
+            return value
+        deadline = time.monotonic() if _on_event_loop() else time.monotonic() + LOCK_TIMEOUT
+        while not locked and time.monotonic() < deadline:
+            # Another worker is computing it; wait for its value, or take over if it gave up
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._load(full_key)
+            if value is not _MISSING:
+                return value
+            locked = self.backend.add(f"{full_key}:lock", "1", LOCK_TIMEOUT)
+        try:
+            value = factory()
+            self._store(full_key, value, ttl)
+            return value
+        finally:
+            if locked:
+                self.backend.delete(f"{full_key}:lock")
+
+    async def aget_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Async get_or_set; `factory` may be a plain or async callable"""
+        full_key, value, locked = self._begin(key)
+        if value is not _MISSING:
+            return value
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not locked and time.monotonic() < deadline:
+            # Another worker is computing it; wait for its value, or take over if it gave up
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = self._load(full_key)
+            if value is not _MISSING:
+                return value
+            locked = self.backend.add(f"{full_key}:lock", "1", LOCK_TIMEOUT)
+        try:
+            value = factory()
+            if inspect.isawaitable(value):
+                value = await value
+            self._store(full_key, value, ttl)
+            return value
+        finally:
+            if locked:
+                self.backend.delete(f"{full_key}:lock")
+
+_caches: Dict[str, Cache] = {}
+
+def get_cache(namespace: str, default_ttl: Optional[float] = None) -> Cache:
+    """Shared Cache for a namespace"""
+    if namespace not in _caches:
+        _caches[namespace] = Cache(namespace, default_ttl)
+    return _caches[namespace]
@@ -0,0 +1,37 @@
+import re
+from typing import Dict, Iterable
+
+# What a challenge counts. Challenges with a metric advance from completed
+# workouts; challenges without one are still updated through the API.
+PUSHUP_REPS = "pushup_reps"
+CARDIO_MINUTES = "cardio_minutes"
+PERSONAL_RECORDS = "personal_records"
+WORKOUTS = "workouts"
+
+METRICS = (PUSHUP_REPS, CARDIO_MINUTES, PERSONAL_RECORDS, WORKOUTS)
+
+PUSHUP_PATTERN = re.compile(r"\bpush[- ]?ups?\b", re.IGNORECASE)
+CARDIO_PATTERN = re.compile(
+    r"\b(run|running|jog|jogging|sprints?|cardio|cycling|bike|biking|rowing|swim|swimming"
+    r"|elliptical|stairs?|stair climber|jump rope|skipping|hiit)\b",
+    re.IGNORECASE
+)
+
+def measure_logs(log_rows: Iterable[Dict], workouts: int = 1, personal_records: int = 0) -> Dict[str, int]:
+    """Challenge metric increments earned by one completed workout's exercise logs"""
+    pushups = 0
+    cardio_seconds = 0
+    for log in log_rows:
+        name = log.get("exercise_name") or ""
+        if PUSHUP_PATTERN.search(name) and log.get("reps_completed"):
+            # reps_completed is per set, as in the generated plans
+            pushups += log["reps_completed"] * (log.get("sets_completed") or 1)
+        if CARDIO_PATTERN.search(name) and log.get("duration"):
+            cardio_seconds += log["duration"]
+
+    return {
+        PUSHUP_REPS: pushups,
+        CARDIO_MINUTES: cardio_seconds // 60,
+        PERSONAL_RECORDS: personal_records,
+        WORKOUTS: workouts
+    }
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional
+from database import SessionLocal
+from gamification import CHALLENGE_PERIODS, GamificationManager, status_cache
+
+logger = logging.getLogger(__name__)
+
+# How often each worker checks for a new period and for challenges to archive (seconds)
+CHALLENGE_SCHEDULER_INTERVAL = float(os.getenv("CHALLENGE_SCHEDULER_INTERVAL", 60.0))
+# Enroll recently active users in each new scheduled challenge
+CHALLENGE_AUTO_ENROLL = os.getenv("CHALLENGE_AUTO_ENROLL", "true").lower() in ("1", "true", "yes")
+
+class ChallengeScheduler:
+    """Creates daily and weekly challenges at period boundaries and archives ended ones.
+
+    Every worker may run it: a period's challenges are keyed by (type,
+    period_key, name) under a unique index, so only one insert per template
+    wins, and only the winner enrolls users, in the same transaction.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def tick(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.utcnow()
+        counts = {"created": 0, "enrolled": 0, "archived": 0}
+        db = self.session_factory()
+        try:
+            gamification = GamificationManager(db)
+            for kind in CHALLENGE_PERIODS:
+                challenge_ids = gamification.schedule_challenges(kind, now)
+                if challenge_ids and CHALLENGE_AUTO_ENROLL:
+                    counts["enrolled"] += gamification.enroll_active_users(challenge_ids, now)
+                db.commit()
+                counts["created"] += len(challenge_ids)
+
+            counts["archived"] = gamification.archive_expired_challenges(now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if counts["created"]:
+            status_cache.invalidate()
+            logger.info(f"📅 Scheduled {counts['created']} challenges and enrolled {counts['enrolled']} participants")
+        if counts["archived"]:
+            logger.info(f"🗄️ Archived {counts['archived']} ended challenges")
+        return counts
+
+    async def run(self, interval: float = CHALLENGE_SCHEDULER_INTERVAL):
+        """Tick until cancelled, starting straight away so a fresh deploy has challenges"""
+        while True:
+            try:
+                await asyncio.to_thread(self.tick)
+            except Exception as e:
+                logger.error(f"❌ Error scheduling challenges: {str(e)}")
+            await asyncio.sleep(interval)
+
+challenge_scheduler = ChallengeScheduler(SessionLocal)
@@ -1,8 +1,12 @@
 import os
 import logging
-from sqlalchemy import create_engine
+from typing import List
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Select
+from sqlalchemy.dialects import postgresql, sqlite
 from dotenv import load_dotenv
 
 # Configure logging
@@ -24,8 +28,102 @@ if not DATABASE_URL:
     logger.warning("⚠️ No DATABASE_URL found, using SQLite")
     DATABASE_URL = "sqlite:///ai_trainer.db"
 
+# SQLite high-concurrency profile: WAL lets readers run alongside the writer,
+# and all writes go through one connection so they queue in the pool instead
+# of failing with "database is locked"
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", 4))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+# How long a request waits for the writer connection before giving up
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", 30))
+
+# Rows ANALYZE samples per index, so refreshing planner statistics stays cheap on large files
+SQLITE_ANALYSIS_LIMIT = int(os.getenv("SQLITE_ANALYSIS_LIMIT", 1000))
+
+def _is_sqlite_file(url: str) -> bool:
+    return url.startswith("sqlite") and url not in ("sqlite://", "sqlite:///:memory:")
+
+def configure_sqlite_connection(dbapi_connection, read_only: bool = False):
+    """Apply the concurrency PRAGMAs to a new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def refresh_sqlite_statistics(bind) -> bool:
+    """Refresh sqlite_stat1 with a sampled ANALYZE; returns False for other databases"""
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA analysis_limit={SQLITE_ANALYSIS_LIMIT}")
+        conn.exec_driver_sql("ANALYZE")
+    return True
+
+class RoutingSession(Session):
+    """Session that sends plain reads to `read_bind` and everything else to the primary.
+
+    Once a transaction has written (flush, DML, SELECT ... FOR UPDATE or raw
+    SQL) it stays on the primary until commit or rollback, so it always sees
+    its own uncommitted changes.
+    """
+
+    read_bind = None
+
+    def __init__(self, *args, read_bind=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if read_bind is not None:
+            self.read_bind = read_bind
+        self._use_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kw)
+        if self.read_bind is None or self._use_primary or (clause is None and not self._flushing):
+            return primary
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            self._use_primary = True
+            return primary
+        return self.read_bind
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session._use_primary = False
+
+def create_sqlite_engines(url: str):
+    """Writer engine (a single connection, so writes queue) and read-only pool for a SQLite file"""
+    # File-backed SQLite defaults to NullPool in SQLAlchemy 1.4, which takes no pool sizing
+    writer = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITE_TIMEOUT
+    )
+    reader = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        # Readers never block each other, so bursts get extra short-lived connections
+        max_overflow=-1
+    )
+    event.listen(writer, "connect", lambda conn, record: configure_sqlite_connection(conn))
+    event.listen(reader, "connect", lambda conn, record: configure_sqlite_connection(conn, read_only=True))
+    return writer, reader
+
 # Create engine with connection pooling and timeout settings
-if DATABASE_URL.startswith("sqlite"):
+read_engine = None
+if _is_sqlite_file(DATABASE_URL):
+    engine, read_engine = create_sqlite_engines(DATABASE_URL)
+    logger.info(f"✅ SQLite WAL profile: 1 writer, {SQLITE_READ_POOL_SIZE} readers")
+elif DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL, 
         connect_args={"check_same_thread": False},
@@ -42,8 +140,62 @@ else:
         }
     )
 
+# Optional read replicas (comma-separated URLs) for read-only endpoints; read_routing.py picks between them
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URL", "").split(",") if url.strip()]
+
+replica_engines = [
+    create_engine(
+        url.replace("postgres://", "postgresql://", 1),
+        pool_pre_ping=True,
+        pool_recycle=300,
+        connect_args={'connect_timeout': 5} if url.startswith("postgres") else {}
+    )
+    for url in REPLICA_URLS
+]
+
+# Every engine the app talks to, for instrumentation
+engines = [e for e in (engine, read_engine) if e is not None] + replica_engines
+
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+RoutingSession.read_bind = read_engine
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+# Users whose rows a transaction changed are kept in session.info["written_user_ids"]
+# until it ends; read_routing.py keeps their reads on the primary after the commit
+_user_columns_by_mapper = {}
+
+def _user_columns(mapper) -> List[str]:
+    """Attributes of a mapped class that hold a user id: users.id and any foreign key to it"""
+    columns = _user_columns_by_mapper.get(mapper)
+    if columns is None:
+        columns = [
+            prop.key for prop in mapper.column_attrs
+            if any(fk.column.table.name == "users" for fk in prop.columns[0].foreign_keys)
+            or (mapper.local_table.name == "users" and prop.columns[0].primary_key)
+        ]
+        _user_columns_by_mapper[mapper] = columns
+    return columns
+
+def mark_written(db: Session, *user_ids):
+    """Record users whose data this transaction changes outside the ORM unit of work
+    (Core or bulk DML), so their reads stay on the primary once it commits"""
+    if replica_engines:
+        db.info.setdefault("written_user_ids", set()).update(u for u in user_ids if u is not None)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_written_users(session, flush_context):
+    if not replica_engines:
+        return
+    written = session.info.setdefault("written_user_ids", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for key in _user_columns(inspect(obj).mapper):
+            user_id = getattr(obj, key, None)
+            if user_id is not None:
+                written.add(user_id)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_written_users(session):
+    session.info.pop("written_user_ids", None)
 
 # Create base class for declarative models
 Base = declarative_base()
@@ -56,6 +208,16 @@ def get_db():
     finally:
         db.close()
 
+def dialect_insert(db, table):
+    """INSERT for the session's dialect, supporting ON CONFLICT clauses"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def insert_ignore(db, table):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect"""
+    return dialect_insert(db, table).on_conflict_do_nothing()
+
 def init_db():
     """Initialize database tables"""
     try:
@@ -1,58 +1,259 @@
+import gzip
+import hashlib
 import json
 import os
 import shutil
+import subprocess
+import tempfile
+import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 import sqlite3
 from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from models import (
     Base, User, Workout, ExerciseLog, PersonalRecord,
     Achievement, Streak, Challenge, ChallengeParticipant,
     SoundtrackPreference, WorkoutHighlight, AIMotivator,
     MotivationalMessage, TransformationProgress, Friendship,
-    GymSpotted
+    GymSpotted, PointsLedger
 )
+from stats import StatsManager
+from feed import FeedManager
+from personal_records import rebuild_personal_bests
+from points import rebuild_rollups
+from idempotency import purge_expired_keys
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+# Number of most recent backups to keep
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", 7))
+# Parallel pg_dump/pg_restore jobs
+BACKUP_JOBS = int(os.getenv("BACKUP_JOBS", 4))
+# gzip level for SQLite backups and pg_dump
+BACKUP_COMPRESSION = int(os.getenv("BACKUP_COMPRESSION", 6))
+# SQLite pages copied per backup step, and the pause before retrying a busy step (seconds)
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 1024))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", 0.05))
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return "?"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def describe_table_stats(table: str, stats: Dict) -> str:
+    """One report line: rows (~ when estimated), table size and index size"""
+    if stats["rows"] is None:
+        rows = "no row estimate yet"
+    else:
+        rows = f"~{stats['rows']} records" if stats["estimated"] else f"{stats['rows']} records"
+    return (
+        f"{table}: {rows}, {format_bytes(stats['table_bytes'])} data, "
+        f"{format_bytes(stats['index_bytes'])} indexes"
+    )
 
 class DatabaseManager:
     def __init__(self, database_url: Optional[str] = None):
         self.database_url = database_url or os.getenv("DATABASE_URL", "sqlite:///./ai_trainer.db")
         self.engine = create_engine(self.database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.backup_dir = Path("./backups")
-        self.backup_dir.mkdir(exist_ok=True)
+        self.backup_dir = Path(BACKUP_DIR)
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
 
     def create_backup(self) -> str:
-        """Create a backup of the current database"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = self.backup_dir / f"backup_{timestamp}.db"
-        
-        if "sqlite" in self.database_url:
-            # SQLite backup
-            db_path = self.database_url.replace("sqlite:///", "")
-            shutil.copy2(db_path, backup_file)
-        else:
-            # PostgreSQL backup using pg_dump
-            os.system(f"pg_dump {self.database_url} > {backup_file}")
-        
-        return str(backup_file)
+        """Back up the live database without blocking writers; returns the backup path.
+
+        SQLite is copied through the online backup API a few pages at a
+        time and gzipped; PostgreSQL is dumped by parallel pg_dump jobs into
+        a compressed directory-format archive. Either is written under a
+        partial_ name and renamed to backup_ once complete, so pruning never
+        sees a backup still in progress. Every backup gets a SHA-256
+        manifest and older ones beyond BACKUP_RETENTION are pruned.
+        """
+        # The random suffix keeps backups started in the same second apart
+        # (pg_dump refuses an existing directory); names still sort by time
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+        name = f"backup_{timestamp}.db.gz" if "sqlite" in self.database_url else f"backup_{timestamp}"
+        backup_path = self.backup_dir / name
+        partial_path = self.backup_dir / f"partial_{name}"
+        try:
+            if "sqlite" in self.database_url:
+                self._backup_sqlite(partial_path)
+            else:
+                subprocess.run([
+                    "pg_dump", "--format=directory", f"--jobs={BACKUP_JOBS}", f"--compress={BACKUP_COMPRESSION}",
+                    f"--file={partial_path}", f"--dbname={self._libpq_url()}"
+                ], check=True)
+        except BaseException:
+            if partial_path.is_dir():
+                shutil.rmtree(partial_path, ignore_errors=True)
+            else:
+                partial_path.unlink(missing_ok=True)
+            raise
+        partial_path.rename(backup_path)
+
+        self._write_manifest(backup_path)
+        self.prune_backups()
+        return str(backup_path)
+
+    def _sqlite_path(self) -> str:
+        return make_url(self.database_url).database
+
+    def _libpq_url(self) -> str:
+        """The URL without SQLAlchemy's driver suffix, as pg_dump/pg_restore expect"""
+        return make_url(self.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def _backup_sqlite(self, backup_path: Path):
+        snapshot = backup_path.with_suffix("")  # partial_backup_<ts>.db
+        try:
+            source = sqlite3.connect(self._sqlite_path())
+            target = sqlite3.connect(snapshot)
+            try:
+                # Each step holds the source's read lock only while copying that many pages
+                source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+                if check != "ok":
+                    raise RuntimeError(f"Backup failed its integrity check: {check}")
+            finally:
+                target.close()
+                source.close()
+
+            with open(snapshot, "rb") as raw, gzip.open(backup_path, "wb", compresslevel=BACKUP_COMPRESSION) as packed:
+                shutil.copyfileobj(raw, packed)
+        finally:
+            snapshot.unlink(missing_ok=True)
 
-    def restore_backup(self, backup_file: str) -> bool:
-        """Restore database from a backup file"""
+    def _backup_files(self, backup_path: Path) -> List[Path]:
+        if backup_path.is_dir():
+            return sorted(p for p in backup_path.rglob("*") if p.is_file())
+        return [backup_path]
+
+    def _write_manifest(self, backup_path: Path):
+        """Record a SHA-256 per backup file, in sha256sum format"""
+        lines = [
+            f"{_sha256(path)}  {path.relative_to(backup_path.parent)}"
+            for path in self._backup_files(backup_path)
+        ]
+        Path(f"{backup_path}.sha256").write_text("\n".join(lines) + "\n")
+
+    def verify_backup(self, backup_file: str) -> bool:
+        """Check a backup against its SHA-256 manifest"""
+        backup_path = Path(backup_file)
+        manifest = Path(f"{backup_path}.sha256")
+        if not manifest.exists():
+            print(f"No checksum manifest for {backup_path}")
+            return False
+
+        expected = {}
+        for line in manifest.read_text().splitlines():
+            digest, name = line.split("  ", 1)
+            expected[name] = digest
+        actual = {
+            str(path.relative_to(backup_path.parent)): _sha256(path)
+            for path in self._backup_files(backup_path)
+        }
+        if actual != expected:
+            bad = sorted(name for name in expected.keys() | actual.keys() if expected.get(name) != actual.get(name))
+            print(f"Checksum mismatch in {backup_path}: {', '.join(bad)}")
+            return False
+        return True
+
+    def prune_backups(self, keep: Optional[int] = None) -> List[str]:
+        """Delete all but the newest `keep` finished backups; returns what was removed.
+
+        Only backup_ names count: backups in progress are still named
+        partial_ and are left alone.
+        """
+        keep = BACKUP_RETENTION if keep is None else keep
+        backups = sorted(
+            (p for p in self.backup_dir.glob("backup_*") if not p.name.endswith(".sha256")),
+            key=lambda p: p.name,
+            reverse=True
+        )
+        removed = []
+        for path in backups[keep:]:
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+            Path(f"{path}.sha256").unlink(missing_ok=True)
+            removed.append(str(path))
+        return removed
+
+    def restore_backup(self, backup_file: str, force: bool = False, unverified: bool = False) -> bool:
+        """Restore database from a backup, after checking its checksums.
+
+        Archives without a checksum manifest are refused unless `unverified`
+        is set. Restoring over an existing SQLite file rewrites it under any
+        app workers still connected to it, so that needs `force` (stop the
+        app first).
+        """
         try:
+            backup_path = Path(backup_file)
+            if not Path(f"{backup_path}.sha256").exists():
+                if not unverified:
+                    print(f"Refusing to restore {backup_path}: it has no checksum manifest (pass --unverified to restore it anyway)")
+                    return False
+                print(f"WARNING: restoring {backup_path} WITHOUT checksum verification")
+            elif not self.verify_backup(backup_file):
+                return False
+
             if "sqlite" in self.database_url:
-                db_path = self.database_url.replace("sqlite:///", "")
-                shutil.copy2(backup_file, db_path)
+                if Path(self._sqlite_path()).exists() and not force:
+                    print(f"Refusing to restore over the live database {self._sqlite_path()}: stop the app, then pass --force")
+                    return False
+                self._restore_sqlite(backup_path)
+            elif backup_path.is_file():
+                # Plain SQL dump from before directory-format backups
+                subprocess.run(["psql", f"--dbname={self._libpq_url()}", f"--file={backup_path}"], check=True)
             else:
-                os.system(f"psql {self.database_url} < {backup_file}")
+                subprocess.run([
+                    "pg_restore", "--format=directory", f"--jobs={BACKUP_JOBS}", "--clean", "--if-exists",
+                    "--no-owner", f"--dbname={self._libpq_url()}", str(backup_path)
+                ], check=True)
             return True
         except Exception as e:
             print(f"Error restoring backup: {str(e)}")
             return False
 
-    def health_check(self) -> Dict:
-        """Check database health and return status"""
+    def _restore_sqlite(self, backup_path: Path):
+        """Copy the backup into the live database through the backup API, so open connections see a consistent file"""
+        with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+            snapshot = backup_path
+            if backup_path.suffix == ".gz":
+                snapshot = Path(tmp) / backup_path.stem
+                with gzip.open(backup_path, "rb") as packed, open(snapshot, "wb") as raw:
+                    shutil.copyfileobj(packed, raw)
+
+            source = sqlite3.connect(snapshot)
+            target = sqlite3.connect(self._sqlite_path())
+            try:
+                source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+            finally:
+                target.close()
+                source.close()
+
+    def health_check(self, exact: bool = False) -> Dict:
+        """Check database health and return status.
+
+        Row counts come from the planner statistics (pg_class.reltuples,
+        sqlite_stat1) unless `exact` is set, so the check does not scan
+        large tables; tables the statistics do not cover yet are counted.
+        """
         try:
             inspector = inspect(self.engine)
             tables = inspector.get_table_names()
@@ -61,7 +262,8 @@ class DatabaseManager:
                 'achievements', 'streaks', 'challenges', 'challenge_participants',
                 'soundtrack_preferences', 'workout_highlights', 'ai_motivators',
                 'motivational_messages', 'transformation_progress', 'friendships',
-                'gym_spotted'
+                'gym_spotted', 'user_stats', 'feed_items', 'friend_edges',
+                'points_ledger', 'challenge_results', 'personal_bests'
             }
             
             db = self.SessionLocal()
@@ -70,17 +272,20 @@ class DatabaseManager:
                 db.execute(text("SELECT 1"))
                 
                 # Get table statistics
-                stats = {}
-                for table in tables:
-                    result = db.execute(text(f"SELECT COUNT(*) FROM {table}"))
-                    count = result.scalar()
-                    stats[table] = count
+                if "sqlite" in self.database_url:
+                    stats = self._sqlite_table_stats(db, tables, exact)
+                    # Read from the header, unlike dbstat, which visits every page
+                    database_bytes = db.execute(text("PRAGMA page_count")).scalar() * db.execute(text("PRAGMA page_size")).scalar()
+                else:
+                    stats = self._postgres_table_stats(db, tables, exact)
+                    database_bytes = db.execute(text("SELECT pg_database_size(current_database())")).scalar()
                 
                 return {
                     "status": "healthy",
                     "connection": "ok",
                     "missing_tables": list(expected_tables - set(tables)),
                     "table_stats": stats,
+                    "database_bytes": database_bytes,
                     "database_type": "sqlite" if "sqlite" in self.database_url else "postgresql"
                 }
             finally:
@@ -91,6 +296,69 @@ class DatabaseManager:
                 "error": str(e)
             }
 
+    def _count_rows(self, db, table: str) -> int:
+        return db.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+
+    def _postgres_table_stats(self, db, tables: List[str], exact: bool) -> Dict[str, Dict]:
+        catalog = {
+            name: (reltuples, relpages, table_bytes, index_bytes)
+            for name, reltuples, relpages, table_bytes, index_bytes in db.execute(text("""
+                SELECT c.relname, c.reltuples, c.relpages, pg_table_size(c.oid), pg_indexes_size(c.oid)
+                FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind IN ('r', 'p') AND n.nspname = current_schema()
+            """))
+        }
+        stats = {}
+        for table in tables:
+            reltuples, relpages, table_bytes, index_bytes = catalog.get(table, (-1, 0, None, None))
+            # reltuples is -1 (PostgreSQL 14+) or 0 with no pages until the table is first analyzed
+            estimated = not exact and reltuples >= 0 and relpages > 0
+            stats[table] = {
+                "rows": int(reltuples) if estimated else self._count_rows(db, table),
+                "estimated": estimated,
+                "table_bytes": table_bytes,
+                "index_bytes": index_bytes
+            }
+        return stats
+
+    def _sqlite_table_stats(self, db, tables: List[str], exact: bool) -> Dict[str, Dict]:
+        """Row estimates from sqlite_stat1, which the maintenance job refreshes.
+
+        A table it does not cover yet has no estimate (rows is None). Row
+        counts and per-table sizes read every page, so they are only
+        gathered when `exact` is set.
+        """
+        if exact:
+            sizes = {}
+            try:
+                owners = dict(db.execute(text("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")).all())
+                for name, size in db.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")):
+                    table = owners.get(name, name)
+                    entry = sizes.setdefault(table, {"table_bytes": 0, "index_bytes": 0})
+                    entry["table_bytes" if name == table else "index_bytes"] += size
+            except OperationalError:
+                pass  # SQLite built without the dbstat table
+            return {
+                table: {
+                    "rows": self._count_rows(db, table),
+                    "estimated": False,
+                    **sizes.get(table, {"table_bytes": None, "index_bytes": None})
+                }
+                for table in tables
+            }
+
+        estimates = {}
+        try:
+            # The first number of each row is the table's row count at the last ANALYZE
+            for table, stat in db.execute(text("SELECT tbl, stat FROM sqlite_stat1")):
+                estimates[table] = max(estimates.get(table, 0), int(stat.split()[0]))
+        except OperationalError:
+            pass  # never analyzed
+        return {
+            table: {"rows": estimates.get(table), "estimated": True, "table_bytes": None, "index_bytes": None}
+            for table in tables
+        }
+
     def load_sample_data(self) -> None:
         """Load sample data for testing"""
         db = self.SessionLocal()
@@ -123,6 +391,12 @@ class DatabaseManager:
                 )
             ]
             db.add_all(users)
+            db.flush()
+            # Opening balances, so the ledger still sums to each user's total
+            db.add_all([
+                PointsLedger(user_id=u.id, points=u.total_points, source="opening_balance", rolled_up=True)
+                for u in users
+            ])
             db.commit()
 
             # Create sample workouts
@@ -190,6 +464,7 @@ class DatabaseManager:
                 name="Push Day Energy",
                 description="Complete 100 push-ups today. Real ones only! 💪",
                 challenge_type="daily",
+                metric="pushup_reps",
                 target_value=100,
                 reward_points=50,
                 start_date=datetime.now(),
@@ -225,6 +500,71 @@ class DatabaseManager:
         finally:
             db.close()
 
+    def rebuild_user_stats(self, user_id: Optional[int] = None) -> int:
+        """Recompute the user_stats counters from workout history"""
+        db = self.SessionLocal()
+        try:
+            rows = StatsManager(db).rebuild(user_id)
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def rebuild_feeds(self, user_id: Optional[int] = None) -> int:
+        """Recompute friend-feed inboxes from friendships and highlights"""
+        db = self.SessionLocal()
+        try:
+            rows = FeedManager(db).rebuild(user_id)
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def rebuild_points(self, user_id: Optional[int] = None) -> int:
+        """Recompute users.total_points from the points ledger"""
+        db = self.SessionLocal()
+        try:
+            rows = rebuild_rollups(db, user_id)
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def rebuild_personal_bests(self, user_id: Optional[int] = None) -> int:
+        """Recompute personal bests from exercise log history"""
+        db = self.SessionLocal()
+        try:
+            rows = rebuild_personal_bests(db, user_id)
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def purge_idempotency_keys(self) -> int:
+        """Delete idempotency keys past IDEMPOTENCY_KEY_TTL_HOURS"""
+        db = self.SessionLocal()
+        try:
+            rows = purge_expired_keys(db)
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
     def run_migrations(self) -> bool:
         """Run any pending database migrations"""
         try:
@@ -2,7 +2,7 @@
 import os
 import sys
 import logging
-from database_utils import DatabaseManager
+from database_utils import DatabaseManager, describe_table_stats
 from models import Base
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
@@ -75,8 +75,8 @@ def init_production_db():
             if health['status'] == 'healthy':
                 logger.info("✅ Database health check passed!")
                 logger.info("\n📊 Table Statistics:")
-                for table, count in health['table_stats'].items():
-                    logger.info(f"  {table}: {count} records")
+                for table, stats in health['table_stats'].items():
+                    logger.info(f"  {describe_table_stats(table, stats)}")
                 return True
             else:
                 logger.error(f"❌ Database health check failed: {health.get('error', 'Unknown error')}")
@@ -0,0 +1,112 @@
+import os
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session
+from cache import get_cache
+from database import insert_ignore
+from friends import FriendGraph
+from models import FeedItem, FriendEdge, UserStats, WorkoutHighlight
+from pagination import newest_after, page_size, paginate
+
+# Authors with more accepted friends than this are not fanned out on write;
+# their friends pull those highlights at read time instead
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 1000))
+# Recent highlights copied into each side's inbox when a friendship is accepted
+FEED_BACKFILL_ON_ACCEPT = 20
+
+feed_cache = get_cache("feed", default_ttl=300)
+
+FEED_ITEM_COLUMNS = ["user_id", "highlight_id", "author_id", "created_at"]
+
+class FeedManager:
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def _load_high_degree_authors(self) -> List[int]:
+        return [row[0] for row in self.db.query(UserStats.user_id).filter(UserStats.friend_count > FEED_FANOUT_LIMIT)]
+
+    def high_degree_authors(self) -> Set[int]:
+        """Users whose highlights are pulled rather than fanned out"""
+        return set(feed_cache.get_or_set("high_degree", self._load_high_degree_authors))
+
+    def fan_out(self, highlight: WorkoutHighlight) -> int:
+        """Deliver a new highlight to the author's friends (caller commits). Returns inboxes written."""
+        self.db.flush()
+        friend_ids = FriendGraph(self.db).friend_ids(highlight.user_id)
+        if len(friend_ids) > FEED_FANOUT_LIMIT:
+            # Left for readers to pull; make sure they know this author is pulled
+            if highlight.user_id not in self.high_degree_authors():
+                feed_cache.delete("high_degree")
+            return 0
+        if friend_ids:
+            self.db.execute(FeedItem.__table__.insert(), [{
+                "user_id": friend_id,
+                "highlight_id": highlight.id,
+                "author_id": highlight.user_id,
+                "created_at": highlight.created_at
+            } for friend_id in friend_ids])
+        return len(friend_ids)
+
+    def backfill_friendship(self, user_id: int, friend_id: int) -> int:
+        """Copy each side's recent highlights into the other's inbox (caller commits)"""
+        rows = 0
+        for recipient, author in ((user_id, friend_id), (friend_id, user_id)):
+            recent = select(
+                literal(recipient), WorkoutHighlight.id, WorkoutHighlight.user_id, WorkoutHighlight.created_at
+            ).where(
+                WorkoutHighlight.user_id == author
+            ).order_by(WorkoutHighlight.created_at.desc()).limit(FEED_BACKFILL_ON_ACCEPT)
+            rows += self.db.execute(
+                insert_ignore(self.db, FeedItem.__table__).from_select(FEED_ITEM_COLUMNS, recent)
+            ).rowcount
+        return rows
+
+    def _pulled_friend_ids(self, user_id: int) -> List[int]:
+        """The user's friends whose highlights are not fanned out"""
+        authors = self.high_degree_authors()
+        if not authors:
+            return []
+        return [f_id for f_id in FriendGraph(self.db).friend_ids(user_id) if f_id in authors]
+
+    def get_feed(
+        self, user_id: int, cursor: Optional[str] = None, limit: int = 10
+    ) -> Tuple[List[WorkoutHighlight], Optional[str]]:
+        """A page of the user's inbox, merged with highlights pulled from high-degree friends"""
+        limit = page_size(limit)
+        highlights = newest_after(
+            self.db.query(WorkoutHighlight).join(
+                FeedItem, FeedItem.highlight_id == WorkoutHighlight.id
+            ).filter(FeedItem.user_id == user_id),
+            FeedItem.created_at, FeedItem.highlight_id, cursor, limit
+        ).all()
+
+        pulled_ids = self._pulled_friend_ids(user_id)
+        if pulled_ids:
+            pulled = newest_after(
+                self.db.query(WorkoutHighlight).filter(WorkoutHighlight.user_id.in_(pulled_ids)),
+                WorkoutHighlight.created_at, WorkoutHighlight.id, cursor, limit
+            ).all()
+            # An author can cross the fan-out limit, so the same highlight may come from both sides
+            merged = {h.id: h for h in highlights + pulled}
+            highlights = sorted(merged.values(), key=lambda h: (h.created_at, h.id), reverse=True)
+
+        return paginate(highlights, limit)
+
+    def rebuild(self, user_id: Optional[int] = None) -> int:
+        """Recompute inboxes from friendships and highlights. Returns rows written."""
+        query = self.db.query(FeedItem)
+        if user_id is not None:
+            query = query.filter(FeedItem.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+        pulled = self.high_degree_authors()
+        stmt = select(
+            FriendEdge.user_id, WorkoutHighlight.id, WorkoutHighlight.user_id, WorkoutHighlight.created_at
+        ).select_from(FriendEdge).join(
+            WorkoutHighlight, WorkoutHighlight.user_id == FriendEdge.friend_id
+        )
+        if pulled:
+            stmt = stmt.where(FriendEdge.friend_id.not_in(pulled))
+        if user_id is not None:
+            stmt = stmt.where(FriendEdge.user_id == user_id)
+        return self.db.execute(FeedItem.__table__.insert().from_select(FEED_ITEM_COLUMNS, stmt)).rowcount
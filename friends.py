@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy.orm import Session
+from cache import get_cache
+from database import insert_ignore
+from models import FriendEdge, UserStats
+from stats import StatsManager
+
+# Accepted friend ids per user; dropped for both sides when a friendship is accepted
+friends_cache = get_cache("friends", default_ttl=3600)
+
+class FriendGraph:
+    """Accepted friendships as symmetric adjacency rows (friend_edges)"""
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+        self.stats = StatsManager(db_session)
+
+    def friend_ids(self, user_id: int) -> List[int]:
+        """Ids of the user's accepted friends (cached)"""
+        return friends_cache.get_or_set(str(user_id), lambda: [
+            row[0] for row in self.db.query(FriendEdge.friend_id).filter(FriendEdge.user_id == user_id)
+        ])
+
+    def are_friends(self, user_id: int, friend_id: int) -> bool:
+        return self.db.query(FriendEdge).get((user_id, friend_id)) is not None
+
+    def friend_count(self, user_id: int) -> int:
+        """Counter maintained alongside the edges, not a COUNT(*)"""
+        return self.db.query(UserStats.friend_count).filter(UserStats.user_id == user_id).scalar() or 0
+
+    def connect(self, user_id: int, friend_id: int) -> bool:
+        """Store both directions and bump both friend counts (caller commits, then invalidates)"""
+        added = False
+        now = datetime.utcnow()
+        for a, b in ((user_id, friend_id), (friend_id, user_id)):
+            stmt = insert_ignore(self.db, FriendEdge.__table__).values(user_id=a, friend_id=b, created_at=now)
+            if self.db.execute(stmt).rowcount:
+                self.stats.record_friend_added(a)
+                added = True
+        return added
+
+    def invalidate(self, *user_ids: int):
+        """Drop cached friend sets; call after the commit that changed them"""
+        for user_id in user_ids:
+            friends_cache.delete(str(user_id))
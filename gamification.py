@@ -1,7 +1,31 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta, timezone
+import os
 import random
-from typing import List, Dict
-from models import User, Achievement, Streak, Challenge, ChallengeParticipant
+from typing import List, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import bindparam, false, func, literal, select
+from sqlalchemy.exc import IntegrityError
+from database import insert_ignore, mark_written
+from models import User, UserStats, Achievement, Streak, Challenge, ChallengeParticipant
+from achievement_rules import (
+    COMPLETED_WORKOUTS, CURRENT_STREAK, PERSONAL_RECORDS_30_DAYS, TOTAL_PERSONAL_RECORDS, RuleEngine
+)
+from cache import get_cache
+from challenge_progress import CARDIO_MINUTES, PERSONAL_RECORDS, PUSHUP_REPS, WORKOUTS
+from points import award_many, award_points, level_for, points_total, title_for
+from standings import challenge_standings, persist_results
+
+# Rendered gamification status per user; entries are dropped whenever the
+# user's points, streak or challenges change, and the TTL bounds anything missed
+status_cache = get_cache("gamification", default_ttl=60)
+
+_participants = ChallengeParticipant.__table__
+
+# Progress added by completed workouts, one parameter set per participation
+ADD_PROGRESS = _participants.update().where(_participants.c.id == bindparam("b_id")).values(
+    current_value=func.coalesce(_participants.c.current_value, 0) + bindparam("b_delta"),
+    updated_at=bindparam("b_now")
+)
 
 # Achievement definitions with Gen Z flair
 ACHIEVEMENTS = {
@@ -12,7 +36,8 @@ ACHIEVEMENTS = {
             "badge_url": "https://img.shields.io/badge/Streak-7%20Days-bronze?style=for-the-badge&logo=firebase&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o6ZtrbzjGAAXyx2WQ/giphy.gif",
             "points": 100,
-            "days": 7
+            "counter": CURRENT_STREAK,
+            "threshold": 7
         },
         {
             "name": "Main Character Energy",
@@ -20,7 +45,8 @@ ACHIEVEMENTS = {
             "badge_url": "https://img.shields.io/badge/Streak-30%20Days-gold?style=for-the-badge&logo=firebase&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o7TKMt1VVNkHV2PaE/giphy.gif",
             "points": 500,
-            "days": 30
+            "counter": CURRENT_STREAK,
+            "threshold": 30
         }
     ],
     "pr": [
@@ -29,14 +55,18 @@ ACHIEVEMENTS = {
             "description": "First PR! Let's get this bread! 🍞",
             "badge_url": "https://img.shields.io/badge/Achievement-PR%20Breaker-red?style=for-the-badge&logo=powershell&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o7TKDkDbIDJieKbVm/giphy.gif",
-            "points": 50
+            "points": 50,
+            "counter": TOTAL_PERSONAL_RECORDS,
+            "threshold": 1
         },
         {
             "name": "Absolute Unit",
             "description": "5 PRs in one month! Sheeeesh! 💪",
             "badge_url": "https://img.shields.io/badge/Achievement-PR%20Breaker-red?style=for-the-badge&logo=powershell&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o7TKDkDbIDJieKbVm/giphy.gif",
-            "points": 200
+            "points": 200,
+            "counter": PERSONAL_RECORDS_30_DAYS,
+            "threshold": 5
         }
     ],
     "milestone": [
@@ -45,30 +75,24 @@ ACHIEVEMENTS = {
             "description": "Completed 10 workouts! The algorithm loves you! 📱",
             "badge_url": "https://img.shields.io/badge/Achievement-First%20Workout-blue?style=for-the-badge&logo=adidas&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o7TKtsBMu4lwFXvJS/giphy.gif",
-            "points": 150
+            "points": 150,
+            "counter": COMPLETED_WORKOUTS,
+            "threshold": 10
         },
         {
             "name": "Built Different",
             "description": "50 workouts completed! No skips, just W's! 👑",
             "badge_url": "https://img.shields.io/badge/Achievement-First%20Workout-blue?style=for-the-badge&logo=adidas&logoColor=white",
             "meme_url": "https://media.giphy.com/media/3o7TKtsBMu4lwFXvJS/giphy.gif",
-            "points": 750
+            "points": 750,
+            "counter": COMPLETED_WORKOUTS,
+            "threshold": 50
         }
     ]
 }
 
-# Titles based on levels
-TITLES = {
-    1: "Rookie Lifter",
-    5: "Gym Rat Apprentice",
-    10: "Certified Gains Enjoyer",
-    15: "Fitness Girlboss/Maleboss",
-    20: "Gym Influencer",
-    25: "Swoledier",
-    30: "Gains Legend",
-    40: "Fitness CEO",
-    50: "Gigachad/Gigastacy"
-}
+# Compiled once; a check costs one query however many achievements are defined
+ACHIEVEMENT_RULES = RuleEngine(ACHIEVEMENTS)
 
 # Challenge templates
 DAILY_CHALLENGES = [
@@ -76,13 +100,15 @@ DAILY_CHALLENGES = [
         "name": "Push Day Energy",
         "description": "Complete 100 push-ups today (any variation). Real ones only! 💪",
         "target_value": 100,
-        "reward_points": 50
+        "reward_points": 50,
+        "metric": PUSHUP_REPS
     },
     {
         "name": "Cardio? More like Car-YES-o",
         "description": "20 minutes of any cardio. It's giving main character morning routine! 🏃‍♂️",
         "target_value": 20,
-        "reward_points": 40
+        "reward_points": 40,
+        "metric": CARDIO_MINUTES
     }
 ]
 
@@ -91,76 +117,127 @@ WEEKLY_CHALLENGES = [
         "name": "Gains Week Challenge",
         "description": "Hit 3 PRs this week. We go Jim! 🏋️‍♂️",
         "target_value": 3,
-        "reward_points": 200
+        "reward_points": 200,
+        "metric": PERSONAL_RECORDS
     },
     {
         "name": "Consistency Check",
         "description": "Complete 5 workouts this week. No skips, just gains! 📈",
         "target_value": 5,
-        "reward_points": 150
+        "reward_points": 150,
+        "metric": WORKOUTS
     }
 ]
 
+# Scheduled challenges: templates and how many of them run per period
+CHALLENGE_PERIODS = {
+    "daily": (DAILY_CHALLENGES, 2),
+    "weekly": (WEEKLY_CHALLENGES, 2),
+}
+# Users with a completed workout this recent are enrolled in new scheduled challenges
+CHALLENGE_ENROLL_ACTIVE_DAYS = int(os.getenv("CHALLENGE_ENROLL_ACTIVE_DAYS", 14))
+# Ended challenges keep their participant rows this long before being archived
+CHALLENGE_ARCHIVE_AFTER = timedelta(hours=int(os.getenv("CHALLENGE_ARCHIVE_AFTER_HOURS", 24)))
+
+PARTICIPANT_COLUMNS = ["challenge_id", "user_id", "current_value", "completed", "joined_at", "updated_at"]
+
+def challenge_period(kind: str, now: datetime) -> Tuple[str, datetime, datetime]:
+    """(period key, start, end) of the UTC day or ISO week containing `now`"""
+    day = now.date()
+    if kind == "daily":
+        start = datetime.combine(day, datetime.min.time())
+        return day.isoformat(), start, start + timedelta(days=1)
+    monday = day - timedelta(days=day.weekday())
+    year, week, _ = monday.isocalendar()
+    start = datetime.combine(monday, datetime.min.time())
+    return f"{year}-W{week:02d}", start, start + timedelta(days=7)
+
+def user_zone(user: User) -> ZoneInfo:
+    """The timezone whose midnights bound the user's streak days; UTC if unset or unknown"""
+    try:
+        return ZoneInfo(user.timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+def local_day(moment: datetime, zone: ZoneInfo):
+    """Calendar date of a naive UTC timestamp in `zone`"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+def streak_expiry(last_workout: datetime, zone: ZoneInfo) -> datetime:
+    """Naive UTC instant the streak breaks: the end of the local day after the last workout"""
+    boundary = datetime.combine(local_day(last_workout, zone) + timedelta(days=2), time.min, tzinfo=zone)
+    return boundary.astimezone(timezone.utc).replace(tzinfo=None)
+
 class GamificationManager:
     def __init__(self, db_session):
         self.db = db_session
 
     async def check_and_award_achievements(self, user: User) -> List[Achievement]:
-        """Check and award new achievements for a user"""
-        new_achievements = []
-        
-        # Check streak achievements
-        streak = self.db.query(Streak).filter(Streak.user_id == user.id).first()
-        if streak:
-            for achievement in ACHIEVEMENTS["streak"]:
-                if streak.current_streak >= achievement["days"]:
-                    existing = self.db.query(Achievement).filter(
-                        Achievement.user_id == user.id,
-                        Achievement.name == achievement["name"]
-                    ).first()
-                    
-                    if not existing:
-                        new_achievement = Achievement(
-                            user_id=user.id,
-                            name=achievement["name"],
-                            description=achievement["description"],
-                            badge_url=achievement["badge_url"],
-                            meme_url=achievement["meme_url"],
-                            achievement_type="streak"
-                        )
-                        self.db.add(new_achievement)
-                        new_achievements.append(new_achievement)
-                        user.total_points += achievement["points"]
-        
+        """Check and award new achievements for a user (caller commits)"""
+        # Counters are read from the database, so pending streak changes go first
+        self.db.flush()
+        values, unlocked = ACHIEVEMENT_RULES.load(self.db, user.id, datetime.utcnow())
+        earned = ACHIEVEMENT_RULES.earned(values, unlocked)
+
+        new_achievements = [
+            Achievement(
+                user_id=user.id,
+                name=rule.definition["name"],
+                description=rule.definition["description"],
+                badge_url=rule.definition["badge_url"],
+                meme_url=rule.definition["meme_url"],
+                achievement_type=rule.achievement_type
+            )
+            for rule in earned
+        ]
+        points = [rule.definition["points"] for rule in earned]
+        self.db.add_all(new_achievements)
+
+        if new_achievements:
+            self.db.flush()
+            award_many(self.db, [
+                {"user_id": user.id, "points": p, "source": "achievement", "source_id": a.id}
+                for a, p in zip(new_achievements, points)
+            ])
+
         # Update user level and title
         self.update_user_level(user)
         
-        if new_achievements:
-            self.db.commit()
-        
         return new_achievements
 
     def update_user_level(self, user: User):
         """Update user's level and title based on points"""
-        new_level = 1 + (user.total_points // 1000)  # Level up every 1000 points
+        new_level = level_for(points_total(self.db, user.id))
         if new_level != user.level:
             user.level = new_level
-            # Find the highest title they qualify for
-            qualified_titles = {k: v for k, v in TITLES.items() if k <= new_level}
-            if qualified_titles:
-                user.title = qualified_titles[max(qualified_titles.keys())]
+            user.title = title_for(new_level) or user.title
+
+    async def update_streak(self, user: User, completed_at: Optional[datetime] = None) -> Dict:
+        """Update user's workout streak (caller commits)"""
+        streak = self.get_or_create_streak(user)
+        self.advance_streak(streak, completed_at or datetime.utcnow(), user_zone(user))
+        self.db.flush()
+        
+        return self.streak_info(streak)
 
-    async def update_streak(self, user: User) -> Dict:
-        """Update user's workout streak"""
+    def get_or_create_streak(self, user: User) -> Streak:
+        """Load the user's streak row, adding an empty one if missing"""
         streak = self.db.query(Streak).filter(Streak.user_id == user.id).first()
         if not streak:
-            streak = Streak(user_id=user.id)
+            streak = Streak(user_id=user.id, current_streak=0, longest_streak=0, streak_multiplier=1.0)
             self.db.add(streak)
+        return streak
+
+    def advance_streak(self, streak: Streak, completed_at: datetime, zone: ZoneInfo):
+        """Apply a single workout completed at `completed_at` (naive UTC) to the streak, by days in `zone`"""
+        workout_day = local_day(completed_at, zone)
+        last_workout = local_day(streak.last_workout_date, zone) if streak.last_workout_date else None
         
-        today = datetime.utcnow().date()
-        last_workout = streak.last_workout_date.date() if streak.last_workout_date else None
+        if last_workout and workout_day <= last_workout:
+            # Another workout on the same day, or an older one replayed late
+            return
         
-        if not last_workout or (today - last_workout) > timedelta(days=1):
+        if not last_workout or (workout_day - last_workout) > timedelta(days=1):
             # Streak broken or first workout
             streak.current_streak = 1
         else:
@@ -170,13 +247,26 @@ class GamificationManager:
         if streak.current_streak > streak.longest_streak:
             streak.longest_streak = streak.current_streak
         
-        streak.last_workout_date = datetime.utcnow()
+        streak.last_workout_date = completed_at
+        streak.expires_at = streak_expiry(completed_at, zone)
         
         # Increase multiplier for longer streaks
         streak.streak_multiplier = min(1 + (streak.current_streak * 0.1), 2.0)
-        
-        self.db.commit()
-        
+
+    def expire_streaks(self, now: datetime) -> List[int]:
+        """Break every streak whose grace day has passed, in one UPDATE (caller commits). Returns the users affected."""
+        streaks = Streak.__table__
+        expired = (streaks.c.expires_at <= now, streaks.c.current_streak > 0)
+        # No RETURNING on SQLite: read the users first, locking their rows where
+        # supported; a completion can only push expires_at past `now`
+        user_ids = [row[0] for row in self.db.execute(
+            select(streaks.c.user_id).where(*expired).with_for_update()
+        )]
+        if user_ids:
+            self.db.execute(streaks.update().where(*expired).values(current_streak=0, streak_multiplier=1.0))
+        return user_ids
+
+    def streak_info(self, streak: Streak) -> Dict:
         return {
             "current_streak": streak.current_streak,
             "longest_streak": streak.longest_streak,
@@ -184,30 +274,76 @@ class GamificationManager:
         }
 
     async def create_daily_challenges(self) -> List[Challenge]:
-        """Create new daily challenges"""
-        today = datetime.utcnow().date()
-        tomorrow = today + timedelta(days=1)
-        
-        # Select 2 random daily challenges
-        selected_challenges = random.sample(DAILY_CHALLENGES, 2)
-        new_challenges = []
-        
-        for challenge_template in selected_challenges:
-            challenge = Challenge(
-                name=challenge_template["name"],
-                description=challenge_template["description"],
-                challenge_type="daily",
-                target_value=challenge_template["target_value"],
-                reward_points=challenge_template["reward_points"],
-                start_date=datetime.combine(today, datetime.min.time()),
-                end_date=datetime.combine(tomorrow, datetime.min.time()),
-                meme_reward="/static/memes/challenge_complete.gif"
-            )
-            self.db.add(challenge)
-            new_challenges.append(challenge)
-        
+        """Create today's daily challenges unless they already exist"""
+        challenge_ids = self.schedule_challenges("daily", datetime.utcnow())
         self.db.commit()
-        return new_challenges
+        status_cache.invalidate()
+        if not challenge_ids:
+            return []
+        return self.db.query(Challenge).filter(Challenge.id.in_(challenge_ids)).all()
+
+    def schedule_challenges(self, kind: str, now: datetime) -> List[int]:
+        """Create the current period's challenges of a kind (caller commits). Returns ids created here."""
+        templates, count = CHALLENGE_PERIODS[kind]
+        period_key, start, end = challenge_period(kind, now)
+        # Seeded by the period, so every worker and restart draws the same templates
+        selected = random.Random(f"{kind}:{period_key}").sample(templates, min(count, len(templates)))
+
+        created = []
+        for template in selected:
+            stmt = insert_ignore(self.db, Challenge.__table__).values(
+                name=template["name"],
+                description=template["description"],
+                challenge_type=kind,
+                metric=template["metric"],
+                target_value=template["target_value"],
+                reward_points=template["reward_points"],
+                start_date=start,
+                end_date=end,
+                meme_reward="/static/memes/challenge_complete.gif",
+                period_key=period_key,
+                created_at=now
+            )
+            if self.db.execute(stmt).rowcount:
+                created.append(template["name"])
+        if not created:
+            return []
+        return [row[0] for row in self.db.query(Challenge.id).filter(
+            Challenge.challenge_type == kind,
+            Challenge.period_key == period_key,
+            Challenge.name.in_(created)
+        )]
+
+    def enroll_active_users(self, challenge_ids: List[int], now: datetime) -> int:
+        """Enroll every recently active user in the challenges with one INSERT ... SELECT (caller commits)"""
+        if not challenge_ids:
+            return 0
+        eligible = select(
+            Challenge.id, UserStats.user_id, literal(0), false(), literal(now), literal(now)
+        ).select_from(UserStats).join(Challenge, Challenge.id.in_(challenge_ids)).where(
+            UserStats.last_completion_date >= now - timedelta(days=CHALLENGE_ENROLL_ACTIVE_DAYS)
+        )
+        stmt = insert_ignore(self.db, ChallengeParticipant.__table__).from_select(PARTICIPANT_COLUMNS, eligible)
+        return self.db.execute(stmt).rowcount
+
+    def archive_expired_challenges(self, now: datetime, batch: int = 100) -> int:
+        """Store final standings of long-ended challenges and drop their participant rows (caller commits)"""
+        challenge_ids = [row[0] for row in self.db.query(Challenge.id).filter(
+            Challenge.archived_at.is_(None),
+            Challenge.end_date <= now - CHALLENGE_ARCHIVE_AFTER
+        ).order_by(Challenge.end_date).limit(batch).with_for_update(skip_locked=True)]
+        if not challenge_ids:
+            return 0
+
+        for challenge_id in challenge_ids:
+            persist_results(self.db, challenge_id)
+        self.db.query(ChallengeParticipant).filter(
+            ChallengeParticipant.challenge_id.in_(challenge_ids)
+        ).delete(synchronize_session=False)
+        self.db.query(Challenge).filter(Challenge.id.in_(challenge_ids)).update(
+            {Challenge.archived_at: now}, synchronize_session=False
+        )
+        return len(challenge_ids)
 
     async def join_challenge(self, user: User, challenge_id: int) -> ChallengeParticipant:
         """Join a challenge"""
@@ -224,10 +360,86 @@ class GamificationManager:
             challenge_id=challenge_id
         )
         self.db.add(participant)
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent request joined first; the unique index kept it to one row
+            self.db.rollback()
+            return self.db.query(ChallengeParticipant).filter(
+                ChallengeParticipant.user_id == user.id,
+                ChallengeParticipant.challenge_id == challenge_id
+            ).first()
+        status_cache.delete(str(user.id))
         
         return participant
 
+    async def advance_challenges(self, user: User, events: List[Tuple[datetime, Dict[str, int]]]) -> List[Dict]:
+        """Add workout metrics to the user's running challenges with one batched UPDATE (caller commits).
+
+        `events` holds (completed_at, increments) per completed workout; each
+        challenge only counts the workouts that fall inside its window.
+        """
+        events = [(at, increments) for at, increments in events if any(increments.values())]
+        if not events:
+            return []
+        now = datetime.utcnow()
+
+        rows = self.db.query(
+            ChallengeParticipant.id, ChallengeParticipant.current_value, ChallengeParticipant.completed,
+            Challenge.id, Challenge.name, Challenge.metric, Challenge.target_value, Challenge.reward_points,
+            Challenge.start_date, Challenge.end_date
+        ).join(
+            Challenge, Challenge.id == ChallengeParticipant.challenge_id
+        ).filter(
+            ChallengeParticipant.user_id == user.id,
+            Challenge.metric.isnot(None),
+            Challenge.start_date <= max(at for at, _ in events),
+            Challenge.end_date > min(at for at, _ in events),
+            # Ended challenges keep their final standings
+            Challenge.end_date > now
+        ).all()
+
+        updates, progress = [], []
+        for (participant_id, current_value, completed, challenge_id, name, metric,
+             target_value, reward_points, start_date, end_date) in rows:
+            delta = sum(
+                increments.get(metric, 0) for at, increments in events
+                if start_date <= at < end_date
+            )
+            if not delta:
+                continue
+            value = (current_value or 0) + delta
+            updates.append({"b_id": participant_id, "b_delta": delta})
+            progress.append({
+                "participant_id": participant_id,
+                "challenge_id": challenge_id,
+                "name": name,
+                "current_value": value,
+                "target_value": target_value,
+                "completed": bool(completed),
+                "reward_points": reward_points if value >= target_value and not completed else 0
+            })
+        if not updates:
+            return []
+
+        self.db.execute(ADD_PROGRESS, [{**update, "b_now": now} for update in updates])
+        mark_written(self.db, user.id)
+
+        for entry in progress:
+            if not entry["reward_points"]:
+                continue
+            # Claim the completion so a concurrent workout cannot award it twice
+            claimed = self.db.query(ChallengeParticipant).filter(
+                ChallengeParticipant.id == entry["participant_id"],
+                ChallengeParticipant.completed.isnot(True)
+            ).update({ChallengeParticipant.completed: True}, synchronize_session=False)
+            if claimed:
+                entry["completed"] = True
+                award_points(self.db, user.id, entry["reward_points"], "challenge", entry["challenge_id"])
+            else:
+                entry["reward_points"] = 0
+        return [{k: v for k, v in entry.items() if k != "participant_id"} for entry in progress]
+
     async def update_challenge_progress(self, user: User, challenge_id: int, value: int) -> Dict:
         """Update progress in a challenge"""
         participant = self.db.query(ChallengeParticipant).filter(
@@ -239,16 +451,23 @@ class GamificationManager:
             return {"error": "Not participating in this challenge"}
         
         challenge = self.db.query(Challenge).get(challenge_id)
+        if challenge.metric:
+            return {"error": "Progress in this challenge is tracked from your workouts"}
+        if challenge.end_date and challenge.end_date <= datetime.utcnow():
+            # Final standings are taken from the values as of end_date
+            return {"error": "Challenge has ended"}
         participant.current_value = value
         
         completed = False
         if value >= challenge.target_value and not participant.completed:
             participant.completed = True
             completed = True
-            user.total_points += challenge.reward_points
+            award_points(self.db, user.id, challenge.reward_points, "challenge", challenge_id)
             self.update_user_level(user)
         
         self.db.commit()
+        status_cache.delete(str(user.id))
+        challenge_standings.record(challenge.id, user.id, value)
         
         return {
             "completed": completed,
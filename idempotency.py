@@ -0,0 +1,28 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from models import IdempotencyKey
+
+# A retry with the same key replays the stored response for at least this long;
+# the maintenance pass deletes older keys
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 48))
+
+def get_stored_response(db: Session, key: str, scope: str) -> Optional[Dict]:
+    """Return the response recorded for an idempotency key, if any"""
+    record = db.query(IdempotencyKey).get((key, scope))
+    return record.response if record else None
+
+def store_response(db: Session, key: str, scope: str, response: Dict):
+    """Record a response so retries with the same key replay it.
+
+    The row is added to the caller's transaction; a concurrent duplicate fails
+    on the primary key at commit time.
+    """
+    db.add(IdempotencyKey(key=key, scope=scope, response=jsonable_encoder(response)))
+
+def purge_expired_keys(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete keys older than IDEMPOTENCY_KEY_TTL_HOURS (caller commits); returns rows deleted"""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    return db.query(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from cache import get_backend
+from database import SessionLocal
+from models import PointsLedger, User
+from ranking import RankedSet
+
+logger = logging.getLogger(__name__)
+
+# How often each worker applies new ledger entries to its boards (seconds)
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", 1.0))
+# Boards are written here periodically and on shutdown, so a restart only replays the ledger tail
+LEADERBOARD_SNAPSHOT_PATH = os.getenv("LEADERBOARD_SNAPSHOT_PATH", "./leaderboard_snapshot.json")
+LEADERBOARD_SNAPSHOT_INTERVAL = float(os.getenv("LEADERBOARD_SNAPSHOT_INTERVAL", 60.0))
+# A ledger id still missing after this long belongs to a rolled-back award
+LEADERBOARD_GAP_SECONDS = 60.0
+LEDGER_TAIL_BATCH = 5000
+# Gym changes are announced to every worker through the cache backend: a
+# counter plus one key per change naming the user, kept for this long
+GYM_MOVES_KEY = "leaderboard:gym_moves"
+GYM_MOVE_TTL = 3600
+
+class Leaderboards:
+    """Global and per-gym point rankings kept in memory and fed from the points ledger.
+
+    Every worker tails points_ledger by id, so awards made by any process
+    show up within LEADERBOARD_REFRESH_INTERVAL. Ids can commit out of
+    order, so entries above the watermark are tracked individually until
+    the ids below them have arrived (or are given up on as rolled back).
+    """
+
+    def __init__(self, session_factory, snapshot_path: Optional[str] = LEADERBOARD_SNAPSHOT_PATH):
+        self.session_factory = session_factory
+        self.snapshot_path = snapshot_path
+        self.board = RankedSet()
+        self.gym_boards: Dict[str, RankedSet] = {}
+        self._gyms: Dict[int, Optional[str]] = {}
+        self.watermark = 0
+        # Applied entries above the watermark, with when they were first seen
+        self._seen: Dict[int, float] = {}
+        # Last gym change announcement applied to these boards
+        self.gym_moves = 0
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def _set(self, user_id: int, points: int, gym: Optional[str]):
+        self.board.add(user_id, points)
+        self._gyms[user_id] = gym
+        if gym:
+            self.gym_boards.setdefault(gym, RankedSet()).add(user_id, points)
+
+    def _apply(self, user_id: int, delta: int):
+        points = self.board.increment(user_id, delta)
+        gym = self._gyms.get(user_id)
+        if gym:
+            self.gym_boards.setdefault(gym, RankedSet()).add(user_id, points)
+
+    def _move(self, user_id: int, gym: Optional[str]):
+        old = self._gyms.get(user_id)
+        if user_id not in self._gyms or old == gym:
+            return
+        if old in self.gym_boards:
+            self.gym_boards[old].discard(user_id)
+            if not len(self.gym_boards[old]):
+                del self.gym_boards[old]
+        self._gyms[user_id] = gym
+        if gym:
+            self.gym_boards.setdefault(gym, RankedSet()).add(user_id, self.board.score(user_id) or 0)
+
+    def _reset(self):
+        self.board = RankedSet()
+        self.gym_boards = {}
+        self._gyms = {}
+        self._seen = {}
+
+    def rebuild(self):
+        """Load every user's ledger total from the database"""
+        gym_moves = self._announced_gym_moves()
+        db = self.session_factory()
+        try:
+            watermark = db.query(func.max(PointsLedger.id)).scalar() or 0
+            totals = dict(db.query(PointsLedger.user_id, func.sum(PointsLedger.points)).filter(
+                PointsLedger.id <= watermark
+            ).group_by(PointsLedger.user_id))
+            users = db.query(User.id, User.preferred_gym).all()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._reset()
+            for user_id, gym in users:
+                self._set(user_id, int(totals.get(user_id) or 0), gym)
+            self.watermark = watermark
+            self.gym_moves = gym_moves
+            self.loaded = True
+        logger.info(f"🏆 Built leaderboards for {len(users)} users up to ledger entry {watermark}")
+
+    def load(self):
+        """Restore from the snapshot if there is a usable one, otherwise rebuild; then catch up"""
+        if not self._load_snapshot():
+            self.rebuild()
+        self.refresh()
+
+    def _load_snapshot(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable leaderboard snapshot: {str(e)}")
+            return False
+
+        db = self.session_factory()
+        try:
+            latest = db.query(func.max(PointsLedger.id)).scalar() or 0
+        finally:
+            db.close()
+        if snapshot["watermark"] > latest:
+            # The ledger is behind the snapshot (e.g. a restored backup)
+            logger.warning("⚠️ Leaderboard snapshot is ahead of the ledger; rebuilding")
+            return False
+
+        with self._lock:
+            self._reset()
+            for user_id, points, gym in snapshot["users"]:
+                self._set(user_id, points, gym)
+            self.watermark = snapshot["watermark"]
+            self._seen = dict.fromkeys(snapshot["seen"], time.monotonic())
+            self.gym_moves = snapshot.get("gym_moves", 0)
+            self.loaded = True
+        logger.info(f"🏆 Restored leaderboards for {len(snapshot['users'])} users from {self.snapshot_path}")
+        return True
+
+    def save_snapshot(self):
+        """Write the boards atomically; concurrent workers simply replace each other's file"""
+        if not self.snapshot_path or not self.loaded:
+            return
+        with self._lock:
+            snapshot = {
+                "watermark": self.watermark,
+                "seen": sorted(self._seen),
+                "gym_moves": self.gym_moves,
+                "users": [[user_id, points, self._gyms.get(user_id)] for user_id, points in self.board.items()]
+            }
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def refresh(self) -> int:
+        """Apply ledger entries newer than the watermark. Returns entries applied."""
+        applied = 0
+        db = self.session_factory()
+        try:
+            self._apply_gym_moves(db)
+            while True:
+                entries = db.query(PointsLedger.id, PointsLedger.user_id, PointsLedger.points).filter(
+                    PointsLedger.id > self.watermark
+                ).order_by(PointsLedger.id).limit(LEDGER_TAIL_BATCH).all()
+                new = [entry for entry in entries if entry.id not in self._seen]
+
+                unknown = {entry.user_id for entry in new} - self._gyms.keys()
+                gyms = dict(db.query(User.id, User.preferred_gym).filter(User.id.in_(unknown))) if unknown else {}
+
+                now = time.monotonic()
+                with self._lock:
+                    for user_id in unknown:
+                        self._set(user_id, 0, gyms.get(user_id))
+                    for entry in new:
+                        self._apply(entry.user_id, entry.points)
+                        self._seen[entry.id] = now
+                    self._advance_watermark(now)
+                applied += len(new)
+                if len(entries) < LEDGER_TAIL_BATCH or not new:
+                    return applied
+        finally:
+            db.close()
+
+    def _announced_gym_moves(self) -> int:
+        return int(get_backend().get(GYM_MOVES_KEY) or 0)
+
+    def change_gym(self, user_id: int, gym: Optional[str]):
+        """Move the user to another gym's board here and tell the other workers (call after the commit)"""
+        with self._lock:
+            self._move(user_id, gym)
+        backend = get_backend()
+        announcement = backend.incr(GYM_MOVES_KEY)
+        backend.set(f"{GYM_MOVES_KEY}:{announcement}", str(user_id), GYM_MOVE_TTL)
+
+    def _apply_gym_moves(self, db):
+        """Re-read the gym of every user announced as moved since the last pass"""
+        latest = self._announced_gym_moves()
+        if latest <= self.gym_moves:
+            return
+        backend = get_backend()
+        moved = [backend.get(f"{GYM_MOVES_KEY}:{n}") for n in range(self.gym_moves + 1, latest + 1)]
+        query = db.query(User.id, User.preferred_gym)
+        if None not in moved:
+            query = query.filter(User.id.in_({int(user_id) for user_id in moved}))
+        # Otherwise an announcement expired (or is still being written): re-read every gym
+        gyms = query.all()
+        with self._lock:
+            for user_id, gym in gyms:
+                self._move(user_id, gym)
+            self.gym_moves = latest
+
+    def _advance_watermark(self, now: float):
+        for entry_id in sorted(self._seen):
+            if entry_id != self.watermark + 1 and now - self._seen[entry_id] < LEADERBOARD_GAP_SECONDS:
+                # Ids below this one may still be committing
+                return
+            del self._seen[entry_id]
+            self.watermark = entry_id
+
+    def _board(self, gym: Optional[str] = None) -> RankedSet:
+        if gym is None:
+            return self.board
+        return self.gym_boards.get(gym) or RankedSet()
+
+    def gym_of(self, user_id: int) -> Optional[str]:
+        return self._gyms.get(user_id)
+
+    def top(self, limit: int = 10, gym: Optional[str] = None) -> List[Dict]:
+        """The best `limit` users, globally or at one gym"""
+        with self._lock:
+            return [
+                {"rank": rank, "user_id": user_id, "points": points}
+                for rank, (user_id, points) in enumerate(self._board(gym).range(0, limit), start=1)
+            ]
+
+    def around(self, user_id: int, radius: int = 2, gym: Optional[str] = None) -> Optional[Dict]:
+        """The user's rank with `radius` neighbours either side, or None if they are not ranked"""
+        with self._lock:
+            board = self._board(gym)
+            rank = board.rank(user_id)
+            if rank is None:
+                return None
+            start = max(rank - 1 - radius, 0)
+            return {
+                "rank": rank,
+                "points": board.score(user_id),
+                "total": len(board),
+                "neighbours": [
+                    {"rank": position, "user_id": member, "points": points}
+                    for position, (member, points) in enumerate(board.range(start, rank + radius), start=start + 1)
+                ]
+            }
+
+    def circle(self, user_id: int, friend_ids: Iterable[int], limit: int = 10, radius: int = 2) -> Dict:
+        """Ranking among the user and their friends; circles are small, so they are sorted per request"""
+        with self._lock:
+            members = {user_id, *friend_ids}
+            ranked = sorted(
+                ((self.board.score(member) or 0, member) for member in members),
+                key=lambda pair: (-pair[0], pair[1])
+            )
+        entries = [
+            {"rank": rank, "user_id": member, "points": points}
+            for rank, (points, member) in enumerate(ranked, start=1)
+        ]
+        position = next(i for i, entry in enumerate(entries) if entry["user_id"] == user_id)
+        return {
+            "rank": position + 1,
+            "points": entries[position]["points"],
+            "total": len(entries),
+            "top": entries[:limit],
+            "neighbours": entries[max(position - radius, 0):position + radius + 1]
+        }
+
+    async def run(
+        self,
+        interval: float = LEADERBOARD_REFRESH_INTERVAL,
+        snapshot_interval: float = LEADERBOARD_SNAPSHOT_INTERVAL
+    ):
+        """Load, then follow the ledger until cancelled; snapshots periodically and on the way out"""
+        last_snapshot = time.monotonic()
+        try:
+            while True:
+                try:
+                    if not self.loaded:
+                        await asyncio.to_thread(self.load)
+                    else:
+                        await asyncio.to_thread(self.refresh)
+                    if time.monotonic() - last_snapshot >= snapshot_interval:
+                        await asyncio.to_thread(self.save_snapshot)
+                        last_snapshot = time.monotonic()
+                except Exception as e:
+                    logger.error(f"❌ Error refreshing leaderboards: {str(e)}")
+                await asyncio.sleep(interval)
+        finally:
+            self.save_snapshot()
+
+leaderboards = Leaderboards(SessionLocal)
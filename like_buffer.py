@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from sqlalchemy import bindparam, func
+from database import SessionLocal
+from models import WorkoutHighlight
+from points import LIKE_POINTS, award_many
+
+logger = logging.getLogger(__name__)
+
+# Write-behind likes: count them in memory and apply the deltas in batches.
+# Likes not yet flushed are lost if the process dies, so this is opt-in.
+LIKE_BUFFER_ENABLED = os.getenv("LIKE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", 2.0))
+# Flush early once this many likes are pending
+LIKE_FLUSH_THRESHOLD = int(os.getenv("LIKE_FLUSH_THRESHOLD", 500))
+
+_highlights = WorkoutHighlight.__table__
+
+ADD_LIKES = _highlights.update().where(_highlights.c.id == bindparam("b_id")).values(
+    likes=func.coalesce(_highlights.c.likes, 0) + bindparam("b_delta")
+)
+
+class LikeBuffer:
+    """Per-process like deltas, flushed as one batched UPDATE plus one ledger INSERT"""
+
+    def __init__(self, session_factory, flush_threshold: int = LIKE_FLUSH_THRESHOLD):
+        self.session_factory = session_factory
+        self.flush_threshold = flush_threshold
+        self._likes: Dict[int, int] = defaultdict(int)
+        self._creators: Dict[int, int] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def add(self, highlight_id: int, creator_id: int) -> bool:
+        """Record a like. Returns True when the buffer should be flushed now."""
+        with self._lock:
+            self._likes[highlight_id] += 1
+            self._creators[highlight_id] = creator_id
+            self._pending += 1
+            return self._pending >= self.flush_threshold
+
+    def pending_likes(self, highlight_id: int) -> int:
+        with self._lock:
+            return self._likes.get(highlight_id, 0)
+
+    def _merge(self, likes: Dict[int, int], creators: Dict[int, int]):
+        with self._lock:
+            for highlight_id, delta in likes.items():
+                self._likes[highlight_id] += delta
+                self._pending += delta
+            self._creators.update(creators)
+
+    def flush(self) -> int:
+        """Apply pending deltas in one transaction. Returns the number of likes written."""
+        with self._lock:
+            likes, self._likes = self._likes, defaultdict(int)
+            creators, self._creators = self._creators, {}
+            self._pending = 0
+        if not likes:
+            return 0
+
+        db = self.session_factory()
+        try:
+            # Sorted so concurrent flushers from other workers lock rows in the same order
+            db.execute(ADD_LIKES, [{"b_id": k, "b_delta": v} for k, v in sorted(likes.items())])
+            award_many(db, [{
+                "user_id": creators[highlight_id],
+                "points": delta * LIKE_POINTS,
+                "source": "like",
+                "source_id": highlight_id
+            } for highlight_id, delta in likes.items()])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Keep the deltas for the next attempt rather than dropping likes
+            self._merge(likes, creators)
+            logger.error(f"❌ Error flushing {sum(likes.values())} buffered likes: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+        total = sum(likes.values())
+        logger.info(f"❤️ Flushed {total} likes across {len(likes)} highlights")
+        return total
+
+    async def run(self, interval: float = LIKE_FLUSH_INTERVAL):
+        """Flush on a timer until cancelled, then flush whatever is left"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.flush)
+        finally:
+            self.flush()
+
+like_buffer: Optional[LikeBuffer] = LikeBuffer(SessionLocal) if LIKE_BUFFER_ENABLED else None
@@ -1,26 +1,46 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Depends, Request, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from datetime import datetime, time, timedelta
-from pydantic import BaseModel
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import BaseModel, validator
 from typing import Optional, List
+import asyncio
 import json
 import os
 import logging
 import sys
+from time import perf_counter
 from dotenv import load_dotenv
-from gamification import GamificationManager
-
-from models import Base, User, Workout, ExerciseLog, PersonalRecord, Streak, Achievement, Challenge, ChallengeParticipant
-from workout_generator import WorkoutGenerator
+from gamification import GamificationManager, status_cache, streak_expiry, user_zone
+from stats import StatsManager
+from social import SocialManager
+from like_buffer import like_buffer
+from points import points_rollup, unrolled_points
+from leaderboard import leaderboards
+from standings import challenge_standings
+from challenge_scheduler import challenge_scheduler
+from maintenance import maintenance
+from friends import FriendGraph
+from pagination import page_size
+from workout_completion import CompletionManager
+
+from models import Base, User, Workout, PersonalRecord, Streak, Achievement, Challenge, ChallengeParticipant
+from workout_generator import WorkoutGenerator, DEFAULT_MOTIVATION
 from voice_generator import VoiceGenerator
 from spotify_player import SpotifyPlayer
-from database import engine, SessionLocal
+from database import engine, engines, SessionLocal
+from read_routing import get_read_db
 from workout_enhancer import WorkoutEnhancer
+import metrics
+from assets import AssetManifest, FingerprintedStaticFiles, PageCache
+from query_counter import QueryCounter, query_budget
+from rate_limiter import AdmissionController
+import query_counter
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +53,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Most recent personal records returned by the progress endpoint
+PERSONAL_RECORD_LIMIT = 20
+
+# Dev mode (always on under pytest): count queries per request, report them in X-Query-Count
+# and fail requests that run more queries than their route's @query_budget
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "").lower() in ("1", "true", "yes") or "pytest" in sys.modules
+# Set to false to only log budget overruns instead of failing the request
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "true").lower() in ("1", "true", "yes")
+
+# Per-user and global limits on LLM/TTS work, shared by every worker on the host
+admission = AdmissionController()
+
 # Global components
 workout_generator = None
 voice_generator = None
@@ -43,6 +75,13 @@ workout_enhancer = None
 async def lifespan(app: FastAPI):
     """Lifecycle manager for FastAPI application"""
     # Startup
+    loop_monitor = None
+    like_flusher = None
+    points_folder = None
+    leaderboard_follower = None
+    standings_follower = None
+    scheduler = None
+    maintenance_task = None
     try:
         logger.info("🚀 Starting up application...")
 
@@ -69,12 +108,41 @@ async def lifespan(app: FastAPI):
             logger.error(f"❌ Error creating database tables: {str(e)}")
             raise
 
+        loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+        points_folder = asyncio.create_task(points_rollup.run())
+        leaderboard_follower = asyncio.create_task(leaderboards.run())
+        standings_follower = asyncio.create_task(challenge_standings.run())
+        scheduler = asyncio.create_task(challenge_scheduler.run())
+        maintenance_task = asyncio.create_task(maintenance.run())
+        if like_buffer is not None:
+            like_flusher = asyncio.create_task(like_buffer.run())
+            logger.info("✅ Write-behind like buffer enabled")
+
         yield
     except Exception as e:
         logger.error(f"❌ Startup error: {str(e)}")
         raise
     finally:
         # Cleanup
+        if loop_monitor:
+            loop_monitor.cancel()
+        if like_flusher:
+            # Cancelling runs the final flush of likes still in memory
+            like_flusher.cancel()
+            await asyncio.gather(like_flusher, return_exceptions=True)
+        if points_folder:
+            points_folder.cancel()
+            await asyncio.gather(points_folder, return_exceptions=True)
+        if leaderboard_follower:
+            # Cancelling writes the final snapshot
+            leaderboard_follower.cancel()
+            await asyncio.gather(leaderboard_follower, return_exceptions=True)
+        if standings_follower:
+            standings_follower.cancel()
+        if scheduler:
+            scheduler.cancel()
+        if maintenance_task:
+            maintenance_task.cancel()
         logger.info("👋 Shutting down application...")
 
 # Initialize FastAPI with lifespan
@@ -89,10 +157,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Time every statement on the shared engines
+for bound_engine in engines:
+    metrics.instrument_engine(bound_engine)
+
+# Route templates by endpoint, so metrics are labelled "/users/{user_id}/workout" rather than per id
+route_paths = {}
+
+def route_label(request: Request) -> str:
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if not route_paths:
+        for route in app.routes:
+            route_paths[getattr(route, "endpoint", getattr(route, "app", None))] = route.path
+    return route_paths.get(endpoint, "unmatched")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.observe_request(request.method, route_label(request), status, perf_counter() - start)
+
+if QUERY_DEBUG:
+    for bound_engine in engines:
+        query_counter.instrument_engine(bound_engine)
+
+    @app.middleware("http")
+    async def count_request_queries(request: Request, call_next):
+        counter = QueryCounter(label=f"{request.method} {request.url.path}", strict=QUERY_BUDGET_STRICT)
+        with counter:
+            response = await call_next(request)
+            counter.max_queries = getattr(request.scope.get("endpoint"), "query_budget", None)
+        response.headers["X-Query-Count"] = str(counter.count)
+        return response
+
 # Mount static files and templates
 try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    asset_manifest = AssetManifest("static")
+    app.mount("/static", FingerprintedStaticFiles(directory="static", manifest=asset_manifest), name="static")
     templates = Jinja2Templates(directory="templates")
+    templates.env.globals["static_url"] = asset_manifest.url
+    page_cache = PageCache(templates)
     logger.info("✅ Static files and templates mounted successfully")
 except Exception as e:
     logger.error(f"❌ Error mounting static files: {str(e)}")
@@ -106,6 +217,13 @@ def get_db():
     finally:
         db.close()
 
+def validate_timezone(value: str) -> str:
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone {value!r}; use an IANA name such as 'Europe/Berlin'")
+    return value
+
 # Pydantic model for user creation
 class UserCreate(BaseModel):
     name: str
@@ -113,6 +231,22 @@ class UserCreate(BaseModel):
     fitness_level: str
     preferred_time: str
     goals: str
+    timezone: str = "UTC"
+
+    _timezone = validator("timezone", allow_reuse=True)(validate_timezone)
+
+class TimezoneUpdate(BaseModel):
+    timezone: str
+
+    _timezone = validator("timezone", allow_reuse=True)(validate_timezone)
+
+class GymUpdate(BaseModel):
+    preferred_gym: Optional[str] = None
+
+    @validator("preferred_gym")
+    def strip_gym(cls, v):
+        # An empty name clears the gym
+        return (v or "").strip() or None
 
 # Pydantic models for workout completion and progress tracking
 class ExerciseLogCreate(BaseModel):
@@ -125,7 +259,17 @@ class ExerciseLogCreate(BaseModel):
 class WorkoutComplete(BaseModel):
     difficulty_rating: Optional[int] = None
     notes: Optional[str] = None
-    exercise_logs: List[ExerciseLogCreate]
+    exercise_logs: List[ExerciseLogCreate] = []
+
+class WorkoutSyncItem(BaseModel):
+    workout_id: int
+    completed_at: datetime
+    difficulty_rating: Optional[int] = None
+    notes: Optional[str] = None
+    exercise_logs: List[ExerciseLogCreate] = []
+
+class WorkoutSync(BaseModel):
+    completions: List[WorkoutSyncItem]
 
 class ChallengeResponse(BaseModel):
     id: int
@@ -179,21 +323,39 @@ async def health_check():
             }
         )
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, db: Session = Depends(get_db)):
+async def read_root(request: Request):
     try:
-        return templates.TemplateResponse(
+        # The page only varies by these flags, so each variant is rendered and compressed once
+        return page_cache.response(
+            request,
             "index.html",
-            {
-                "request": request,
-                "spotify_enabled": workout_enhancer.spotify_available if workout_enhancer else False,
-                "voice_enabled": voice_generator.elevenlabs_available if voice_generator else False
-            }
+            spotify_enabled=workout_enhancer.spotify_available if workout_enhancer else False,
+            voice_enabled=voice_generator.elevenlabs_available if voice_generator else False
         )
     except Exception as e:
         logger.error(f"❌ Error rendering index page: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def get_pending_workout_plan(db: Session, user_id: int) -> Optional[dict]:
+    """The user's most recent uncompleted plan, served when generation is throttled"""
+    workout = db.query(Workout).filter(
+        Workout.user_id == user_id,
+        Workout.completed.isnot(True)
+    ).order_by(Workout.created_at.desc()).first()
+    if not workout:
+        return None
+
+    exercises = workout.exercises
+    if isinstance(exercises, str):
+        exercises = json.loads(exercises)
+    return {"id": workout.id, "exercises": exercises, "motivation": DEFAULT_MOTIVATION}
+
 @app.get("/users/{user_id}/workout")
 async def get_workout(user_id: int, db: Session = Depends(get_db)):
     try:
@@ -209,12 +371,25 @@ async def get_workout(user_id: int, db: Session = Depends(get_db)):
             db.add(user)
             db.commit()
 
-        # Generate a new workout plan
-        workout_plan = workout_generator.generate_workout_plan({
-            "name": user.name,
-            "fitness_level": user.fitness_level,
-            "goals": user.goals
-        })
+        # Over the rate limit or with every upstream slot busy, fall back to
+        # the user's pending plan, then to the template tier, instead of queuing
+        degraded = None if admission.admit("llm", user_id) else "rate_limited"
+        with admission.upstream_slot("llm", enabled=degraded is None) as slot:
+            if degraded is None and not slot:
+                degraded = "busy"
+            if degraded:
+                pending_plan = get_pending_workout_plan(db, user_id)
+                if pending_plan:
+                    pending_plan["degraded"] = degraded
+                    return pending_plan
+
+            workout_plan = workout_generator.generate_workout_plan({
+                "name": user.name,
+                "fitness_level": user.fitness_level,
+                "goals": user.goals
+            }, use_ai=degraded is None)
+        if degraded:
+            workout_plan["degraded"] = degraded
 
         # Create a new workout record
         workout = Workout(
@@ -224,6 +399,7 @@ async def get_workout(user_id: int, db: Session = Depends(get_db)):
             workout_intensity="regular"
         )
         db.add(workout)
+        StatsManager(db).record_workout_created(user_id)
         db.commit()
         db.refresh(workout)
 
@@ -233,7 +409,11 @@ async def get_workout(user_id: int, db: Session = Depends(get_db)):
         # Enhance the workout with music and voice features
         if workout_enhancer:
             workout_enhancer.db = db  # Set the database session
-            enhanced_plan = await workout_enhancer.enhance_workout(workout_plan, user_id)
+            tts_admitted = admission.admit("tts", user_id)
+            with admission.upstream_slot("tts", enabled=tts_admitted) as slot:
+                enhanced_plan = await workout_enhancer.enhance_workout(
+                    workout_plan, user_id, include_audio=tts_admitted and slot
+                )
             return enhanced_plan
         
         return workout_plan
@@ -243,9 +423,11 @@ async def get_workout(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/workouts/{workout_id}/complete")
+@query_budget(14)
 async def complete_workout(
     workout_id: int,
     workout_data: WorkoutComplete,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     try:
@@ -253,51 +435,49 @@ async def complete_workout(
         if not workout:
             raise HTTPException(status_code=404, detail="Workout not found")
 
-        # Update workout completion
-        workout.completed = True
-        workout.completion_date = datetime.utcnow()
-        workout.difficulty_rating = workout_data.difficulty_rating
-        workout.notes = workout_data.notes
-
-        # Get the original exercises
-        exercises = workout.exercises
-
-        # Initialize gamification manager
-        gamification = GamificationManager(db)
-
-        # Log exercises and check for PRs
-        for exercise in exercises:
-            exercise_log = ExerciseLog(
-                workout_id=workout_id,
-                exercise_name=exercise["name"],
-                sets_completed=exercise["sets"],
-                reps_completed=exercise["reps"] if isinstance(exercise["reps"], int) else None,
-                completed=True
-            )
-            db.add(exercise_log)
+        completion = CompletionManager(db)
+        result = await completion.complete_workout(
+            workout,
+            difficulty_rating=workout_data.difficulty_rating,
+            notes=workout_data.notes,
+            exercise_logs=[log.dict() for log in workout_data.exercise_logs],
+            idempotency_key=idempotency_key
+        )
 
-        # Update streak and get new achievements
-        user = db.query(User).get(workout.user_id)
-        streak_info = await gamification.update_streak(user)
-        new_achievements = await gamification.check_and_award_achievements(user)
+        if "error" in result:
+            raise HTTPException(status_code=409, detail=result["error"])
 
-        # Award base points for completing workout
-        base_points = 100  # Base points for workout completion
-        bonus_points = int(base_points * streak_info["multiplier"])  # Apply streak multiplier
-        user.total_points += bonus_points
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error completing workout {workout_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        db.commit()
+@app.post("/users/{user_id}/workouts/sync")
+@query_budget(15)
+async def sync_workouts(
+    user_id: int,
+    sync_data: WorkoutSync,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Apply workouts completed offline in a single batch"""
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-        return {
-            "message": "Workout completed successfully!",
-            "points_earned": bonus_points,
-            "new_achievements": new_achievements,
-            "streak_info": streak_info
-        }
+        completion = CompletionManager(db)
+        return await completion.sync_completions(
+            user,
+            [item.dict() for item in sync_data.completions],
+            idempotency_key=idempotency_key
+        )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Error completing workout {workout_id}: {str(e)}")
+        logger.error(f"❌ Error syncing workouts for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/users/")
@@ -312,18 +492,26 @@ async def create_user(
             phone=user.phone,
             fitness_level=user.fitness_level,
             preferred_time=user.preferred_time,
-            goals=user.goals
+            goals=user.goals,
+            timezone=user.timezone
         )
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
 
-        # Generate initial workout plan
-        workout_plan = workout_generator.generate_workout_plan({
-            "name": user.name,
-            "fitness_level": user.fitness_level,
-            "goals": user.goals
-        })
+        # Generate initial workout plan; a new user has no pending plan, so
+        # over the limit or with every upstream slot busy use the template tier
+        degraded = None if admission.admit("llm", db_user.id) else "rate_limited"
+        with admission.upstream_slot("llm", enabled=degraded is None) as slot:
+            if degraded is None and not slot:
+                degraded = "busy"
+            workout_plan = workout_generator.generate_workout_plan({
+                "name": user.name,
+                "fitness_level": user.fitness_level,
+                "goals": user.goals
+            }, use_ai=degraded is None)
+        if degraded:
+            workout_plan["degraded"] = degraded
 
         # Create workout entry
         db_workout = Workout(
@@ -331,10 +519,15 @@ async def create_user(
             exercises=json.dumps(workout_plan["exercises"])
         )
         db.add(db_workout)
+        StatsManager(db).record_workout_created(db_user.id)
         db.commit()
 
         # Generate audio file for the workout
-        audio_path = voice_generator.generate_workout_audio(db_user.id, workout_plan)
+        audio_path = None
+        tts_admitted = admission.admit("tts", db_user.id)
+        with admission.upstream_slot("tts", enabled=tts_admitted) as slot:
+            if tts_admitted and slot:
+                audio_path = await asyncio.to_thread(voice_generator.generate_workout_audio, db_user.id, workout_plan)
 
         return {
             "message": "User created successfully",
@@ -347,90 +540,138 @@ async def create_user(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/users/{user_id}/workout/complete")
-async def complete_workout(user_id: int, feedback: str = None, db: Session = Depends(get_db)):
+async def complete_latest_workout(user_id: int, feedback: str = None, db: Session = Depends(get_db)):
+    """Complete the user's most recent open workout, with the feedback kept as its notes"""
     try:
         workout = db.query(Workout).filter(
-            Workout.user_id == user_id
-        ).order_by(Workout.date.desc()).first()
+            Workout.user_id == user_id,
+            Workout.completed.isnot(True)
+        ).order_by(Workout.created_at.desc(), Workout.id.desc()).first()
 
         if not workout:
             raise HTTPException(status_code=404, detail="No workout found")
 
-        workout.completed = "completed"
-        workout.feedback = feedback
-        db.commit()
+        # Same unit of work as /workouts/{id}/complete, so stats, streaks and points stay in step
+        result = await CompletionManager(db).complete_workout(
+            workout, difficulty_rating=None, notes=feedback, exercise_logs=[]
+        )
+        if "error" in result:
+            raise HTTPException(status_code=409, detail=result["error"])
 
-        return {"message": "Workout marked as completed"}
+        return {"message": "Workout marked as completed", **result}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"❌ Error completing workout for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/users/{user_id}/gamification")
-async def get_user_gamification(user_id: int, db: Session = Depends(get_db)):
-    """Get user's gamification status including level, achievements, and challenges"""
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        # Get streak info
-        streak = db.query(Streak).filter(Streak.user_id == user_id).first()
-        streak_info = {
-            "current_streak": streak.current_streak if streak else 0,
-            "longest_streak": streak.longest_streak if streak else 0,
-            "streak_multiplier": streak.streak_multiplier if streak else 1.0
+@app.put("/users/{user_id}/timezone")
+async def update_timezone(user_id: int, update: TimezoneUpdate, db: Session = Depends(get_db)):
+    """Change the timezone whose midnights bound the user's streak days"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user.timezone = update.timezone
+    streak = db.query(Streak).filter(Streak.user_id == user_id).first()
+    if streak and streak.last_workout_date:
+        streak.expires_at = streak_expiry(streak.last_workout_date, user_zone(user))
+    db.commit()
+    status_cache.delete(str(user_id))
+    return {"user_id": user_id, "timezone": user.timezone}
+
+@app.put("/users/{user_id}/gym")
+async def update_gym(user_id: int, update: GymUpdate, db: Session = Depends(get_db)):
+    """Change the user's home gym, moving them to that gym's leaderboard"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if user.preferred_gym != update.preferred_gym:
+        user.preferred_gym = update.preferred_gym
+        db.commit()
+        leaderboards.change_gym(user_id, user.preferred_gym)
+    return {"user_id": user_id, "preferred_gym": user.preferred_gym}
+
+def build_gamification_status(db: Session, user_id: int) -> dict:
+    """Gamification status as served by the endpoint (JSON-ready, so it can be cached)"""
+    row = db.query(User, unrolled_points(user_id)).filter(User.id == user_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    user, pending_points = row
+
+    # Get streak info
+    streak = db.query(Streak).filter(Streak.user_id == user_id).first()
+    streak_info = {
+        "current_streak": streak.current_streak if streak else 0,
+        "longest_streak": streak.longest_streak if streak else 0,
+        "streak_multiplier": streak.streak_multiplier if streak else 1.0
+    }
+
+    # Get achievements
+    achievements = db.query(Achievement).filter(
+        Achievement.user_id == user_id
+    ).order_by(Achievement.unlocked_at.desc()).all()
+
+    # Get active challenges
+    now = datetime.utcnow()
+    active_challenges = db.query(Challenge).filter(
+        Challenge.end_date > now
+    ).all()
+
+    # Get user's progress in active challenges
+    participants = {}
+    if active_challenges:
+        participants = {
+            p.challenge_id: p for p in db.query(ChallengeParticipant).filter(
+                ChallengeParticipant.challenge_id.in_([c.id for c in active_challenges]),
+                ChallengeParticipant.user_id == user_id
+            )
         }
 
-        # Get achievements
-        achievements = db.query(Achievement).filter(
-            Achievement.user_id == user_id
-        ).order_by(Achievement.unlocked_at.desc()).all()
-
-        # Get active challenges
-        now = datetime.utcnow()
-        active_challenges = db.query(Challenge).filter(
-            Challenge.end_date > now
-        ).all()
-
-        # Get user's progress in active challenges
-        challenge_responses = []
-        for challenge in active_challenges:
-            participant = db.query(ChallengeParticipant).filter(
-                ChallengeParticipant.challenge_id == challenge.id,
-                ChallengeParticipant.user_id == user_id
-            ).first()
-
-            challenge_responses.append({
-                "id": challenge.id,
-                "name": challenge.name,
-                "description": challenge.description,
-                "target_value": challenge.target_value,
-                "current_value": participant.current_value if participant else 0,
-                "reward_points": challenge.reward_points,
-                "completed": participant.completed if participant else False,
-                "end_date": challenge.end_date
-            })
+    challenge_responses = []
+    for challenge in active_challenges:
+        participant = participants.get(challenge.id)
+
+        challenge_responses.append({
+            "id": challenge.id,
+            "name": challenge.name,
+            "description": challenge.description,
+            "target_value": challenge.target_value,
+            "current_value": participant.current_value if participant else 0,
+            "reward_points": challenge.reward_points,
+            "completed": participant.completed if participant else False,
+            "end_date": challenge.end_date
+        })
 
-        return {
-            "level": user.level,
-            "title": user.title,
-            "total_points": user.total_points,
-            "experience_points": user.experience_points,
-            **streak_info,
-            "achievements": [
-                {
-                    "name": a.name,
-                    "description": a.description,
-                    "badge_url": a.badge_url,
-                    "meme_url": a.meme_url,
-                    "unlocked_at": a.unlocked_at
-                }
-                for a in achievements
-            ],
-            "active_challenges": challenge_responses
-        }
+    return jsonable_encoder({
+        "level": user.level,
+        "title": user.title,
+        "total_points": (user.total_points or 0) + pending_points,
+        "experience_points": user.experience_points,
+        **streak_info,
+        "achievements": [
+            {
+                "name": a.name,
+                "description": a.description,
+                "badge_url": a.badge_url,
+                "meme_url": a.meme_url,
+                "unlocked_at": a.unlocked_at
+            }
+            for a in achievements
+        ],
+        "active_challenges": challenge_responses
+    })
+
+@app.get("/users/{user_id}/gamification")
+@query_budget(5)
+async def get_user_gamification(user_id: int, db: Session = Depends(get_read_db)):
+    """Get user's gamification status including level, achievements, and challenges"""
+    try:
+        return await status_cache.aget_or_set(
+            str(user_id),
+            lambda: build_gamification_status(db, user_id)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -485,24 +726,169 @@ async def update_challenge_progress(
         logger.error(f"❌ Error updating progress in challenge {challenge_id} for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/highlights/{highlight_id}/like")
+async def like_highlight(highlight_id: int, user_id: int, db: Session = Depends(get_db)):
+    """Like a workout highlight"""
+    try:
+        result = await SocialManager(db).like_highlight(highlight_id, user_id)
+        if "error" in result:
+            raise HTTPException(status_code=404, detail=result["error"])
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error liking highlight {highlight_id} for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Neighbours returned either side of a user's own rank
+MAX_RANK_RADIUS = 10
+
+def attach_user_names(db: Session, *entry_lists: List[dict]):
+    """Add name, level and title to leaderboard entries with one query"""
+    user_ids = {entry["user_id"] for entries in entry_lists for entry in entries}
+    users = {
+        row.id: row for row in db.query(User.id, User.name, User.level, User.title).filter(User.id.in_(user_ids))
+    } if user_ids else {}
+    for entries in entry_lists:
+        for entry in entries:
+            user = users.get(entry["user_id"])
+            if user:
+                entry.update(name=user.name, level=user.level, title=user.title)
+
+def require_leaderboards():
+    if not leaderboards.loaded:
+        raise HTTPException(status_code=503, detail="Leaderboards are still loading")
+
+@app.get("/challenges/{challenge_id}/standings")
+async def get_challenge_standings(challenge_id: int, limit: int = 10, db: Session = Depends(get_read_db)):
+    """Leading participants of a challenge; final once it has ended"""
+    challenge = db.query(Challenge).get(challenge_id)
+    if not challenge:
+        raise HTTPException(status_code=404, detail="Challenge not found")
+    entries = challenge_standings.top(db, challenge, page_size(limit))
+    attach_user_names(db, entries)
+    return {
+        "challenge_id": challenge.id,
+        "target_value": challenge.target_value,
+        "final": bool(challenge.end_date and challenge.end_date <= datetime.utcnow()),
+        "entries": entries
+    }
+
+@app.get("/challenges/{challenge_id}/standings/{user_id}")
+async def get_challenge_position(
+    challenge_id: int,
+    user_id: int,
+    radius: int = 2,
+    db: Session = Depends(get_read_db)
+):
+    """A participant's place in a challenge with their nearest rivals"""
+    challenge = db.query(Challenge).get(challenge_id)
+    if not challenge:
+        raise HTTPException(status_code=404, detail="Challenge not found")
+    result = challenge_standings.position(db, challenge, user_id, max(0, min(radius, MAX_RANK_RADIUS)))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not participating in this challenge")
+    attach_user_names(db, result["neighbours"])
+    return {"challenge_id": challenge.id, **result}
+
+@app.get("/users/{user_id}/feed")
+async def get_friend_feed(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    db: Session = Depends(get_read_db)
+):
+    """Friends' highlights, newest first; pass `next_cursor` back as `cursor` for the next page"""
+    try:
+        result = await SocialManager(db).get_friend_feed(user_id, cursor, limit)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error getting friend feed for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/gyms/{gym_location}/feed")
+async def get_gym_feed(
+    gym_location: str,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    db: Session = Depends(get_read_db)
+):
+    """Recent gym-spotted activity at a gym, newest first"""
+    try:
+        result = await SocialManager(db).get_gym_feed(gym_location, cursor, limit)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error getting gym feed for {gym_location}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/leaderboard")
+async def get_leaderboard(limit: int = 10, db: Session = Depends(get_read_db)):
+    """Top users by points across the whole app"""
+    require_leaderboards()
+    entries = leaderboards.top(page_size(limit))
+    attach_user_names(db, entries)
+    return {"entries": entries, "total": len(leaderboards.board)}
+
+@app.get("/gyms/{gym_location}/leaderboard")
+async def get_gym_leaderboard(gym_location: str, limit: int = 10, db: Session = Depends(get_read_db)):
+    """Top users by points among those whose preferred gym is `gym_location`"""
+    require_leaderboards()
+    entries = leaderboards.top(page_size(limit), gym=gym_location)
+    attach_user_names(db, entries)
+    return {"entries": entries}
+
+@app.get("/users/{user_id}/rank")
+async def get_user_rank(
+    user_id: int,
+    scope: str = "global",
+    radius: int = 2,
+    limit: int = 10,
+    db: Session = Depends(get_read_db)
+):
+    """The user's rank and nearest rivals: scope is global, gym (their preferred gym) or friends"""
+    require_leaderboards()
+    radius = max(0, min(radius, MAX_RANK_RADIUS))
+    if scope == "friends":
+        result = leaderboards.circle(user_id, FriendGraph(db).friend_ids(user_id), page_size(limit), radius)
+        attach_user_names(db, result["top"], result["neighbours"])
+        return {"scope": scope, **result}
+    if scope not in ("global", "gym"):
+        raise HTTPException(status_code=400, detail="scope must be global, gym or friends")
+
+    gym = None
+    if scope == "gym":
+        gym = leaderboards.gym_of(user_id)
+        if not gym:
+            raise HTTPException(status_code=404, detail="User has no preferred gym")
+    result = leaderboards.around(user_id, radius, gym=gym)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User is not ranked yet")
+    attach_user_names(db, result["neighbours"])
+    return {"scope": scope, "gym": gym, **result}
+
 @app.get("/users/{user_id}/progress")
-async def get_user_progress(user_id: int, db: Session = Depends(get_db)):
+@query_budget(4)
+async def get_user_progress(user_id: int, db: Session = Depends(get_read_db)):
     try:
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Get workout completion stats
-        total_workouts = db.query(Workout).filter(Workout.user_id == user_id).count()
-        completed_workouts = db.query(Workout).filter(
-            Workout.user_id == user_id,
-            Workout.completed == True
-        ).count()
+        stats = StatsManager(db).get_stats(user_id)
 
         # Get personal records
         personal_records = db.query(PersonalRecord).filter(
             PersonalRecord.user_id == user_id
-        ).order_by(PersonalRecord.achieved_at.desc()).all()
+        ).order_by(PersonalRecord.achieved_at.desc()).limit(PERSONAL_RECORD_LIMIT).all()
 
         # Get recent workouts
         recent_workouts = db.query(Workout).filter(
@@ -511,9 +897,10 @@ async def get_user_progress(user_id: int, db: Session = Depends(get_db)):
 
         return {
             "stats": {
-                "total_workouts": total_workouts,
-                "completed_workouts": completed_workouts,
-                "completion_rate": (completed_workouts / total_workouts * 100) if total_workouts > 0 else 0
+                "total_workouts": stats["total_workouts"],
+                "completed_workouts": stats["completed_workouts"],
+                "completion_rate": stats["completion_rate"],
+                "last_completion_date": stats["last_completion_date"]
             },
             "personal_records": [
                 {
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+from database import SessionLocal, engine, refresh_sqlite_statistics
+from gamification import GamificationManager, status_cache
+from idempotency import purge_expired_keys
+
+logger = logging.getLogger(__name__)
+
+# How often the maintenance pass runs (seconds). Users' midnights fall at
+# different UTC hours, so streaks are expired hourly rather than once a night.
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", 3600.0))
+
+class Maintenance:
+    """Periodic housekeeping: resets streaks whose grace day has passed, so
+    reads can trust the stored values, deletes expired idempotency keys
+    and refreshes SQLite's planner statistics.
+
+    A streak's expiry is worked out in the user's timezone whenever a
+    workout extends it; this job only compares that instant with the
+    clock. Running it on several workers is harmless: a second pass finds
+    nothing left to reset.
+    """
+
+    def __init__(self, session_factory, bind=engine):
+        self.session_factory = session_factory
+        self.bind = bind
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        db = self.session_factory()
+        try:
+            user_ids = GamificationManager(db).expire_streaks(now or datetime.utcnow())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for user_id in user_ids:
+            status_cache.delete(str(user_id))
+        if user_ids:
+            logger.info(f"💔 Reset {len(user_ids)} expired streaks")
+        return len(user_ids)
+
+    def purge_idempotency_keys(self, now: Optional[datetime] = None) -> int:
+        db = self.session_factory()
+        try:
+            deleted = purge_expired_keys(db, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if deleted:
+            logger.info(f"🧹 Deleted {deleted} expired idempotency keys")
+        return deleted
+
+    def analyze(self):
+        """Keep sqlite_stat1 current for the query planner and the health check's row estimates"""
+        if refresh_sqlite_statistics(self.bind):
+            logger.info("📊 Refreshed SQLite planner statistics")
+
+    async def run(self, interval: float = MAINTENANCE_INTERVAL):
+        """Run every task until cancelled, starting straight away to catch up after downtime"""
+        while True:
+            for task, description in (
+                (self.expire, "expiring streaks"),
+                (self.purge_idempotency_keys, "purging idempotency keys"),
+                (self.analyze, "analyzing the database")
+            ):
+                try:
+                    await asyncio.to_thread(task)
+                except Exception as e:
+                    logger.error(f"❌ Error {description}: {str(e)}")
+            await asyncio.sleep(interval)
+
+maintenance = Maintenance(SessionLocal)
@@ -2,12 +2,16 @@
 import argparse
 import json
 from datetime import datetime
-from database_utils import DatabaseManager
+from database_utils import DatabaseManager, describe_table_stats, format_bytes
 
 def main():
     parser = argparse.ArgumentParser(description='AI Personal Trainer Database Management CLI')
-    parser.add_argument('action', choices=['backup', 'restore', 'healthcheck', 'load_sample_data', 'migrate', 'schema'])
-    parser.add_argument('--backup-file', help='Backup file to restore from')
+    parser.add_argument('action', choices=['backup', 'restore', 'verify_backup', 'healthcheck', 'load_sample_data', 'migrate', 'schema', 'rebuild_stats', 'rebuild_feeds', 'rebuild_points', 'rebuild_personal_bests', 'purge_idempotency_keys'])
+    parser.add_argument('--backup-file', help='Backup file (or directory) to restore from or verify')
+    parser.add_argument('--exact', action='store_true', help='healthcheck: count every row instead of using planner estimates')
+    parser.add_argument('--user-id', type=int, help='Limit the rebuild_* actions to a single user')
+    parser.add_argument('--force', action='store_true', help='restore: overwrite an existing SQLite database (stop the app first)')
+    parser.add_argument('--unverified', action='store_true', help='restore: accept a backup without a checksum manifest')
     args = parser.parse_args()
 
     db_manager = DatabaseManager()
@@ -20,22 +24,34 @@ def main():
         if not args.backup_file:
             print("❌ Error: --backup-file is required for restore")
             return
-        success = db_manager.restore_backup(args.backup_file)
+        success = db_manager.restore_backup(args.backup_file, force=args.force, unverified=args.unverified)
         if success:
             print("✅ Database restored successfully!")
         else:
             print("❌ Error restoring database")
 
+    elif args.action == 'verify_backup':
+        if not args.backup_file:
+            print("❌ Error: --backup-file is required for verify_backup")
+            return
+        if db_manager.verify_backup(args.backup_file):
+            print(f"✅ Backup checksums match: {args.backup_file}")
+        else:
+            print("❌ Backup failed verification")
+
     elif args.action == 'healthcheck':
-        health = db_manager.health_check()
+        health = db_manager.health_check(exact=args.exact)
         print("\n🏥 Database Health Report")
         print("=" * 50)
         print(f"Status: {health['status']}")
         if health['status'] == 'healthy':
             print(f"Database Type: {health['database_type']}")
+            print(f"Database Size: {format_bytes(health['database_bytes'])}")
             print("\n📊 Table Statistics:")
-            for table, count in health['table_stats'].items():
-                print(f"  {table}: {count} records")
+            for table, stats in health['table_stats'].items():
+                print(f"  {describe_table_stats(table, stats)}")
+            if any(stats['estimated'] for stats in health['table_stats'].values()):
+                print("  (~ estimated from planner statistics, refreshed by the app's maintenance job; use --exact to count)")
             if health['missing_tables']:
                 print("\n⚠️  Missing Tables:")
                 for table in health['missing_tables']:
@@ -62,5 +78,25 @@ def main():
             for column in columns:
                 print(f"  - {column}")
 
+    elif args.action == 'rebuild_stats':
+        rows = db_manager.rebuild_user_stats(args.user_id)
+        print(f"✅ Rebuilt progress stats for {rows} user(s)")
+
+    elif args.action == 'rebuild_feeds':
+        rows = db_manager.rebuild_feeds(args.user_id)
+        print(f"✅ Rebuilt friend feeds with {rows} item(s)")
+
+    elif args.action == 'rebuild_points':
+        rows = db_manager.rebuild_points(args.user_id)
+        print(f"✅ Rebuilt point totals for {rows} user(s) from the ledger")
+
+    elif args.action == 'rebuild_personal_bests':
+        rows = db_manager.rebuild_personal_bests(args.user_id)
+        print(f"✅ Rebuilt {rows} personal best(s) from exercise history")
+
+    elif args.action == 'purge_idempotency_keys':
+        rows = db_manager.purge_idempotency_keys()
+        print(f"✅ Deleted {rows} expired idempotency key(s)")
+
 if __name__ == "__main__":
     main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -11,6 +11,7 @@ class User(Base):
     phone = Column(String)
     fitness_level = Column(String)
     preferred_time = Column(String)
+    timezone = Column(String, default="UTC")  # IANA name, e.g. 'Europe/Berlin'; bounds streak days
     goals = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -19,8 +20,9 @@ class User(Base):
     achievements = relationship("Achievement", back_populates="user")
     streaks = relationship("Streak", back_populates="user")
     challenge_participations = relationship("ChallengeParticipant", back_populates="user")
+    stats = relationship("UserStats", back_populates="user", uselist=False)
     
-    total_points = Column(Integer, default=0)
+    total_points = Column(Integer, default=0)  # Rollup of points_ledger; see points.py
     level = Column(Integer, default=1)
     experience_points = Column(Integer, default=0)
     title = Column(String, default="Rookie Lifter")  # Dynamic titles based on achievements
@@ -37,6 +39,9 @@ class User(Base):
 
 class Workout(Base):
     __tablename__ = "workouts"
+    __table_args__ = (
+        Index("ix_workouts_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -54,8 +59,30 @@ class Workout(Base):
     soundtrack_id = Column(String, nullable=True)  # Spotify playlist ID
     workout_intensity = Column(String, nullable=True)  # 'beast_mode', 'regular', 'recovery'
 
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_workouts = Column(Integer, default=0, nullable=False)
+    completed_workouts = Column(Integer, default=0, nullable=False)
+    last_completion_date = Column(DateTime, nullable=True)
+    friend_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = relationship("User", back_populates="stats")
+
+    @property
+    def completion_rate(self) -> float:
+        """Percentage of created workouts that were completed"""
+        if not self.total_workouts:
+            return 0
+        return self.completed_workouts / self.total_workouts * 100
+
 class ExerciseLog(Base):
     __tablename__ = "exercise_logs"
+    __table_args__ = (
+        Index("ix_exercise_logs_workout_id", "workout_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     workout_id = Column(Integer, ForeignKey("workouts.id"))
@@ -71,6 +98,10 @@ class ExerciseLog(Base):
 
 class PersonalRecord(Base):
     __tablename__ = "personal_records"
+    __table_args__ = (
+        # Recent records per user, for progress pages and PR achievements
+        Index("ix_personal_records_user_id_achieved_at", "user_id", "achieved_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -82,8 +113,21 @@ class PersonalRecord(Base):
 
     user = relationship("User", back_populates="personal_records")
 
+class PersonalBest(Base):
+    """Best value so far per user, exercise and record type; new logs are compared against it"""
+    __tablename__ = "personal_bests"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    exercise_key = Column(String, primary_key=True)  # normalised exercise name
+    record_type = Column(String, primary_key=True)  # "weight", "reps", "duration"
+    value = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Achievement(Base):
     __tablename__ = "achievements"
+    __table_args__ = (
+        Index("ix_achievements_user_id_name", "user_id", "name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -99,6 +143,12 @@ class Achievement(Base):
 
 class Streak(Base):
     __tablename__ = "streaks"
+    __table_args__ = (
+        # One streak row per user
+        Index("ix_streaks_user_id", "user_id", unique=True),
+        # Maintenance scan for streaks whose day has passed
+        Index("ix_streaks_expires_at", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -106,28 +156,45 @@ class Streak(Base):
     longest_streak = Column(Integer, default=0)
     last_workout_date = Column(DateTime)
     streak_multiplier = Column(Float, default=1.0)  # for bonus points
+    expires_at = Column(DateTime, nullable=True)  # UTC end of the user's local day after last_workout_date
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="streaks")
 
 class Challenge(Base):
     __tablename__ = "challenges"
+    __table_args__ = (
+        Index("ix_challenges_end_date", "end_date"),
+        # One scheduled challenge per template and period, however many workers run the scheduler
+        Index("ix_challenges_challenge_type_period_key_name", "challenge_type", "period_key", "name", unique=True),
+        # The archiver's scan for ended, unarchived challenges
+        Index("ix_challenges_archived_at_end_date", "archived_at", "end_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     description = Column(String)
     challenge_type = Column(String)  # 'daily', 'weekly', 'special'
+    metric = Column(String, nullable=True)  # see challenge_progress.METRICS; None means manual progress
     target_value = Column(Integer)
     reward_points = Column(Integer)
     start_date = Column(DateTime)
     end_date = Column(DateTime)
     meme_reward = Column(String)  # URL to celebration meme
+    period_key = Column(String, nullable=True)  # e.g. '2026-10-19' or '2026-W42' for scheduled challenges
+    archived_at = Column(DateTime, nullable=True)  # participants moved to challenge_results
     created_at = Column(DateTime, default=datetime.utcnow)
 
     participants = relationship("ChallengeParticipant", back_populates="challenge")
 
 class ChallengeParticipant(Base):
     __tablename__ = "challenge_participants"
+    __table_args__ = (
+        # A user joins a challenge at most once
+        Index("ix_challenge_participants_challenge_id_user_id", "challenge_id", "user_id", unique=True),
+        # Standings pick up rows changed since their last sync
+        Index("ix_challenge_participants_challenge_id_updated_at", "challenge_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     challenge_id = Column(Integer, ForeignKey("challenges.id"))
@@ -135,10 +202,25 @@ class ChallengeParticipant(Base):
     current_value = Column(Integer, default=0)
     completed = Column(Boolean, default=False)
     joined_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     challenge = relationship("Challenge", back_populates="participants")
     user = relationship("User", back_populates="challenge_participations")
 
+class ChallengeResult(Base):
+    """Final standings of a challenge, written once after it ends"""
+    __tablename__ = "challenge_results"
+    __table_args__ = (
+        Index("ix_challenge_results_challenge_id_rank", "challenge_id", "rank"),
+    )
+
+    challenge_id = Column(Integer, ForeignKey("challenges.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rank = Column(Integer, nullable=False)
+    value = Column(Integer, nullable=False)
+    completed = Column(Boolean, default=False, nullable=False)
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+
 class SoundtrackPreference(Base):
     __tablename__ = "soundtrack_preferences"
 
@@ -153,6 +235,10 @@ class SoundtrackPreference(Base):
 
 class WorkoutHighlight(Base):
     __tablename__ = "workout_highlights"
+    __table_args__ = (
+        # Covers keyset pagination on (created_at, id) per author
+        Index("ix_workout_highlights_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -167,6 +253,19 @@ class WorkoutHighlight(Base):
     user = relationship("User", back_populates="highlights")
     workout = relationship("Workout", back_populates="highlights")
 
+class FeedItem(Base):
+    """A friend's highlight delivered to a user's feed inbox (fan-out on write)"""
+    __tablename__ = "feed_items"
+    __table_args__ = (
+        # A feed page is one range read on the recipient's inbox
+        Index("ix_feed_items_user_id_created_at_highlight_id", "user_id", "created_at", "highlight_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)  # recipient
+    highlight_id = Column(Integer, ForeignKey("workout_highlights.id"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime)  # copied from the highlight, so the inbox sorts without a join
+
 class AIMotivator(Base):
     __tablename__ = "ai_motivators"
 
@@ -206,6 +305,10 @@ class TransformationProgress(Base):
 
 class Friendship(Base):
     __tablename__ = "friendships"
+    __table_args__ = (
+        Index("ix_friendships_user_id_friend_id_status", "user_id", "friend_id", "status"),
+        Index("ix_friendships_friend_id_status", "friend_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -213,8 +316,49 @@ class Friendship(Base):
     status = Column(String)  # 'pending', 'accepted'
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class FriendEdge(Base):
+    """Accepted friendship stored in both directions, so friend lookups seek on user_id alone"""
+    __tablename__ = "friend_edges"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    friend_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PointsLedger(Base):
+    """Append-only record of every point award; users.total_points is its rollup"""
+    __tablename__ = "points_ledger"
+    __table_args__ = (
+        # Per-user entries not yet folded into users.total_points
+        Index("ix_points_ledger_user_id_rolled_up", "user_id", "rolled_up"),
+        # The rollup task's scan for unfolded entries
+        Index("ix_points_ledger_rolled_up_id", "rolled_up", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    points = Column(Integer, nullable=False)
+    source = Column(String, nullable=False)  # workout, achievement, challenge, like, gym_spot, ...
+    source_id = Column(Integer, nullable=True)  # id of the workout, highlight, challenge, ... it came from
+    rolled_up = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Maintenance purge of keys past IDEMPOTENCY_KEY_TTL_HOURS
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    key = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)  # e.g. 'workout_complete:42'
+    response = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class GymSpotted(Base):
     __tablename__ = "gym_spotted"
+    __table_args__ = (
+        Index("ix_gym_spotted_gym_location_created_at_id", "gym_location", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     spotter_id = Column(Integer, ForeignKey("users.id"))
@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 50
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a feed row"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def newest_after(query, created_at, row_id, cursor: Optional[str], limit: int):
+    """Rows of `query` older than the cursor, newest first, with one extra row to detect a next page"""
+    if cursor:
+        query = query.filter(tuple_(created_at, row_id) < tuple_(*decode_cursor(cursor)))
+    return query.order_by(created_at.desc(), row_id.desc()).limit(limit + 1)
+
+def paginate(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Cut a newest-first list to `limit` rows plus the cursor for the next page"""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
+
+def keyset_page(query, model, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """One page of `query` keyed on (created_at, id), so every page is an index range scan"""
+    limit = page_size(limit)
+    return paginate(newest_after(query, model.created_at, model.id, cursor, limit).all(), limit)
@@ -0,0 +1,230 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+from database import insert_ignore
+from models import ExerciseLog, PersonalBest, PersonalRecord, Workout
+
+# Log field holding each record type's value
+RECORD_FIELDS = {
+    "weight": "weight_used",
+    "reps": "reps_completed",
+    "duration": "duration",
+}
+
+# Users whose bests each worker keeps in memory (least recently used are dropped)
+PERSONAL_BEST_CACHE_USERS = int(os.getenv("PERSONAL_BEST_CACHE_USERS", 10000))
+
+_bests = PersonalBest.__table__
+
+def exercise_key(name: str) -> str:
+    """Normalise an exercise name so 'Bench Press' and 'bench press ' share records (matches SQL lower(trim(...)))"""
+    return (name or "").strip().lower()
+
+class PersonalBestUpdate(NamedTuple):
+    records: List[Dict]
+    # (exercise_key, record_type) -> value written in this transaction
+    bests: Dict[Tuple[str, str], float]
+    # Another worker moved a best we had cached
+    stale: bool
+
+class PersonalBestIndex:
+    """Each user's best value per exercise and record type, kept in memory and backed by personal_bests.
+
+    A new log is compared with the cached best, so ordinary sets cost
+    nothing. Only a value above it is written, through an UPDATE guarded
+    on the stored value, which settles races between workers: bests only
+    ever rise, so a stale cache costs an extra UPDATE, never a duplicate
+    record. The first log of an exercise sets the baseline and is not
+    itself a record, unless another worker stored a baseline first and
+    this log beats it.
+    """
+
+    def __init__(self, max_users: int = PERSONAL_BEST_CACHE_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[int, Dict[Tuple[str, str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, user_id: int) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None:
+                self._users.move_to_end(user_id)
+                return dict(cached)
+        rows = db.query(PersonalBest.exercise_key, PersonalBest.record_type, PersonalBest.value).filter(
+            PersonalBest.user_id == user_id
+        ).all()
+        bests = {(key, record_type): value for key, record_type, value in rows}
+        with self._lock:
+            self._users[user_id] = dict(bests)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return bests
+
+    def detect(self, db: Session, user_id: int, log_rows: Iterable[Dict]) -> PersonalBestUpdate:
+        """Compare logs, in order, with the user's bests (caller commits).
+
+        Writes raised bests and their PersonalRecord rows; call apply()
+        with the result once the transaction has committed.
+        """
+        bests = self._load(db, user_id)
+        # (exercise_key, record_type) -> (value, log) of the best log for a key with no stored best
+        baselines: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        changed: Dict[Tuple[str, str], float] = {}
+        records: List[Dict] = []
+        stale = False
+        now = datetime.utcnow()
+
+        for log in log_rows:
+            key = exercise_key(log.get("exercise_name"))
+            if not key:
+                continue
+            for record_type, field in RECORD_FIELDS.items():
+                value = log.get(field)
+                if not value or value <= 0:
+                    continue
+                best = bests.get((key, record_type))
+                if best is None:
+                    bests[key, record_type] = value
+                    baselines[key, record_type] = (value, log)
+                    continue
+                if value <= best:
+                    continue
+                bests[key, record_type] = value
+                if (key, record_type) in baselines:
+                    # Beats a baseline set earlier in this batch, which is not written yet
+                    baselines[key, record_type] = (value, log)
+                    continue
+                if not self._raise_best(db, user_id, key, record_type, value, now):
+                    stale = True
+                    continue
+                changed[key, record_type] = value
+                records.append(_record(log, record_type, value, best, now))
+
+        stored = self._write_baselines(db, user_id, baselines, now)
+        for (key, record_type), (value, log) in baselines.items():
+            if (key, record_type) not in stored:
+                changed[key, record_type] = value
+                continue
+            # Another worker stored this best after we cached the user: compare with it instead
+            stale = True
+            previous = stored[key, record_type]
+            if value > previous and self._raise_best(db, user_id, key, record_type, value, now):
+                changed[key, record_type] = value
+                records.append(_record(log, record_type, value, previous, now))
+
+        if records:
+            db.execute(PersonalRecord.__table__.insert(), [
+                {
+                    "user_id": user_id,
+                    "exercise_name": record["exercise"],
+                    "record_type": record["type"],
+                    "value": record["value"],
+                    "achieved_at": record["achieved_at"]
+                }
+                for record in records
+            ])
+        return PersonalBestUpdate(records, changed, stale)
+
+    def _raise_best(self, db: Session, user_id: int, key: str, record_type: str, value: float, now: datetime) -> bool:
+        """Raise a stored best, guarded on the stored value; False if it is already at least `value`"""
+        return bool(db.execute(_bests.update().where(
+            _bests.c.user_id == user_id,
+            _bests.c.exercise_key == key,
+            _bests.c.record_type == record_type,
+            _bests.c.value < value
+        ).values(value=value, updated_at=now)).rowcount)
+
+    def _write_baselines(self, db: Session, user_id: int, baselines: Dict[Tuple[str, str], Tuple[float, Dict]],
+                         now: datetime) -> Dict[Tuple[str, str], float]:
+        """Insert first bests; returns the values concurrent inserts already stored for keys that conflicted"""
+        if not baselines:
+            return {}
+        inserted = db.execute(insert_ignore(db, _bests), [
+            {"user_id": user_id, "exercise_key": key, "record_type": record_type, "value": value, "updated_at": now}
+            for (key, record_type), (value, _) in baselines.items()
+        ]).rowcount
+        if inserted == len(baselines):
+            return {}
+        # Some keys conflicted (or the driver reports no count): a stored value other than ours was not written by us
+        rows = db.query(PersonalBest.exercise_key, PersonalBest.record_type, PersonalBest.value).filter(
+            PersonalBest.user_id == user_id,
+            PersonalBest.exercise_key.in_({key for key, _ in baselines})
+        ).all()
+        return {
+            (key, record_type): value for key, record_type, value in rows
+            if (key, record_type) in baselines and value != baselines[key, record_type][0]
+        }
+
+    def apply(self, user_id: int, update: PersonalBestUpdate):
+        """Bring the cache up to date after the detecting transaction committed"""
+        with self._lock:
+            if update.stale:
+                self._users.pop(user_id, None)
+                return
+            cached = self._users.get(user_id)
+            if cached is None:
+                return
+            for key, value in update.bests.items():
+                cached[key] = max(value, cached.get(key, value))
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+def _record(log: Dict, record_type: str, value: float, previous: float, now: datetime) -> Dict:
+    return {
+        "workout_id": log.get("workout_id"),
+        "exercise": log["exercise_name"].strip(),
+        "type": record_type,
+        "value": value,
+        "previous": previous,
+        "achieved_at": log.get("created_at") or now
+    }
+
+def rebuild_personal_bests(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute personal_bests from exercise log history and recorded PRs (caller commits). Returns rows written."""
+    query = db.query(PersonalBest)
+    if user_id is not None:
+        query = query.filter(PersonalBest.user_id == user_id)
+    query.delete(synchronize_session=False)
+
+    sources = []
+    for record_type, field in RECORD_FIELDS.items():
+        column = getattr(ExerciseLog, field)
+        logs = select(
+            Workout.user_id.label("user_id"),
+            func.lower(func.trim(ExerciseLog.exercise_name)).label("exercise_key"),
+            literal(record_type).label("record_type"),
+            column.label("value")
+        ).join(Workout, Workout.id == ExerciseLog.workout_id).where(Workout.completed == True, column > 0)
+        sources.append(logs if user_id is None else logs.where(Workout.user_id == user_id))
+    records = select(
+        PersonalRecord.user_id,
+        func.lower(func.trim(PersonalRecord.exercise_name)),
+        PersonalRecord.record_type,
+        PersonalRecord.value
+    ).where(PersonalRecord.value > 0)
+    sources.append(records if user_id is None else records.where(PersonalRecord.user_id == user_id))
+
+    history = union_all(*sources).subquery()
+    stmt = _bests.insert().from_select(
+        ["user_id", "exercise_key", "record_type", "value", "updated_at"],
+        select(
+            history.c.user_id, history.c.exercise_key, history.c.record_type,
+            func.max(history.c.value), literal(datetime.utcnow())
+        ).where(history.c.exercise_key != "").group_by(
+            history.c.user_id, history.c.exercise_key, history.c.record_type
+        )
+    )
+    rows = db.execute(stmt).rowcount
+    personal_bests.invalidate(user_id)
+    return rows
+
+personal_bests = PersonalBestIndex()
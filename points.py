@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+from database import SessionLocal, mark_written
+from models import PointsLedger, User
+
+logger = logging.getLogger(__name__)
+
+# Points the highlight's creator earns per like
+LIKE_POINTS = 10
+
+# How often ledger entries are folded into users.total_points, and how many per pass
+POINTS_ROLLUP_INTERVAL = float(os.getenv("POINTS_ROLLUP_INTERVAL", 5.0))
+POINTS_ROLLUP_BATCH = int(os.getenv("POINTS_ROLLUP_BATCH", 5000))
+
+# Level up every POINTS_PER_LEVEL points
+POINTS_PER_LEVEL = 1000
+
+# Titles based on levels
+TITLES = {
+    1: "Rookie Lifter",
+    5: "Gym Rat Apprentice",
+    10: "Certified Gains Enjoyer",
+    15: "Fitness Girlboss/Maleboss",
+    20: "Gym Influencer",
+    25: "Swoledier",
+    30: "Gains Legend",
+    40: "Fitness CEO",
+    50: "Gigachad/Gigastacy"
+}
+
+_users = User.__table__
+
+ADD_POINTS = _users.update().where(_users.c.id == bindparam("b_id")).values(
+    total_points=func.coalesce(_users.c.total_points, 0) + bindparam("b_delta")
+)
+SET_LEVEL = _users.update().where(_users.c.id == bindparam("b_id")).values(
+    level=bindparam("b_level"),
+    title=bindparam("b_title")
+)
+
+class ConcurrentFold(Exception):
+    """Another worker folded some of the same ledger entries first"""
+    pass
+
+def level_for(points: int) -> int:
+    return 1 + (points or 0) // POINTS_PER_LEVEL
+
+def title_for(level: int) -> Optional[str]:
+    """The highest title unlocked at `level`"""
+    qualified = [unlocked_at for unlocked_at in TITLES if unlocked_at <= level]
+    return TITLES[max(qualified)] if qualified else None
+
+def award_points(db: Session, user_id: int, points: int, source: str, source_id: Optional[int] = None):
+    """Append a ledger entry (caller commits). Never touches the users row."""
+    award_many(db, [{"user_id": user_id, "points": points, "source": source, "source_id": source_id}])
+
+def award_many(db: Session, entries: List[Dict]):
+    """Append several ledger entries in one INSERT (caller commits)"""
+    now = datetime.utcnow()
+    rows = [
+        {"source_id": None, **entry, "rolled_up": False, "created_at": now}
+        for entry in entries if entry["points"]
+    ]
+    if rows:
+        db.execute(PointsLedger.__table__.insert(), rows)
+        mark_written(db, *(row["user_id"] for row in rows))
+
+def unrolled_points(user_id):
+    """Scalar subquery: the user's points not yet folded into users.total_points"""
+    return select(func.coalesce(func.sum(PointsLedger.points), 0)).where(
+        PointsLedger.user_id == user_id,
+        PointsLedger.rolled_up == False
+    ).scalar_subquery()
+
+def points_total(db: Session, user_id: int) -> int:
+    """Current points: the rollup plus the ledger tail, read in one statement"""
+    total = db.query(
+        func.coalesce(User.total_points, 0) + unrolled_points(user_id)
+    ).filter(User.id == user_id).scalar()
+    return total or 0
+
+def fold_points(db: Session, batch: int = POINTS_ROLLUP_BATCH) -> int:
+    """Fold unrolled ledger entries into users.total_points (caller commits). Returns entries folded."""
+    entries = db.query(PointsLedger.id, PointsLedger.user_id, PointsLedger.points).filter(
+        PointsLedger.rolled_up == False
+    ).order_by(PointsLedger.id).limit(batch).with_for_update(skip_locked=True).all()
+    if not entries:
+        return 0
+
+    ids = [entry.id for entry in entries]
+    marked = db.query(PointsLedger).filter(
+        PointsLedger.id.in_(ids),
+        PointsLedger.rolled_up == False
+    ).update({PointsLedger.rolled_up: True}, synchronize_session=False)
+    if marked != len(ids):
+        # Without SKIP LOCKED (SQLite) two workers can pick the same batch;
+        # the loser's transaction must be rolled back as a whole
+        raise ConcurrentFold(f"{len(ids) - marked} ledger entries were folded concurrently")
+
+    totals = defaultdict(int)
+    for entry in entries:
+        totals[entry.user_id] += entry.points
+    # Sorted so concurrent folders lock users rows in the same order
+    db.execute(ADD_POINTS, [{"b_id": k, "b_delta": v} for k, v in sorted(totals.items())])
+    refresh_levels(db, sorted(totals))
+    return len(entries)
+
+def refresh_levels(db: Session, user_ids: List[int]) -> int:
+    """Bring level and title in line with each user's points (caller commits). Returns users changed.
+
+    Points from likes and challenge rewards reach the ledger without a
+    level check, so the rollup settles levels for the users it folded.
+    """
+    rows = db.query(
+        User.id, User.level, User.title, func.coalesce(User.total_points, 0) + unrolled_points(User.id)
+    ).filter(User.id.in_(user_ids)).all()
+    changes = []
+    for user_id, level, title, points in rows:
+        new_level = level_for(points)
+        if new_level != level:
+            changes.append({"b_id": user_id, "b_level": new_level, "b_title": title_for(new_level) or title})
+    if changes:
+        db.execute(SET_LEVEL, changes)
+    return len(changes)
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute users.total_points from the whole ledger (caller commits). Returns users updated."""
+    # Entries committed after this point stay unrolled and are folded as usual
+    watermark = db.query(func.max(PointsLedger.id)).scalar() or 0
+    settled = select(func.coalesce(func.sum(PointsLedger.points), 0)).where(
+        PointsLedger.user_id == User.id,
+        PointsLedger.id <= watermark
+    ).scalar_subquery()
+
+    users = db.query(User)
+    ledger = db.query(PointsLedger).filter(PointsLedger.id <= watermark, PointsLedger.rolled_up == False)
+    if user_id is not None:
+        users = users.filter(User.id == user_id)
+        ledger = ledger.filter(PointsLedger.user_id == user_id)
+    ledger.update({PointsLedger.rolled_up: True}, synchronize_session=False)
+    return users.update({User.total_points: settled}, synchronize_session=False)
+
+class PointsRollup:
+    """Background folding of the ledger into the users.total_points rollup"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def fold(self, batch: int = POINTS_ROLLUP_BATCH) -> int:
+        """Fold until the ledger tail is empty. Returns entries folded."""
+        folded = 0
+        while True:
+            db = self.session_factory()
+            try:
+                count = fold_points(db, batch)
+                db.commit()
+            except ConcurrentFold as e:
+                # The other worker is folding the same tail; leave it to them
+                db.rollback()
+                logger.info(f"⏭️ Skipped points rollup pass: {str(e)}")
+                return folded
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ Error rolling up points: {str(e)}")
+                return folded
+            finally:
+                db.close()
+            folded += count
+            if count < batch:
+                return folded
+
+    async def run(self, interval: float = POINTS_ROLLUP_INTERVAL):
+        """Fold on a timer until cancelled, then once more"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.fold)
+        finally:
+            self.fold()
+
+points_rollup = PointsRollup(SessionLocal)
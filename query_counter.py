@@ -0,0 +1,101 @@
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_active_counter: ContextVar[Optional["QueryCounter"]] = ContextVar("active_query_counter", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def fingerprint(statement: str) -> str:
+    """Normalise a statement so repeats of the same query shape compare equal"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+class QueryCounter:
+    """Count statements executed in the current context.
+
+    Usable directly in tests:
+
+        with QueryCounter(max_queries=5):
+            client.get("/users/1/gamification")
+
+    Leaving the block with more than `max_queries` statements logs the
+    offending fingerprints and raises QueryBudgetExceeded (unless `strict`
+    is False, in which case it only logs).
+    """
+
+    def __init__(self, max_queries: Optional[int] = None, label: str = "block", strict: bool = True):
+        self.max_queries = max_queries
+        self.label = label
+        self.strict = strict
+        self.statements: List[str] = []
+        self._parent: Optional[QueryCounter] = None
+        self._token = None
+
+    def __enter__(self) -> "QueryCounter":
+        self._parent = _active_counter.get()
+        self._token = _active_counter.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_counter.reset(self._token)
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.max_queries is not None and self.count > self.max_queries
+
+    def record(self, statement: str):
+        counter = self
+        while counter is not None:
+            counter.statements.append(statement)
+            counter = counter._parent
+
+    def top_fingerprints(self, limit: int = 5) -> List[Tuple[str, int]]:
+        return Counter(fingerprint(s) for s in self.statements).most_common(limit)
+
+    def check(self):
+        """Log and optionally raise if the budget was exceeded"""
+        if not self.exceeded:
+            return
+        offenders = "\n".join(f"  {count}x {statement}" for statement, count in self.top_fingerprints())
+        message = f"{self.label} ran {self.count} queries (budget {self.max_queries}):\n{offenders}"
+        logger.warning(f"⚠️ Query budget exceeded: {message}")
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+
+def query_budget(max_queries: int):
+    """Declare the maximum number of queries an endpoint may run"""
+    def decorator(func):
+        func.query_budget = max_queries
+        return func
+    return decorator
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _active_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+def instrument_engine(engine):
+    """Report statements executed through `engine` to the active QueryCounter"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
@@ -0,0 +1,159 @@
+import random
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+MAX_LEVEL = 32
+# Chance of a node reaching the next level; 1/4 keeps the tower short (as in Redis sorted sets)
+LEVEL_PROBABILITY = 0.25
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward: List[Optional["_Node"]] = [None] * level
+        # Level-0 steps to the node `forward[i]` points at
+        self.span: List[int] = [0] * level
+
+class RankedSet:
+    """Members ordered by score (highest first, ties by member), with O(log n) rank queries.
+
+    An indexable skip list: every forward pointer also records how many
+    members it skips, so both "what is this member's rank" and "who is at
+    rank r" are answered on the way down the tower.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+        self._scores: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member) -> bool:
+        return member in self._scores
+
+    def score(self, member) -> Optional[int]:
+        return self._scores.get(member)
+
+    def items(self) -> Iterator[Tuple[Hashable, int]]:
+        """(member, score) pairs in rank order"""
+        node = self._head.forward[0]
+        while node:
+            yield node.key[1], -node.key[0]
+            node = node.forward[0]
+
+    def add(self, member, score: int):
+        """Insert the member, or move it to its new score"""
+        current = self._scores.get(member)
+        if current == score:
+            return
+        if current is not None:
+            self._delete((-current, member))
+        self._insert((-score, member))
+        self._scores[member] = score
+
+    def increment(self, member, delta: int) -> int:
+        score = self._scores.get(member, 0) + delta
+        self.add(member, score)
+        return score
+
+    def discard(self, member):
+        score = self._scores.pop(member, None)
+        if score is not None:
+            self._delete((-score, member))
+
+    def rank(self, member) -> Optional[int]:
+        """1-based position of the member, or None if absent"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = (-score, member)
+        rank, node = 0, self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] and node.forward[i].key <= key:
+                rank += node.span[i]
+                node = node.forward[i]
+            if node.key == key:
+                return rank
+        return None
+
+    def range(self, start: int, stop: int) -> List[Tuple[Hashable, int]]:
+        """(member, score) pairs for 0-based ranks start..stop-1"""
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        node = self._by_rank(start + 1)
+        result = []
+        while node and len(result) < stop - start:
+            result.append((node.key[1], -node.key[0]))
+            node = node.forward[0]
+        return result
+
+    def _by_rank(self, rank: int) -> Optional[_Node]:
+        traversed, node = 0, self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] and traversed + node.span[i] <= rank:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == rank:
+                return node
+        return None
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _insert(self, key):
+        update = [self._head] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._length
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._length += 1
+
+    def _delete(self, key):
+        update = [self._head] * MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
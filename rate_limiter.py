@@ -0,0 +1,152 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, NamedTuple, Optional, Tuple
+from metrics import Counter, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total", "Admission control outcomes for expensive routes", ("kind", "result")
+)
+REGISTRY.append(ADMISSION_DECISIONS)
+
+class TokenBucket(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+def _per_minute(env_var: str, default: float) -> TokenBucket:
+    rate = float(os.getenv(env_var, default))
+    return TokenBucket(capacity=max(rate, 1.0), refill_per_second=rate / 60)
+
+# Buckets per kind of upstream work: one per user and one shared by everyone
+LIMITS: Dict[str, Dict[str, TokenBucket]] = {
+    "llm": {
+        "user": _per_minute("LLM_USER_PER_MINUTE", 3),
+        "global": _per_minute("LLM_GLOBAL_PER_MINUTE", 60)
+    },
+    "tts": {
+        "user": _per_minute("TTS_USER_PER_MINUTE", 3),
+        "global": _per_minute("TTS_GLOBAL_PER_MINUTE", 30)
+    }
+}
+
+# Take one token if, after refilling for the elapsed time, at least one is available
+_TAKE_TOKEN = """
+INSERT INTO token_buckets (key, tokens, updated_at) VALUES (:key, :capacity - 1, :now)
+ON CONFLICT(key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + (:now - updated_at) * :rate) - 1,
+    updated_at = :now
+WHERE MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1
+"""
+
+class AdmissionController:
+    """Token buckets and an in-flight cap shared by every worker on the host.
+
+    State lives in a small SQLite file (RATE_LIMIT_DB) so separate uvicorn
+    worker processes see the same buckets. Each check is a single short
+    IMMEDIATE transaction.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_in_flight: Optional[int] = None,
+        lease_seconds: float = 120
+    ):
+        self.path = path or os.getenv(
+            "RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "ai_trainer_admission.db")
+        )
+        self.max_in_flight = max_in_flight or int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", 8))
+        # Leases from crashed workers expire instead of leaking slots forever
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS upstream_leases (id TEXT PRIMARY KEY, expires_at REAL)")
+
+    def _take(self, buckets: Tuple[Tuple[str, TokenBucket], ...]) -> bool:
+        """Take a token from every bucket, or from none of them"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, bucket in buckets:
+                    taken = self._conn.execute(_TAKE_TOKEN, {
+                        "key": key,
+                        "capacity": bucket.capacity,
+                        "rate": bucket.refill_per_second,
+                        "now": now
+                    }).rowcount
+                    if not taken:
+                        self._conn.execute("ROLLBACK")
+                        return False
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def admit(self, kind: str, user_id: int) -> bool:
+        """Check the per-user and global buckets for an expensive call"""
+        limits = LIMITS[kind]
+        try:
+            admitted = self._take((
+                (f"{kind}:user:{user_id}", limits["user"]),
+                (f"{kind}:global", limits["global"])
+            ))
+        except sqlite3.Error as e:
+            # Fail open: a broken limiter must not take the app down
+            logger.error(f"❌ Admission check failed: {str(e)}")
+            admitted = True
+        ADMISSION_DECISIONS.inc(kind, "admitted" if admitted else "rate_limited")
+        return admitted
+
+    def _acquire_lease(self) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM upstream_leases WHERE expires_at < ?", (now,))
+                in_flight = self._conn.execute("SELECT COUNT(*) FROM upstream_leases").fetchone()[0]
+                if in_flight >= self.max_in_flight:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                lease_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO upstream_leases (id, expires_at) VALUES (?, ?)",
+                    (lease_id, now + self.lease_seconds)
+                )
+                self._conn.execute("COMMIT")
+                return lease_id
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _release_lease(self, lease_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM upstream_leases WHERE id = ?", (lease_id,))
+
+    @contextmanager
+    def upstream_slot(self, kind: str = "upstream", enabled: bool = True):
+        """Yield True if an in-flight slot was free; never waits for one"""
+        lease_id = None
+        if enabled:
+            try:
+                lease_id = self._acquire_lease()
+            except sqlite3.Error as e:
+                logger.error(f"❌ Upstream slot check failed: {str(e)}")
+                yield True
+                return
+            ADMISSION_DECISIONS.inc(kind, "slot_acquired" if lease_id else "busy")
+        try:
+            yield lease_id is not None
+        finally:
+            if lease_id:
+                self._release_lease(lease_id)
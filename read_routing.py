@@ -0,0 +1,107 @@
+import os
+import logging
+import random
+import threading
+import time
+from typing import List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from cache import get_cache
+from database import RoutingSession, SessionLocal, engine, replica_engines
+from metrics import Counter, Gauge, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# A replica further behind the primary than this is skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 5))
+# After a user's own write, their reads stay on the primary for this long
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 10))
+
+REPLICA_LAG = Gauge("db_replica_lag_seconds", "Most recently measured replication lag", ("replica",))
+READ_ROUTING = Counter("db_read_routing_total", "Read-only sessions by target and reason", ("target", "reason"))
+REGISTRY.extend([REPLICA_LAG, READ_ROUTING])
+
+# Zero when the replica has replayed everything it received, otherwise the
+# age of the last replayed transaction
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaSet:
+    """Replica engines with a periodically refreshed lag measurement"""
+
+    def __init__(self, engines: List):
+        self.engines = engines
+        self._lag = {}  # engine -> (lag in seconds or None if unreachable, measured at)
+        self._lock = threading.Lock()
+
+    def _measure(self, replica) -> Optional[float]:
+        if replica.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with replica.connect() as conn:
+                lag = float(conn.execute(_REPLICA_LAG_SQL).scalar() or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Replica {replica.url.host} unreachable: {str(e)}")
+            return None
+        REPLICA_LAG.set(str(replica.url.host), value=lag)
+        return lag
+
+    def lag(self, replica) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._lag.get(replica)
+            if cached and now - cached[1] < REPLICA_LAG_CHECK_INTERVAL:
+                return cached[0]
+        lag = self._measure(replica)
+        with self._lock:
+            self._lag[replica] = (lag, now)
+        return lag
+
+    def pick(self):
+        """A random replica within the lag budget, or None"""
+        for replica in random.sample(self.engines, len(self.engines)):
+            lag = self.lag(replica)
+            if lag is not None and lag <= REPLICA_MAX_LAG_SECONDS:
+                return replica
+        return None
+
+replicas = ReplicaSet(replica_engines) if replica_engines else None
+if replicas:
+    logger.info(f"✅ Routing read-only endpoints to {len(replicas.engines)} replica(s)")
+
+# Users who wrote within REPLICA_STICKY_SECONDS; shared across workers through the cache backend
+recent_writers = get_cache("read_your_writes", default_ttl=REPLICA_STICKY_SECONDS)
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_recent_writers(session):
+    for user_id in session.info.pop("written_user_ids", ()):
+        recent_writers.set(str(user_id), True)
+
+def read_session(user_id: Optional[int] = None) -> Session:
+    """Session for a read-only endpoint: a fresh-enough replica unless `user_id` just wrote"""
+    if not replicas:
+        return SessionLocal()
+    if user_id is not None and recent_writers.get(str(user_id)):
+        READ_ROUTING.inc("primary", "recent_write")
+        return SessionLocal(read_bind=engine)
+    replica = replicas.pick()
+    if replica is None:
+        READ_ROUTING.inc("primary", "replica_lagging")
+        return SessionLocal(read_bind=engine)
+    READ_ROUTING.inc("replica", "ok")
+    return SessionLocal(read_bind=replica)
+
+def get_read_db(request: Request):
+    """Database dependency for read-only endpoints, keyed on the path's user_id"""
+    user_id = request.path_params.get("user_id")
+    db = read_session(int(user_id) if user_id is not None else None)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,9 +1,17 @@
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Optional
+import asyncio
 import json
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
+from database import mark_written
+from feed import FeedManager
+from friends import FriendGraph
+from like_buffer import like_buffer
+from pagination import InvalidCursor, keyset_page
+from points import LIKE_POINTS, award_many, award_points
 from models import (
-    User, WorkoutHighlight, Friendship, GymSpotted,
+    WorkoutHighlight, Friendship, GymSpotted,
     TransformationProgress, Achievement
 )
 
@@ -30,6 +38,7 @@ class SocialManager:
             highlight_type=highlight_type
         )
         self.db.add(highlight)
+        FeedManager(self.db).fan_out(highlight)
         self.db.commit()
 
         return {
@@ -41,29 +50,49 @@ class SocialManager:
         }
 
     async def like_highlight(self, highlight_id: int, user_id: int) -> Dict:
-        """Like a workout highlight"""
-        highlight = self.db.query(WorkoutHighlight).get(highlight_id)
-        if not highlight:
-            return {"error": "Highlight not found"}
+        """Like a workout highlight; the creator earns points per like"""
+        if like_buffer is not None:
+            row = self.db.query(WorkoutHighlight.user_id, WorkoutHighlight.likes).filter(
+                WorkoutHighlight.id == highlight_id
+            ).first()
+            if not row:
+                return {"error": "Highlight not found"}
+            if like_buffer.add(highlight_id, row.user_id):
+                await asyncio.to_thread(like_buffer.flush)
+            return {
+                "likes": (row.likes or 0) + like_buffer.pending_likes(highlight_id),
+                "points_awarded": LIKE_POINTS
+            }
 
-        highlight.likes += 1
-        self.db.commit()
+        # Increment in SQL so concurrent likes never overwrite each other
+        updated = self.db.query(WorkoutHighlight).filter(WorkoutHighlight.id == highlight_id).update(
+            {WorkoutHighlight.likes: func.coalesce(WorkoutHighlight.likes, 0) + 1},
+            synchronize_session=False
+        )
+        if not updated:
+            self.db.rollback()
+            return {"error": "Highlight not found"}
 
-        # Award points to highlight creator
-        creator = self.db.query(User).get(highlight.user_id)
-        creator.total_points += 10  # 10 points per like
+        row = self.db.query(WorkoutHighlight.user_id, WorkoutHighlight.likes).filter(
+            WorkoutHighlight.id == highlight_id
+        ).one()
+        mark_written(self.db, row.user_id)
+        award_points(self.db, row.user_id, LIKE_POINTS, "like", highlight_id)
         self.db.commit()
 
         return {
-            "likes": highlight.likes,
-            "points_awarded": 10
+            "likes": row.likes,
+            "points_awarded": LIKE_POINTS
         }
 
     async def add_friend(self, user_id: int, friend_id: int) -> Dict:
         """Send a friend request"""
+        if FriendGraph(self.db).are_friends(user_id, friend_id):
+            return {"error": "Friendship already exists"}
+
+        # A pending request in either direction (two seeks on the (user_id, friend_id) index)
         existing = self.db.query(Friendship).filter(
-            ((Friendship.user_id == user_id) & (Friendship.friend_id == friend_id)) |
-            ((Friendship.user_id == friend_id) & (Friendship.friend_id == user_id))
+            tuple_(Friendship.user_id, Friendship.friend_id).in_([(user_id, friend_id), (friend_id, user_id)])
         ).first()
 
         if existing:
@@ -88,30 +117,31 @@ class SocialManager:
         if not friendship:
             return {"error": "Friendship not found"}
 
+        graph = FriendGraph(self.db)
         friendship.status = "accepted"
-        self.db.commit()
+        if graph.connect(friendship.user_id, friendship.friend_id):
+            FeedManager(self.db).backfill_friendship(friendship.user_id, friendship.friend_id)
 
-        # Award achievement if this is their first friend
-        friend_count = self.db.query(Friendship).filter(
-            (Friendship.user_id == friendship.user_id) &
-            (Friendship.status == "accepted")
-        ).count()
+            # Award achievement to whichever side just made their first friend
+            for user_id in (friendship.user_id, friendship.friend_id):
+                if graph.friend_count(user_id) != 1:
+                    continue
+                achievement = Achievement(
+                    user_id=user_id,
+                    name="Gym Buddy Found!",
+                    description="Made your first gym friend! Time for spotting and PR cheering! 🤝",
+                    badge_url="/static/badges/first_friend.png",
+                    meme_url="/static/memes/first_friend.gif",
+                    achievement_type="social"
+                )
+                self.db.add(achievement)
 
-        if friend_count == 1:
-            achievement = Achievement(
-                user_id=friendship.user_id,
-                name="Gym Buddy Found!",
-                description="Made your first gym friend! Time for spotting and PR cheering! 🤝",
-                badge_url="/static/badges/first_friend.png",
-                meme_url="/static/memes/first_friend.gif",
-                achievement_type="social"
-            )
-            self.db.add(achievement)
-            
-            # Award points
-            user = self.db.query(User).get(friendship.user_id)
-            user.total_points += 100
-            self.db.commit()
+                # Award points
+                award_points(self.db, user_id, 100, "friend", friendship_id)
+
+        friend_count = graph.friend_count(friendship.user_id)
+        self.db.commit()
+        graph.invalidate(friendship.user_id, friendship.friend_id)
 
         return {
             "status": "accepted",
@@ -134,12 +164,13 @@ class SocialManager:
         )
         self.db.add(spotted)
         
+        self.db.flush()
+
         # Award points to both users
-        spotter = self.db.query(User).get(spotter_id)
-        spotted_user = self.db.query(User).get(spotted_id)
-        
-        spotter.total_points += 20
-        spotted_user.total_points += 20
+        award_many(self.db, [
+            {"user_id": spotter_id, "points": 20, "source": "gym_spot", "source_id": spotted.id},
+            {"user_id": spotted_id, "points": 20, "source": "gym_spot", "source_id": spotted.id}
+        ])
         
         self.db.commit()
 
@@ -182,8 +213,8 @@ class SocialManager:
             self.db.add(achievement)
             
             # Award bonus points
-            user = self.db.query(User).get(user_id)
-            user.total_points += 200
+            self.db.flush()
+            award_points(self.db, user_id, 200, "transformation", progress.id)
             
         self.db.commit()
 
@@ -194,51 +225,43 @@ class SocialManager:
             "progress_count": progress_count
         }
 
-    async def get_friend_feed(self, user_id: int, page: int = 1, limit: int = 10) -> List[Dict]:
-        """Get a feed of friend activities"""
-        # Get user's friends
-        friend_ids = self.db.query(Friendship).filter(
-            ((Friendship.user_id == user_id) | (Friendship.friend_id == user_id)) &
-            (Friendship.status == "accepted")
-        ).with_entities(
-            Friendship.user_id,
-            Friendship.friend_id
-        ).all()
-        
-        friend_ids = [
-            f_id for pair in friend_ids
-            for f_id in pair
-            if f_id != user_id
-        ]
-
-        # Get recent highlights from friends
-        highlights = self.db.query(WorkoutHighlight).filter(
-            WorkoutHighlight.user_id.in_(friend_ids)
-        ).order_by(
-            WorkoutHighlight.created_at.desc()
-        ).offset((page - 1) * limit).limit(limit).all()
-
-        return [{
-            "id": h.id,
-            "user_id": h.user_id,
-            "title": h.title,
-            "description": h.description,
-            "media_url": h.media_url,
-            "likes": h.likes,
-            "created_at": h.created_at
-        } for h in highlights]
-
-    async def get_gym_feed(self, gym_location: str, page: int = 1, limit: int = 10) -> List[Dict]:
-        """Get a feed of activity at a specific gym"""
-        spotted = self.db.query(GymSpotted).filter(
-            GymSpotted.gym_location == gym_location
-        ).order_by(
-            GymSpotted.created_at.desc()
-        ).offset((page - 1) * limit).limit(limit).all()
-
-        return [{
-            "spotter_id": s.spotter_id,
-            "spotted_id": s.spotted_id,
-            "message": s.message,
-            "created_at": s.created_at
-        } for s in spotted]
+    async def get_friend_feed(self, user_id: int, cursor: Optional[str] = None, limit: int = 10) -> Dict:
+        """Get a feed of friend activities, newest first; pass `next_cursor` back for the next page"""
+        try:
+            highlights, next_cursor = FeedManager(self.db).get_feed(user_id, cursor, limit)
+        except InvalidCursor:
+            return {"error": "Invalid cursor"}
+
+        return {
+            "items": [{
+                "id": h.id,
+                "user_id": h.user_id,
+                "title": h.title,
+                "description": h.description,
+                "media_url": h.media_url,
+                "likes": h.likes,
+                "created_at": h.created_at
+            } for h in highlights],
+            "next_cursor": next_cursor
+        }
+
+    async def get_gym_feed(self, gym_location: str, cursor: Optional[str] = None, limit: int = 10) -> Dict:
+        """Get a feed of activity at a specific gym, newest first"""
+        try:
+            spotted, next_cursor = keyset_page(
+                self.db.query(GymSpotted).filter(GymSpotted.gym_location == gym_location),
+                GymSpotted, cursor, limit
+            )
+        except InvalidCursor:
+            return {"error": "Invalid cursor"}
+
+        return {
+            "items": [{
+                "id": s.id,
+                "spotter_id": s.spotter_id,
+                "spotted_id": s.spotted_id,
+                "message": s.message,
+                "created_at": s.created_at
+            } for s in spotted],
+            "next_cursor": next_cursor
+        }
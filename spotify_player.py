@@ -1,5 +1,10 @@
 import os
 from typing import Optional, Dict, Any
+from metrics import track_upstream
+from cache import get_cache
+
+# Playlist search results change slowly, so share them for a day
+playlist_cache = get_cache("playlist", default_ttl=24 * 3600)
 
 class SpotifyPlayer:
     def __init__(self):
@@ -36,21 +41,25 @@ class SpotifyPlayer:
             
             # Search for a playlist
             keyword = playlist_keywords.get(workout_type, playlist_keywords["general"])
-            results = self.spotify.search(q=keyword, type="playlist", limit=1)
-            
-            if results and results["playlists"]["items"]:
-                playlist = results["playlists"]["items"][0]
-                return {
-                    "name": playlist["name"],
-                    "url": playlist["external_urls"]["spotify"],
-                    "uri": playlist["uri"]
-                }
-            return None
+            return playlist_cache.get_or_set(keyword, lambda: self._search_playlist(keyword))
             
         except Exception as e:
             print(f"Error getting workout playlist: {e}")
             return None
 
+    def _search_playlist(self, keyword: str) -> Optional[Dict[str, Any]]:
+        with track_upstream("spotify", "search"):
+            results = self.spotify.search(q=keyword, type="playlist", limit=1)
+        
+        if results and results["playlists"]["items"]:
+            playlist = results["playlists"]["items"][0]
+            return {
+                "name": playlist["name"],
+                "url": playlist["external_urls"]["spotify"],
+                "uri": playlist["uri"]
+            }
+        return None
+
     def get_playlist_embed(self, playlist_uri: str) -> Optional[str]:
         """Generate an embed code for a Spotify playlist"""
         if not self.spotify_available or not playlist_uri:
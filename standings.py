@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import false, func, literal, select
+from sqlalchemy.orm import Session
+from database import SessionLocal, insert_ignore
+from models import Challenge, ChallengeParticipant, ChallengeResult
+from ranking import RankedSet
+
+logger = logging.getLogger(__name__)
+
+# How often each worker pulls progress written by other workers (seconds)
+STANDINGS_REFRESH_INTERVAL = float(os.getenv("STANDINGS_REFRESH_INTERVAL", 2.0))
+# Rows changed this long before the last sync are read again, covering commits
+# that land out of order and clock differences between app servers
+STANDINGS_SYNC_OVERLAP = timedelta(seconds=30)
+
+RESULT_COLUMNS = ["challenge_id", "user_id", "rank", "value", "completed", "recorded_at"]
+
+def persist_results(db: Session, challenge_id: int) -> int:
+    """Write the final standings of an ended challenge (caller commits). Safe to repeat."""
+    ranked = select(
+        ChallengeParticipant.challenge_id,
+        ChallengeParticipant.user_id,
+        func.row_number().over(order_by=(
+            func.coalesce(ChallengeParticipant.current_value, 0).desc(), ChallengeParticipant.user_id
+        )),
+        func.coalesce(ChallengeParticipant.current_value, 0),
+        func.coalesce(ChallengeParticipant.completed, false()),
+        literal(datetime.utcnow())
+    ).where(ChallengeParticipant.challenge_id == challenge_id)
+    stmt = insert_ignore(db, ChallengeResult.__table__).from_select(RESULT_COLUMNS, ranked)
+    return db.execute(stmt).rowcount
+
+class ChallengeStandings:
+    """Live rankings for active challenges, loaded on first use and kept current incrementally.
+
+    Progress written by this worker is applied right after its commit;
+    progress from other workers arrives through a periodic read of rows
+    whose updated_at moved. Boards hold absolute values, so reading a row
+    twice is harmless. Once a challenge ends its board is dropped and the
+    final order lives in challenge_results.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._boards: Dict[int, RankedSet] = {}
+        self._ends: Dict[int, datetime] = {}
+        self._synced_at: Optional[datetime] = None
+        self._lock = threading.RLock()
+
+    def _load(self, db: Session, challenge: Challenge) -> RankedSet:
+        board = RankedSet()
+        for user_id, value in db.query(ChallengeParticipant.user_id, ChallengeParticipant.current_value).filter(
+            ChallengeParticipant.challenge_id == challenge.id
+        ):
+            board.add(user_id, value or 0)
+        with self._lock:
+            # Another request may have loaded it meanwhile; either copy is current
+            self._boards.setdefault(challenge.id, board)
+            self._ends[challenge.id] = challenge.end_date
+            if self._synced_at is None:
+                self._synced_at = datetime.utcnow()
+            return self._boards[challenge.id]
+
+    def record(self, challenge_id: int, user_id: int, value: int):
+        """Apply committed progress to a loaded board"""
+        with self._lock:
+            board = self._boards.get(challenge_id)
+            if board is not None:
+                board.add(user_id, value or 0)
+
+    def _live_board(self, db: Session, challenge: Challenge) -> RankedSet:
+        with self._lock:
+            board = self._boards.get(challenge.id)
+        return board if board is not None else self._load(db, challenge)
+
+    def top(self, db: Session, challenge: Challenge, limit: int = 10) -> List[Dict]:
+        """The leading participants, from memory while the challenge runs"""
+        if challenge.end_date and challenge.end_date <= datetime.utcnow():
+            self._ensure_results(db, challenge.id)
+            rows = db.query(ChallengeResult).filter(
+                ChallengeResult.challenge_id == challenge.id,
+                ChallengeResult.rank <= limit
+            ).order_by(ChallengeResult.rank)
+            return [{"rank": r.rank, "user_id": r.user_id, "value": r.value} for r in rows]
+
+        board = self._live_board(db, challenge)
+        with self._lock:
+            return [
+                {"rank": rank, "user_id": user_id, "value": value}
+                for rank, (user_id, value) in enumerate(board.range(0, limit), start=1)
+            ]
+
+    def position(self, db: Session, challenge: Challenge, user_id: int, radius: int = 2) -> Optional[Dict]:
+        """The user's rank with `radius` participants either side, or None if not participating"""
+        if challenge.end_date and challenge.end_date <= datetime.utcnow():
+            self._ensure_results(db, challenge.id)
+            mine = db.query(ChallengeResult).get((challenge.id, user_id))
+            if mine is None:
+                return None
+            rows = db.query(ChallengeResult).filter(
+                ChallengeResult.challenge_id == challenge.id,
+                ChallengeResult.rank.between(mine.rank - radius, mine.rank + radius)
+            ).order_by(ChallengeResult.rank)
+            total = db.query(func.count()).filter(ChallengeResult.challenge_id == challenge.id).scalar()
+            return {
+                "rank": mine.rank,
+                "value": mine.value,
+                "total": total,
+                "final": True,
+                "neighbours": [{"rank": r.rank, "user_id": r.user_id, "value": r.value} for r in rows]
+            }
+
+        board = self._live_board(db, challenge)
+        with self._lock:
+            rank = board.rank(user_id)
+            if rank is None:
+                return None
+            start = max(rank - 1 - radius, 0)
+            return {
+                "rank": rank,
+                "value": board.score(user_id),
+                "total": len(board),
+                "final": False,
+                "neighbours": [
+                    {"rank": position, "user_id": member, "value": value}
+                    for position, (member, value) in enumerate(board.range(start, rank + radius), start=start + 1)
+                ]
+            }
+
+    def _ensure_results(self, db: Session, challenge_id: int):
+        """Persist final standings on first read if no worker has yet"""
+        if db.query(ChallengeResult.challenge_id).filter(ChallengeResult.challenge_id == challenge_id).first():
+            return
+        write_db = self.session_factory()
+        try:
+            persist_results(write_db, challenge_id)
+            write_db.commit()
+        finally:
+            write_db.close()
+
+    def refresh(self) -> int:
+        """Pull progress committed elsewhere, then retire ended challenges. Returns rows applied."""
+        now = datetime.utcnow()
+        with self._lock:
+            challenge_ids = list(self._boards)
+            since = self._synced_at
+        if not challenge_ids:
+            return 0
+
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                ChallengeParticipant.challenge_id, ChallengeParticipant.user_id, ChallengeParticipant.current_value
+            ).filter(
+                ChallengeParticipant.challenge_id.in_(challenge_ids),
+                ChallengeParticipant.updated_at >= since - STANDINGS_SYNC_OVERLAP
+            ).all()
+            with self._lock:
+                for challenge_id, user_id, value in rows:
+                    board = self._boards.get(challenge_id)
+                    if board is not None:
+                        board.add(user_id, value or 0)
+                self._synced_at = now
+
+            ended = [cid for cid in challenge_ids if self._ends.get(cid) and self._ends[cid] <= now]
+            for challenge_id in ended:
+                rows_written = persist_results(db, challenge_id)
+                db.commit()
+                with self._lock:
+                    self._boards.pop(challenge_id, None)
+                    self._ends.pop(challenge_id, None)
+                logger.info(f"🏁 Challenge {challenge_id} ended; stored {rows_written} final standings")
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self, interval: float = STANDINGS_REFRESH_INTERVAL):
+        """Refresh until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"❌ Error refreshing challenge standings: {str(e)}")
+
+challenge_standings = ChallengeStandings(SessionLocal)
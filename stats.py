@@ -0,0 +1,85 @@
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.orm import Session
+from database import dialect_insert, mark_written
+from models import FriendEdge, User, UserStats, Workout
+
+STATS_COLUMNS = ["user_id", "total_workouts", "completed_workouts", "last_completion_date", "friend_count"]
+
+_stats = UserStats.__table__
+
+class StatsManager:
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def _aggregate(self, user_id: Optional[int] = None):
+        """SELECT computing user_stats rows from workout history and friendships"""
+        completed = func.coalesce(func.sum(case((Workout.completed == True, 1), else_=0)), 0)
+        if user_id is not None:
+            friends = select(func.count()).where(FriendEdge.user_id == user_id).scalar_subquery()
+            # No GROUP BY, so users without workouts still get a zeroed row
+            return select(
+                literal(user_id), func.count(Workout.id), completed, func.max(Workout.completion_date), friends
+            ).where(Workout.user_id == user_id)
+        friends = select(func.count()).where(FriendEdge.user_id == User.id).scalar_subquery()
+        return select(
+            User.id, func.count(Workout.id), completed, func.max(Workout.completion_date), friends
+        ).select_from(User).outerjoin(Workout, Workout.user_id == User.id).group_by(User.id)
+
+    def _upsert(self, user_id: int, counts: Dict[str, int], completed_at: Optional[datetime] = None):
+        """Add `counts` to the user's counters in one statement, creating the row if missing"""
+        now = datetime.utcnow()
+        insert = dialect_insert(self.db, _stats)
+        changes = {column: _stats.c[column] + insert.excluded[column] for column in counts}
+        if completed_at is not None:
+            # Keep the latest completion; offline syncs can arrive out of order
+            changes["last_completion_date"] = case(
+                (_stats.c.last_completion_date == None, insert.excluded.last_completion_date),
+                (_stats.c.last_completion_date < insert.excluded.last_completion_date, insert.excluded.last_completion_date),
+                else_=_stats.c.last_completion_date
+            )
+        self.db.execute(insert.values(
+            user_id=user_id,
+            total_workouts=counts.get("total_workouts", 0),
+            completed_workouts=counts.get("completed_workouts", 0),
+            friend_count=counts.get("friend_count", 0),
+            last_completion_date=completed_at,
+            updated_at=now
+        ).on_conflict_do_update(index_elements=["user_id"], set_={**changes, "updated_at": now}))
+        mark_written(self.db, user_id)
+
+    def record_workout_created(self, user_id: int, count: int = 1):
+        """Count newly created workouts"""
+        self._upsert(user_id, {"total_workouts": count})
+
+    def record_workout_completed(self, user_id: int, completed_at: datetime, count: int = 1):
+        """Count newly completed workouts"""
+        self._upsert(user_id, {"completed_workouts": count}, completed_at)
+
+    def record_friend_added(self, user_id: int, count: int = 1):
+        """Count new accepted friends"""
+        self._upsert(user_id, {"friend_count": count})
+
+    def get_stats(self, user_id: int) -> Dict:
+        """Read a user's counters with a single primary-key lookup"""
+        stats = self.db.query(UserStats).get(user_id)
+        if not stats:
+            stats = UserStats(total_workouts=0, completed_workouts=0, friend_count=0)
+        return {
+            "total_workouts": stats.total_workouts,
+            "completed_workouts": stats.completed_workouts,
+            "completion_rate": stats.completion_rate,
+            "last_completion_date": stats.last_completion_date,
+            "friend_count": stats.friend_count
+        }
+
+    def rebuild(self, user_id: Optional[int] = None) -> int:
+        """Recompute stats rows from the workouts table. Returns rows written."""
+        query = self.db.query(UserStats)
+        if user_id is not None:
+            query = query.filter(UserStats.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+        stmt = UserStats.__table__.insert().from_select(STATS_COLUMNS, self._aggregate(user_id))
+        return self.db.execute(stmt).rowcount
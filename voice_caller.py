@@ -3,6 +3,7 @@ from twilio.rest import Client
 import os
 from dotenv import load_dotenv
 import tempfile
+from metrics import track_upstream
 
 load_dotenv()
 
@@ -18,11 +19,12 @@ class VoiceCaller:
     def generate_voice_message(self, text: str, voice="Arnold") -> bytes:
         """Generate voice message using ElevenLabs API"""
         try:
-            audio = generate(
-                text=text,
-                voice=voice,
-                model="eleven_monolingual_v1"
-            )
+            with track_upstream("elevenlabs", "generate"):
+                audio = generate(
+                    text=text,
+                    voice=voice,
+                    model="eleven_monolingual_v1"
+                )
             return audio
         except Exception as e:
             print(f"Error generating voice message: {e}")
@@ -51,11 +53,12 @@ class VoiceCaller:
             """
 
             # Make the call
-            call = self.twilio_client.calls.create(
-                twiml=twiml,
-                to=phone_number,
-                from_=self.twilio_phone
-            )
+            with track_upstream("twilio", "calls.create"):
+                call = self.twilio_client.calls.create(
+                    twiml=twiml,
+                    to=phone_number,
+                    from_=self.twilio_phone
+                )
 
             # Clean up temporary file
             os.unlink(temp_file_path)
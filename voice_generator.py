@@ -1,5 +1,31 @@
+import hashlib
 import os
-from typing import Optional
+from typing import Callable, Optional
+from metrics import track_upstream
+from cache import get_cache
+
+# Generated audio is keyed by voice and script, so identical scripts are synthesized once
+AUDIO_CACHE_TTL = int(os.getenv("AUDIO_CACHE_TTL", 7 * 24 * 3600))
+audio_cache = get_cache("audio", default_ttl=AUDIO_CACHE_TTL)
+
+def cached_audio_file(prefix: str, voice: str, text: str, synthesize: Callable[[], bytes]) -> str:
+    """Return the mp3 path for (voice, text), calling `synthesize` only on a cache miss"""
+    digest = hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()[:16]
+    filename = f"static/audio/{prefix}_{digest}.mp3"
+
+    def render() -> str:
+        audio = synthesize()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "wb") as f:
+            f.write(audio)
+        return filename
+
+    cached = audio_cache.get_or_set(digest, render)
+    if not os.path.exists(cached):
+        # Entry outlived the file (e.g. written on another host); regenerate it here
+        cached = render()
+        audio_cache.set(digest, cached)
+    return cached
 
 class VoiceGenerator:
     def __init__(self):
@@ -24,21 +50,15 @@ class VoiceGenerator:
             return None
 
         try:
-            # Generate audio content
-            audio = self.generate(
-                text=text,
-                voice=voice,
-                model="eleven_monolingual_v1"
-            )
-            
-            # Save to file
-            filename = f"static/audio/message_{user_id}_{hash(text)}.mp3"
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            
-            with open(filename, "wb") as f:
-                f.write(audio)
+            def synthesize() -> bytes:
+                with track_upstream("elevenlabs", "generate"):
+                    return self.generate(
+                        text=text,
+                        voice=voice,
+                        model="eleven_monolingual_v1"
+                    )
             
-            return filename
+            return cached_audio_file("message", voice, text, synthesize)
         except Exception as e:
             print(f"Error generating voice message: {e}")
             return None
@@ -0,0 +1,259 @@
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from challenge_progress import measure_logs
+from database import mark_written
+from gamification import GamificationManager, status_cache, user_zone
+from idempotency import get_stored_response, store_response
+from models import User, Workout, ExerciseLog, Achievement
+from personal_records import personal_bests
+from points import award_many, award_points
+from stats import StatsManager
+from standings import challenge_standings
+
+# Base points for completing a workout, scaled by the streak multiplier
+BASE_WORKOUT_POINTS = 100
+
+def _to_utc_naive(value: datetime) -> datetime:
+    """Normalise client timestamps to the naive UTC values stored in the database"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class CompletionManager:
+    def __init__(self, db_session: Session):
+        self.db = db_session
+        self.gamification = GamificationManager(db_session)
+        self.stats = StatsManager(db_session)
+        # Personal bests raised by the current unit of work, cached once it commits
+        self._best_update = None
+
+    async def complete_workout(
+        self,
+        workout: Workout,
+        difficulty_rating: Optional[int],
+        notes: Optional[str],
+        exercise_logs: List[Dict],
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """Complete a workout as a single unit of work with one commit"""
+        scope = f"workout_complete:{workout.id}"
+        if idempotency_key:
+            stored = get_stored_response(self.db, idempotency_key, scope)
+            if stored is not None:
+                return stored
+
+        completed_at = datetime.utcnow()
+
+        # Claim the workout; a retry without a key must not award points twice
+        claimed = self.db.query(Workout).filter(
+            Workout.id == workout.id,
+            Workout.completed.isnot(True)
+        ).update({
+            Workout.completed: True,
+            Workout.completion_date: completed_at,
+            Workout.difficulty_rating: difficulty_rating,
+            Workout.notes: notes
+        }, synchronize_session=False)
+        if not claimed:
+            stored = get_stored_response(self.db, idempotency_key, scope) if idempotency_key else None
+            return stored if stored is not None else {"error": "Workout already completed"}
+        mark_written(self.db, workout.user_id)
+
+        log_rows = self._exercise_log_rows(workout, exercise_logs, completed_at)
+        self._insert_exercise_logs(log_rows)
+        self.stats.record_workout_completed(workout.user_id, completed_at)
+        self._best_update = personal_bests.detect(self.db, workout.user_id, log_rows)
+        records = self._best_update.records
+
+        # Update streak; achievements are checked once the points are in the ledger
+        user = self.db.query(User).get(workout.user_id)
+        streak_info = await self.gamification.update_streak(user, completed_at)
+
+        # Award base points for completing workout, with the streak multiplier applied
+        points_earned = int(BASE_WORKOUT_POINTS * streak_info["multiplier"])
+        award_points(self.db, user.id, points_earned, "workout", workout.id)
+        challenge_progress = await self.gamification.advance_challenges(
+            user, [(completed_at, measure_logs(log_rows, personal_records=len(records)))]
+        )
+        new_achievements = await self.gamification.check_and_award_achievements(user)
+
+        response = {
+            "message": "Workout completed successfully!",
+            "points_earned": points_earned,
+            "new_achievements": [self._serialize_achievement(a) for a in new_achievements],
+            "streak_info": streak_info,
+            "challenge_progress": challenge_progress,
+            "personal_records": [self._serialize_record(r) for r in records]
+        }
+        return self._commit(workout.user_id, response, idempotency_key, scope)
+
+    async def sync_completions(
+        self,
+        user: User,
+        completions: List[Dict],
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """Apply a batch of offline completions in one transaction.
+
+        Completions are replayed in chronological order so the streak and its
+        multiplier evolve exactly as if each had been sent live; achievements
+        are evaluated once at the end.
+        """
+        scope = f"workout_sync:{user.id}"
+        if idempotency_key:
+            stored = get_stored_response(self.db, idempotency_key, scope)
+            if stored is not None:
+                return stored
+
+        now = datetime.utcnow()
+        for completion in completions:
+            completion["completed_at"] = min(_to_utc_naive(completion["completed_at"]), now)
+        completions = sorted(completions, key=lambda c: c["completed_at"])
+
+        workout_ids = [c["workout_id"] for c in completions]
+        workouts = {
+            w.id: w for w in self.db.query(Workout).filter(
+                Workout.id.in_(workout_ids),
+                Workout.user_id == user.id,
+                Workout.completed.isnot(True)
+            ).with_for_update().all()
+        }
+
+        streak = self.gamification.get_or_create_streak(user)
+        zone = user_zone(user)
+        synced, skipped, log_rows = [], [], []
+        ledger, completed = [], []
+        for completion in completions:
+            workout = workouts.pop(completion["workout_id"], None)
+            if workout is None:
+                skipped.append({"workout_id": completion["workout_id"], "reason": "not found or already completed"})
+                continue
+
+            workout.completed = True
+            workout.completion_date = completion["completed_at"]
+            workout.difficulty_rating = completion.get("difficulty_rating")
+            workout.notes = completion.get("notes")
+            rows = self._exercise_log_rows(workout, completion.get("exercise_logs"), completion["completed_at"])
+            log_rows.extend(rows)
+            completed.append((completion["completed_at"], workout.id, rows))
+
+            self.gamification.advance_streak(streak, completion["completed_at"], zone)
+            ledger.append({
+                "user_id": user.id,
+                "points": int(BASE_WORKOUT_POINTS * streak.streak_multiplier),
+                "source": "workout",
+                "source_id": workout.id
+            })
+            last_completed_at = completion["completed_at"]
+            synced.append(workout.id)
+
+        if synced:
+            self.db.flush()
+            self._insert_exercise_logs(log_rows)
+            self.stats.record_workout_completed(user.id, last_completed_at, count=len(synced))
+            award_many(self.db, ledger)
+            self._best_update = personal_bests.detect(self.db, user.id, log_rows)
+            records = self._best_update.records
+            records_per_workout = Counter(record["workout_id"] for record in records)
+            events = [
+                (completed_at, measure_logs(rows, personal_records=records_per_workout[workout_id]))
+                for completed_at, workout_id, rows in completed
+            ]
+            challenge_progress = await self.gamification.advance_challenges(user, events)
+            new_achievements = await self.gamification.check_and_award_achievements(user)
+        else:
+            challenge_progress, new_achievements, records = [], [], []
+
+        response = {
+            "message": f"Synced {len(synced)} workout(s)",
+            "synced": synced,
+            "skipped": skipped,
+            "points_earned": sum(entry["points"] for entry in ledger),
+            "new_achievements": [self._serialize_achievement(a) for a in new_achievements],
+            "streak_info": self.gamification.streak_info(streak),
+            "challenge_progress": challenge_progress,
+            "personal_records": [self._serialize_record(r) for r in records]
+        }
+        return self._commit(user.id, response, idempotency_key, scope)
+
+    def _commit(self, user_id: int, response: Dict, idempotency_key: Optional[str], scope: str) -> Dict:
+        """Commit the unit of work, recording the response under the idempotency key"""
+        if idempotency_key:
+            store_response(self.db, idempotency_key, scope, response)
+
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key won the race
+            self.db.rollback()
+            self._best_update = None
+            stored = get_stored_response(self.db, idempotency_key, scope) if idempotency_key else None
+            if stored is None:
+                raise
+            return stored
+
+        status_cache.delete(str(user_id))
+        if self._best_update is not None:
+            personal_bests.apply(user_id, self._best_update)
+            self._best_update = None
+        for progress in response.get("challenge_progress", []):
+            challenge_standings.record(progress["challenge_id"], user_id, progress["current_value"])
+        return response
+
+    def _exercise_log_rows(self, workout: Workout, exercise_logs: Optional[List[Dict]], completed_at: datetime) -> List[Dict]:
+        """Build log rows for a workout, falling back to the planned exercises"""
+        return [
+            {
+                "workout_id": workout.id,
+                "exercise_name": log["exercise_name"],
+                "sets_completed": log.get("sets_completed"),
+                "reps_completed": log.get("reps_completed"),
+                "weight_used": log.get("weight_used"),
+                "duration": log.get("duration"),
+                "completed": True,
+                "created_at": completed_at
+            }
+            for log in (exercise_logs or self._planned_exercise_logs(workout))
+        ]
+
+    def _insert_exercise_logs(self, rows: List[Dict]):
+        """Insert exercise logs with a single executemany"""
+        if rows:
+            self.db.execute(ExerciseLog.__table__.insert(), rows)
+
+    def _planned_exercise_logs(self, workout: Workout) -> List[Dict]:
+        """Build log rows from the workout plan when the client sent none"""
+        exercises = workout.exercises or []
+        if isinstance(exercises, str):
+            exercises = json.loads(exercises)
+
+        return [
+            {
+                "exercise_name": exercise["name"],
+                "sets_completed": exercise.get("sets"),
+                "reps_completed": exercise["reps"] if isinstance(exercise.get("reps"), int) else None
+            }
+            for exercise in exercises
+        ]
+
+    def _serialize_record(self, record: Dict) -> Dict:
+        return {
+            "workout_id": record["workout_id"],
+            "exercise": record["exercise"],
+            "type": record["type"],
+            "value": record["value"],
+            "previous": record["previous"]
+        }
+
+    def _serialize_achievement(self, achievement: Achievement) -> Dict:
+        return {
+            "name": achievement.name,
+            "description": achievement.description,
+            "badge_url": achievement.badge_url,
+            "meme_url": achievement.meme_url,
+            "achievement_type": achievement.achievement_type
+        }
@@ -1,8 +1,11 @@
+import asyncio
 import json
 import random
 from typing import Dict, List, Optional, Any
 import openai
-import os
+from metrics import track_upstream
+from spotify_player import playlist_cache
+from voice_generator import cached_audio_file
 from models import User, AIMotivator, MotivationalMessage, SoundtrackPreference, Workout
 
 class WorkoutEnhancer:
@@ -79,23 +82,25 @@ class WorkoutEnhancer:
         # Generate message using OpenAI
         client = openai.OpenAI()
         prompt = self._create_motivational_prompt(context, motivator.personality, message_type)
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a Gen Z fitness motivator. Use modern slang, emojis, and high energy!"},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with track_upstream("openai", "generate_motivational_message"):
+            response = await client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": "You are a Gen Z fitness motivator. Use modern slang, emojis, and high energy!"},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         message_content = response.choices[0].message.content
 
         # Generate audio using ElevenLabs if available
         audio_filename = None
         if self.elevenlabs_available:
-            audio = self.generate_voice(
-                text=message_content,
-                voice=motivator.voice_id,
-                model="eleven_monolingual_v1"
-            )
+            with track_upstream("elevenlabs", "generate"):
+                audio = self.generate_voice(
+                    text=message_content,
+                    voice=motivator.voice_id,
+                    model="eleven_monolingual_v1"
+                )
             audio_filename = f"static/audio/motivation_{user_id}_{message_type}_{random.randint(1000, 9999)}.mp3"
             with open(audio_filename, "wb") as f:
                 f.write(audio)
@@ -175,14 +180,15 @@ class WorkoutEnhancer:
         # Search for tracks
         tracks = []
         for genre in genres:
-            results = sp.recommendations(
-                seed_genres=[genre],
-                target_tempo=(min_bpm + max_bpm) / 2,
-                min_tempo=min_bpm,
-                max_tempo=max_bpm,
-                target_energy=0.8 if workout_intensity == "beast_mode" else 0.6,
-                limit=5
-            )
+            with track_upstream("spotify", "recommendations"):
+                results = sp.recommendations(
+                    seed_genres=[genre],
+                    target_tempo=(min_bpm + max_bpm) / 2,
+                    min_tempo=min_bpm,
+                    max_tempo=max_bpm,
+                    target_energy=0.8 if workout_intensity == "beast_mode" else 0.6,
+                    limit=5
+                )
             tracks.extend([track["uri"] for track in results["tracks"]])
 
         # Create new playlist
@@ -250,7 +256,7 @@ class WorkoutEnhancer:
             "bpm_range": bpm_range
         }
 
-    async def enhance_workout(self, workout_plan: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    async def enhance_workout(self, workout_plan: Dict[str, Any], user_id: int, include_audio: bool = True) -> Dict[str, Any]:
         """Enhance workout with music and voice features if available"""
         if not self.db:
             raise Exception("Database session is required for this operation")
@@ -260,16 +266,17 @@ class WorkoutEnhancer:
         # Add Spotify playlist if available
         if self.spotify_available:
             try:
-                playlist = self._get_workout_playlist()
+                # Spotify search and TTS block, so they run off the event loop
+                playlist = await asyncio.to_thread(self._get_workout_playlist)
                 if playlist:
                     enhanced_plan["spotify_playlist"] = playlist
             except Exception as e:
                 print(f"Error getting workout playlist: {e}")
         
         # Add voice guidance if available
-        if self.elevenlabs_available:
+        if self.elevenlabs_available and include_audio:
             try:
-                audio_path = self._generate_workout_audio(workout_plan, user_id)
+                audio_path = await asyncio.to_thread(self._generate_workout_audio, workout_plan, user_id)
                 if audio_path:
                     enhanced_plan["audio_url"] = audio_path
             except Exception as e:
@@ -287,23 +294,28 @@ class WorkoutEnhancer:
 
         try:
             # Search for a workout playlist
+            query = f"{workout_type} motivation"
+            return playlist_cache.get_or_set(query, lambda: self._search_playlist(query))
+        except Exception as e:
+            print(f"Error getting workout playlist: {e}")
+            return None
+
+    def _search_playlist(self, query: str) -> Optional[Dict[str, Any]]:
+        with track_upstream("spotify", "search"):
             results = self.spotify.search(
-                q=f"{workout_type} motivation",
+                q=query,
                 type="playlist",
                 limit=1
             )
-            
-            if results and results["playlists"]["items"]:
-                playlist = results["playlists"]["items"][0]
-                return {
-                    "name": playlist["name"],
-                    "url": playlist["external_urls"]["spotify"],
-                    "uri": playlist["uri"]
-                }
-            return None
-        except Exception as e:
-            print(f"Error getting workout playlist: {e}")
-            return None
+        
+        if results and results["playlists"]["items"]:
+            playlist = results["playlists"]["items"][0]
+            return {
+                "name": playlist["name"],
+                "url": playlist["external_urls"]["spotify"],
+                "uri": playlist["uri"]
+            }
+        return None
 
     def _generate_workout_audio(self, workout_plan: Dict[str, Any], user_id: int) -> Optional[str]:
         """Generate voice guidance if ElevenLabs is available"""
@@ -317,21 +329,16 @@ class WorkoutEnhancer:
             # Create the workout script
             script = self._create_workout_script(workout_plan)
             
-            # Generate audio
-            audio = self.generate_voice(
-                text=script,
-                voice="Arnold",
-                model="eleven_monolingual_v1"
-            )
-            
-            # Save to file
-            filename = f"static/audio/workout_{user_id}_{hash(script)}.mp3"
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            
-            with open(filename, "wb") as f:
-                f.write(audio)
+            # Generate audio, reusing the file when the same script was voiced before
+            def synthesize() -> bytes:
+                with track_upstream("elevenlabs", "generate"):
+                    return self.generate_voice(
+                        text=script,
+                        voice="Arnold",
+                        model="eleven_monolingual_v1"
+                    )
             
-            return filename
+            return cached_audio_file("workout", "Arnold", script, synthesize)
         except Exception as e:
             print(f"Error generating workout audio: {e}")
             return None
@@ -1,13 +1,23 @@
 import openai
 import json
+import hashlib
 from typing import Dict, List
 import os
 from dotenv import load_dotenv
+from metrics import track_upstream
+from cache import get_cache
 
 load_dotenv()
 
 client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Last AI plan per fitness profile, served to any user with that profile when
+# generation is throttled; only the exercises are kept, never the personalised parts
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", 6 * 3600))
+plan_cache = get_cache("plan", default_ttl=PLAN_CACHE_TTL)
+
+DEFAULT_MOTIVATION = "You're doing great! Keep pushing yourself and remember that every workout brings you closer to your goals!"
+
 class WorkoutGenerator:
     def __init__(self):
         self.exercise_templates = {
@@ -25,7 +35,16 @@ class WorkoutGenerator:
             }
         }
 
-    def generate_workout_plan(self, user_info: Dict) -> Dict:
+    def _profile_key(self, user_info: Dict) -> str:
+        profile = f"{user_info['fitness_level']}|{user_info['goals']}".lower()
+        return hashlib.sha256(profile.encode("utf-8")).hexdigest()[:16]
+
+    def generate_workout_plan(self, user_info: Dict, use_ai: bool = True) -> Dict:
+        if not use_ai:
+            # Serve the last AI plan for this profile, falling back to the template tier
+            cached_plan = plan_cache.get(self._profile_key(user_info))
+            return cached_plan or self._generate_template_workout(user_info['fitness_level'])
+
         prompt = f"""Create a personalized workout plan for someone with the following profile:
         Name: {user_info['name']}
         Fitness Level: {user_info['fitness_level']}
@@ -47,11 +66,16 @@ class WorkoutGenerator:
         """
 
         try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}]
-            )
+            with track_upstream("openai", "generate_workout_plan"):
+                response = client.chat.completions.create(
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": prompt}]
+                )
             workout_plan = json.loads(response.choices[0].message.content)
+            plan_cache.set(self._profile_key(user_info), {
+                "exercises": workout_plan["exercises"],
+                "motivation": DEFAULT_MOTIVATION
+            })
             return workout_plan
         except (json.JSONDecodeError, Exception) as e:
             print(f"Error generating workout plan: {str(e)}")
@@ -82,7 +106,7 @@ class WorkoutGenerator:
         
         return {
             "exercises": exercises,
-            "motivation": f"You're doing great! Keep pushing yourself and remember that every workout brings you closer to your goals!"
+            "motivation": DEFAULT_MOTIVATION
         }
 
     def generate_motivation_message(self, user_name: str, workout_history: List = None) -> str:
@@ -90,10 +114,11 @@ class WorkoutGenerator:
         Make it personal, encouraging, and energetic. Keep it under 100 words."""
 
         try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}]
-            )
+            with track_upstream("openai", "generate_motivation_message"):
+                response = client.chat.completions.create(
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": prompt}]
+                )
             return response.choices[0].message.content
         except Exception as e:
             print(f"Error generating motivation: {str(e)}")